@@ -1,30 +1,57 @@
 import asyncio
+import heapq
 import random
 
+from time import time
+from itertools import count
 from datetime import datetime
 from collections import deque
 
 from aioscpy import signals
 from aioscpy import call_grace_instance
+from aioscpy.utils.othtypes import urlparse_cached
+from aioscpy.utils.request import request_fingerprint
+from aioscpy.core.downloader.ratelimit import get_rate_limiter
+from aioscpy.core.downloader.backoff import SlotBackoff, get_retry_after
+from aioscpy.core.downloader.hedge import Hedger
 
 
 class Slot:
     """Downloader slot"""
 
-    def __init__(self, concurrency, randomize_delay, delay=0):
+    def __init__(self, concurrency, randomize_delay, delay=0, rate_limiter=None):
         self.concurrency = concurrency
         self.delay = delay
         self.randomize_delay = randomize_delay
+        self.rate_limiter = rate_limiter
+        self.backoff = None
+        self.latencies = None
+        # SlotController of SlotConcurrencyMiddleware, dropped with the slot
+        self.controller = None
 
         self.active = set()
         self.queue = deque()
         self.transferring = set()
         self.lastseen = 0
+        self.next_allowed = 0
+        self.scheduled = False
         self.delay_run = False
 
     def free_transfer_slots(self):
         return self.concurrency - len(self.transferring)
 
+    def ready_at(self, now=None):
+        if self.rate_limiter is not None:
+            return max(self.next_allowed, self.rate_limiter.ready_at(now))
+        return self.next_allowed
+
+    def throttled(self, now=None):
+        """Whether dropping the slot would lose its backoff or rate limiting state"""
+        now = time() if now is None else now
+        if self.backoff is not None or self.next_allowed > now:
+            return True
+        return self.rate_limiter is not None and not self.rate_limiter.full(now)
+
     def download_delay(self):
         if self.randomize_delay:
             return random.uniform(0.5 * self.delay, 1.5 * self.delay)
@@ -35,8 +62,8 @@ class Slot:
 
     def __repr__(self):
         cls_name = self.__class__.__name__
-        return "%s(concurrency=%r, delay=%0.2f, randomize_delay=%r)" % (
-            cls_name, self.concurrency, self.delay, self.randomize_delay)
+        return "%s(concurrency=%r, delay=%0.2f, randomize_delay=%r, rate_limiter=%r)" % (
+            cls_name, self.concurrency, self.delay, self.randomize_delay, self.rate_limiter)
 
     def __str__(self):
         return (
@@ -49,13 +76,24 @@ class Slot:
         )
 
 
+def _get_concurrency_delay(concurrency, spider, settings):
+    delay = settings.getfloat('DOWNLOAD_DELAY')
+    if hasattr(spider, 'download_delay'):
+        delay = spider.download_delay
+
+    if hasattr(spider, 'max_concurrent_requests'):
+        concurrency = spider.max_concurrent_requests
+
+    return concurrency, delay
+
+
 class Downloader(object):
     DOWNLOAD_SLOT = 'download_slot'
 
     def __init__(self, crawler):
         self.settings = crawler.settings
         self.crawler = crawler
-        self.slot = None
+        self.slots = {}
         self.active = set()
         self.call_helper = self.di.get("tools").call_helper
         self.handlers = call_grace_instance('downloader_handler', self.settings, crawler)
@@ -64,40 +102,238 @@ class Downloader(object):
         self.ip_concurrency = self.settings.getint('CONCURRENT_REQUESTS_PER_IP')
         self.randomize_delay = self.settings.getbool('RANDOMIZE_DOWNLOAD_DELAY')
         self.delay = self.settings.getfloat('DOWNLOAD_DELAY')
+        self.per_slot_settings = self.settings.getdict('DOWNLOAD_SLOTS', {})
+        self.rate_limits = self.settings.getdict('DOWNLOAD_RATE_LIMITS', {})
+        self.backoff_codes = {int(code) for code in self.settings.getlist('DOWNLOAD_BACKOFF_CODES', [429, 503])}
+        self.backoff_max_delay = self.settings.getfloat('DOWNLOAD_BACKOFF_MAX_DELAY', 300.0)
+        self.backoff_recovery = self.settings.getfloat('DOWNLOAD_BACKOFF_RECOVERY', 0.5)
+        self.hedger = Hedger.from_crawler(crawler)
+        self.coalesce = self.settings.getbool('DOWNLOAD_COALESCE_ENABLED', False)
+        # fingerprint -> [request being downloaded, identical requests waiting for it]
+        self._coalesced = {}
         self.middleware = call_grace_instance(self.di.get('downloader_middleware'), only_instance=True).from_crawler(crawler)
         self.process_queue_task = None
+        self.slot_gc_task = None
+        self._ready = []
+        self._ready_seq = count()
+        # slots waiting for the global budget or for CONCURRENT_REQUESTS, retried on the next wakeup
+        self._parked = set()
+        self.in_flight = 0
+        self._queue_wakeup = asyncio.Event()
+        self.spider = None
         self.engine = None
+        self.budget = getattr(crawler, 'budget', None)
+        self.budget_weight = self.settings.getfloat('CRAWLER_WEIGHT', 1.0)
+        self.resolver = getattr(crawler, 'resolver', None)
 
         crawler.signals.connect(self.close, signals.engine_stopped)
+        # prefetching only pays off when something reads the cache: per IP slot keys
+        # or a handler connecting through the resolver (aiohttp)
+        if self.resolver is not None and (self.ip_concurrency or getattr(self.handlers, 'resolver', None)):
+            crawler.signals.connect(self.prefetch_dns, signals.request_scheduled)
 
     @classmethod
     def from_crawler(cls, crawler):
         return cls(crawler)
 
     async def open(self, spider, engine):
-        conc = self.ip_concurrency if self.ip_concurrency else self.domain_concurrency
-        self.slot = Slot(conc, self.randomize_delay, self.delay)
+        self.spider = spider
         self.engine = engine
-        self.process_queue_task = asyncio.create_task(self._process_queue(spider, self.slot))
+        if self.budget is not None:
+            self.budget.register(self, self.budget_weight, wakeup=self._queue_wakeup.set)
+        self.process_queue_task = asyncio.create_task(self._process_queue(spider))
+        self.slot_gc_task = asyncio.create_task(self._slot_gc())
 
     async def fetch(self, request):
         self.active.add(request)
-        self.slot.active.add(request)
-        self.slot.queue.append(request)
+        if self.coalesce and self._join_download(request):
+            return
+        key, slot = await self._get_slot(request, self.spider)
+        request.meta[self.DOWNLOAD_SLOT] = key
+        slot.active.add(request)
+        slot.queue.append(request)
+        self._schedule_slot(key, slot)
+        self._queue_wakeup.set()
+
+    def _coalescable(self, request):
+        return request.method == 'GET' and not request.meta.get('dont_coalesce')
+
+    def _join_download(self, request):
+        """Attach ``request`` to an identical download in flight, return True when it was"""
+        if not self._coalescable(request):
+            return False
+        fingerprint = request_fingerprint(request)
+        group = self._coalesced.get(fingerprint)
+        if group is None:
+            self._coalesced[fingerprint] = [request]
+            return False
+        group.append(request)
+        self.crawler.stats.inc_value('downloader/coalesced_count', spider=self.spider)
+        return True
+
+    def _pop_waiters(self, request):
+        """Return the requests waiting for the download of ``request``"""
+        if not self.coalesce or not self._coalescable(request):
+            return ()
+        fingerprint = request_fingerprint(request)
+        group = self._coalesced.get(fingerprint)
+        if not group or group[0] is not request:
+            return ()
+        del self._coalesced[fingerprint]
+        return group[1:]
+
+    async def _deliver_coalesced(self, waiters, request, output, spider):
+        """Hand what the middlewares made of a shared download to every request that waited for it
+
+        The download went through process_response / process_exception once,
+        for ``request``: a cache update, a retry or a proxy penalty is not
+        repeated per waiter. A response is copied for each waiter and flagged
+        ``coalesced``, a new request (a retry) is followed by each waiter the
+        same way, an exception is passed on as it is.
+        """
+        for waiter in waiters:
+            self.active.discard(waiter)
+            if isinstance(output, self.di.get('response')):
+                result = output.replace(request=waiter, flags=output.flags + ['coalesced'])
+                # set by the handlers only, replace() leaves them out
+                result._response = output._response
+                if hasattr(output, 'cookies'):
+                    result.cookies = output.cookies
+            elif isinstance(output, self.di.get('request')):
+                # what the middlewares changed for the leader, e.g. retry_times and not_before,
+                # on the waiter's own callback and meta; the copies meet again when downloaded
+                changed = {key: value for key, value in output.meta.items()
+                           if key not in request.meta or request.meta[key] is not value}
+                result = waiter.replace(url=output.url, method=output.method, headers=output.headers,
+                                        body=output.body, json=output.json, priority=output.priority,
+                                        dont_filter=output.dont_filter, meta=dict(waiter.meta, **changed))
+            else:
+                result = output
+            await self.engine._handle_downloader_output(result, waiter, spider)
+
+    async def _get_slot(self, request, spider):
+        key = await self._get_slot_key(request, spider)
+        if key not in self.slots:
+            slot_settings = self.per_slot_settings.get(key, {})
+            conc = self.ip_concurrency if self.ip_concurrency else self.domain_concurrency
+            conc, delay = _get_concurrency_delay(conc, spider, self.settings)
+            conc = slot_settings.get('concurrency', conc)
+            delay = slot_settings.get('delay', delay)
+            randomize_delay = slot_settings.get('randomize_delay', self.randomize_delay)
+            rate_limiter = get_rate_limiter(key, self.rate_limits)
+            self.slots[key] = Slot(conc, randomize_delay, delay, rate_limiter)
+        return key, self.slots[key]
+
+    async def _get_slot_key(self, request, spider):
+        if self.DOWNLOAD_SLOT in request.meta:
+            return request.meta[self.DOWNLOAD_SLOT]
+
+        key = urlparse_cached(request).hostname or ''
+        if self.ip_concurrency:
+            key = await self._resolve(key)
+        return key
+
+    async def _resolve(self, hostname):
+        if self.resolver is not None:
+            return await self.resolver.address(hostname)
+        if not hostname:
+            return hostname
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(hostname, None)
+        except OSError:
+            return hostname
+        return infos[0][4][0] if infos else hostname
+
+    def prefetch_dns(self, request, spider=None):
+        """Resolve the host of a freshly scheduled request before it is downloaded"""
+        self.resolver.prefetch(urlparse_cached(request).hostname)
+
+    def _schedule_slot(self, key, slot, when=None):
+        """Put ``slot`` on the ready heap, to be processed once ``when`` has passed"""
+        if slot.scheduled:
+            return
+        slot.scheduled = True
+        heapq.heappush(self._ready, (when or slot.ready_at(), next(self._ready_seq), key))
 
-    async def _process_queue(self, spider, slot):
+    async def _process_queue(self, spider):
         while True:
-            await asyncio.sleep(0.1)
-            while slot.queue and slot.free_transfer_slots() > 0:
-                request = slot.queue.popleft()
-                asyncio.create_task(self._download(slot, request, spider))
-                slot.transferring.add(request)
-                slot.active.remove(request)
-                self.active.remove(request)
-                if slot.download_delay():
-                    await asyncio.sleep(slot.download_delay())
+            self._queue_wakeup.clear()
+            timeout = self._process_ready_slots(spider)
+            try:
+                await asyncio.wait_for(self._queue_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _process_ready_slots(self, spider):
+        """Dispatch every slot whose delay has passed and return the seconds
+        until the next one is ready, or None when nothing is waiting on time"""
+        while self._parked:
+            key = self._parked.pop()
+            if key in self.slots:
+                self._schedule_slot(key, self.slots[key])
+
+        now = time()
+        while self._ready and self._ready[0][0] <= now:
+            _, _, key = heapq.heappop(self._ready)
+            slot = self.slots.get(key)
+            if slot is None:
+                continue
+            slot.scheduled = False
+            self._process_slot(key, slot, spider, now)
+
+        if self._ready:
+            return max(self._ready[0][0] - time(), 0)
+        return None
+
+    def _process_slot(self, key, slot, spider, now):
+        while slot.queue and slot.free_transfer_slots() > 0:
+            ready_at = slot.ready_at(now)
+            if now < ready_at:
+                self._schedule_slot(key, slot, ready_at)
+                return
+            if self.in_flight >= self.total_concurrency:
+                self._parked.add(key)
+                return
+            if self.budget is not None and not self.budget.acquire(self):
+                delay = self.budget.bandwidth_delay()
+                if delay:
+                    self._schedule_slot(key, slot, now + delay)
+                else:
+                    self._parked.add(key)
+                return
+            if slot.rate_limiter is not None:
+                slot.rate_limiter.consume(now)
+            slot.lastseen = now
+            request = slot.queue.popleft()
+            slot.active.remove(request)
+            slot.transferring.add(request)
+            self.in_flight += 1
+            asyncio.create_task(self._download(slot, request, spider))
+            delay = slot.download_delay()
+            if delay:
+                slot.next_allowed = now + delay
+        # a slot blocked by its own concurrency is rescheduled when a transfer finishes
+
+    async def _process_response(self, spider, request, response):
+        try:
+            response = await self.middleware.process_response(spider, request, response)
+            process_response_method = getattr(spider, "process_response", None)
+            if process_response_method:
+                response = await self.call_helper(process_response_method, request, response)
+        except (Exception, BaseException) as exc:
+            response = exc
+        return response
+
+    async def _process_exception(self, spider, request, exc):
+        response = await self.middleware.process_exception(spider, request, exc)
+        process_exception_method = getattr(spider, "process_exception", None)
+        # a middleware that recovered, e.g. with a retry, has the last word
+        if process_exception_method and not isinstance(response, (self.di.get('request'), self.di.get('response'))):
+            response = await self.call_helper(process_exception_method, request, exc)
+        return response
 
     async def _download(self, slot, request, spider):
+        original_request = request
         try:
             response = None
             response = await self.middleware.process_request(spider, request)
@@ -106,33 +342,99 @@ class Downloader(object):
                 response = await self.call_helper(process_request_method, request)
             if response is None or isinstance(response, self.di.get('request')):
                 request = response or request
-                response = await self.handlers.download_request(request, spider)
+                response = await self.hedger.fetch(self.handlers.download_request, request, spider, slot)
+                self._update_backoff(original_request.meta[self.DOWNLOAD_SLOT], slot, response)
         except (Exception, BaseException, asyncio.TimeoutError) as exc:
-            response = await self.middleware.process_exception(spider, request, exc)
-            process_exception_method = getattr(spider, "process_exception", None)
-            if process_exception_method:
-                response = await self.call_helper(process_exception_method, request, exc)
+            response = await self._process_exception(spider, request, exc)
         else:
-            try:
-                response = await self.middleware.process_response(spider, request, response)
-                process_response_method = getattr(spider, "process_response", None)
-                if process_response_method:
-                    response = await self.call_helper(process_response_method, request, response)
-            except (Exception, BaseException) as exc:
-                response = exc
+            response = await self._process_response(spider, request, response)
         finally:
-            slot.transferring.discard(request)
+            slot.transferring.discard(original_request)
+            slot.lastseen = time()
+            self.active.discard(original_request)
+            self.in_flight -= 1
+            if slot.queue:
+                self._schedule_slot(original_request.meta[self.DOWNLOAD_SLOT], slot)
+                self._queue_wakeup.set()
+            elif self._parked:
+                self._queue_wakeup.set()
+            if self.budget is not None:
+                self.budget.release(self, getattr(response, 'body_size', 0))
             if isinstance(response, self.di.get('response')):
                 response.request = request
-            await self.engine._handle_downloader_output(response, request, spider)
+            waiters = self._pop_waiters(original_request)
+            try:
+                await self.engine._handle_downloader_output(response, request, spider)
+            finally:
+                if waiters:
+                    await self._deliver_coalesced(waiters, request, response, spider)
+
+    def set_concurrency(self, concurrency):
+        """Change the number of requests downloaded at once across all slots"""
+        self.total_concurrency = max(1, int(concurrency))
+        self._queue_wakeup.set()
+
+    def set_slot_concurrency(self, key, concurrency):
+        """Change the concurrency of the slot ``key``, return False when there is no such slot
+
+        A slot backing off after 429/503 keeps its lower limit and recovers
+        towards the new one.
+        """
+        slot = self.slots.get(key)
+        if slot is None:
+            return False
+        concurrency = max(1, int(concurrency))
+        if slot.backoff is not None:
+            slot.backoff.concurrency = concurrency
+            slot.concurrency = min(slot.concurrency, concurrency)
+        else:
+            slot.concurrency = concurrency
+        if slot.queue:
+            self._schedule_slot(key, slot)
+            self._queue_wakeup.set()
+        return True
+
+    def _update_backoff(self, key, slot, response):
+        """Throttle ``slot`` on a DOWNLOAD_BACKOFF_CODES response, recover it on any other"""
+        if response.status in self.backoff_codes:
+            if slot.backoff is None:
+                slot.backoff = SlotBackoff(slot.concurrency, slot.delay, self.backoff_max_delay, self.backoff_recovery)
+            count = slot.backoff.count
+            slot.backoff.back_off(slot, get_retry_after(response.headers))
+            if slot.backoff.count == count:
+                return
+            self.crawler.stats.inc_value('downloader/backoff_count', spider=self.spider)
+            self.crawler.stats.inc_value(f'downloader/backoff/{key}/count', spider=self.spider)
+            self.logger.info(f"Backing off {key} after {response.status}: concurrency {slot.concurrency}, "
+                             f"delay {slot.delay:.2f}s, paused until {datetime.fromtimestamp(slot.backoff.until)}")
+        elif slot.backoff is not None:
+            if slot.backoff.recover(slot):
+                slot.backoff = None
+        else:
+            return
+        self.crawler.stats.set_value(f'downloader/backoff/{key}/concurrency', slot.concurrency, spider=self.spider)
+        self.crawler.stats.set_value(f'downloader/backoff/{key}/delay', round(slot.delay, 3), spider=self.spider)
+
+    async def _slot_gc(self, age=60):
+        while True:
+            await asyncio.sleep(age)
+            mintime = time() - age
+            for key, slot in list(self.slots.items()):
+                if not slot.active and not slot.transferring and slot.lastseen + slot.delay < mintime \
+                        and not slot.throttled(mintime + age):
+                    self.slots.pop(key).close()
 
     async def close(self):
         try:
-            if self.slot is not None:
-                self.slot.close()
+            for slot in self.slots.values():
+                slot.close()
+            if self.budget is not None:
+                self.budget.unregister(self)
             await self.handlers.close()
             if self.process_queue_task:
                 self.process_queue_task.cancel()
+            if self.slot_gc_task:
+                self.slot_gc_task.cancel()
         except (asyncio.CancelledError, Exception, BaseException) as exc:
             pass
 
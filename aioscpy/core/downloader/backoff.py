@@ -0,0 +1,72 @@
+from email.utils import parsedate_to_datetime
+from time import time
+
+
+def get_retry_after(headers, now=None):
+    """Seconds to wait according to a ``Retry-After`` header, 0 when absent or invalid
+
+    Both forms are understood, delay seconds and an HTTP date.
+    """
+    value = (headers.get('Retry-After') or headers.get('retry-after')) if headers else None
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    if not value:
+        return 0
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return 0
+    now = time() if now is None else now
+    return max(date.timestamp() - now, 0)
+
+
+class SlotBackoff:
+    """Throttle a downloader slot after 429/503 responses, then give the capacity back step by step
+
+    A throttling response halves the slot concurrency and at least doubles its
+    delay, and holds the slot back for ``Retry-After`` seconds (or the new
+    delay). Responses to requests that were already in flight during that pause
+    do not throttle it again. Once the pause is over, each successful response
+    gives one concurrency back and multiplies the delay by ``recovery`` until
+    the configured values are reached.
+    """
+
+    def __init__(self, concurrency, delay, max_delay=300.0, recovery=0.5):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.max_delay = max_delay
+        self.recovery = recovery
+        self.count = 0
+        self.until = 0.0
+
+    def back_off(self, slot, retry_after=0, now=None):
+        now = time() if now is None else now
+        retry_after = min(retry_after, self.max_delay)
+        if now < self.until:
+            # already throttled, only a longer Retry-After extends the pause
+            self.until = max(self.until, now + retry_after)
+        else:
+            self.count += 1
+            slot.concurrency = max(1, slot.concurrency // 2)
+            slot.delay = min(max(slot.delay * 2, retry_after, 1.0), self.max_delay)
+            self.until = now + (retry_after or slot.delay)
+        slot.next_allowed = max(slot.next_allowed, self.until)
+
+    def recover(self, slot, now=None):
+        """Give back one step of capacity, return True when the slot is fully recovered"""
+        now = time() if now is None else now
+        if now < self.until:
+            return False
+        slot.concurrency = min(self.concurrency, slot.concurrency + 1)
+        slot.delay = max(self.delay, slot.delay * self.recovery)
+        if slot.delay - self.delay < 0.1:
+            slot.delay = self.delay
+        return slot.concurrency >= self.concurrency and slot.delay == self.delay
+
+    def __repr__(self):
+        return "%s(count=%d, until=%0.1f)" % (self.__class__.__name__, self.count, self.until)
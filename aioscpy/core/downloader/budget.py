@@ -0,0 +1,106 @@
+from time import time
+
+
+class ConcurrencyBudget:
+    """Process-wide concurrency and bandwidth budget.
+
+    One budget is owned by a ``CrawlerProcess`` and shared by the downloaders
+    of every crawler it runs. Each downloader registers with a weight; when
+    the budget is saturated a downloader can only transfer up to its weighted
+    share, but idle capacity is lent to whoever asks for it.
+    """
+
+    def __init__(self, concurrency=0, bandwidth=0):
+        self.concurrency = concurrency
+        self.bandwidth = bandwidth
+
+        self.weights = {}
+        self.transferring = {}
+        self.waiting = {}
+        self.wakeups = {}
+        self._allowance = float(bandwidth)
+        self._stamp = time()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.getint('GLOBAL_CONCURRENT_REQUESTS'),
+                   settings.getint('GLOBAL_BANDWIDTH_LIMIT'))
+
+    @property
+    def enabled(self):
+        return bool(self.concurrency or self.bandwidth)
+
+    @property
+    def total_transferring(self):
+        return sum(self.transferring.values())
+
+    def register(self, owner, weight=1.0, wakeup=None):
+        self.weights[owner] = max(float(weight), 0.01)
+        self.transferring.setdefault(owner, 0)
+        if wakeup is not None:
+            self.wakeups[owner] = wakeup
+
+    def unregister(self, owner):
+        self.weights.pop(owner, None)
+        self.transferring.pop(owner, None)
+        self.waiting.pop(owner, None)
+        self.wakeups.pop(owner, None)
+        self._notify()
+
+    def share(self, owner):
+        """Concurrency ``owner`` is guaranteed when every crawler is busy"""
+        if not self.concurrency:
+            return 0
+        total_weight = sum(self.weights.values()) or 1.0
+        return max(1, int(self.concurrency * self.weights.get(owner, 1.0) / total_weight))
+
+    def bandwidth_delay(self):
+        """Seconds until the bandwidth allowance is positive again"""
+        if not self.bandwidth:
+            return 0
+        self._refill()
+        if self._allowance >= 0:
+            return 0
+        return -self._allowance / self.bandwidth
+
+    def free(self, owner):
+        if self.concurrency:
+            if self.total_transferring >= self.concurrency:
+                return False
+            if self.transferring.get(owner, 0) >= self.share(owner) \
+                    and any(o is not owner for o in self.waiting):
+                return False
+        return not self.bandwidth_delay()
+
+    def acquire(self, owner):
+        """Take one transfer slot if available, otherwise queue ``owner`` for a wakeup"""
+        if not self.free(owner):
+            self.waiting.setdefault(owner, time())
+            return False
+        self.waiting.pop(owner, None)
+        self.transferring[owner] = self.transferring.get(owner, 0) + 1
+        return True
+
+    def release(self, owner, nbytes=0):
+        if self.transferring.get(owner):
+            self.transferring[owner] -= 1
+        if self.bandwidth and nbytes:
+            self._refill()
+            self._allowance -= nbytes
+        self._notify()
+
+    def _refill(self):
+        now = time()
+        self._allowance = min(float(self.bandwidth), self._allowance + (now - self._stamp) * self.bandwidth)
+        self._stamp = now
+
+    def _notify(self):
+        # wake the longest waiting crawlers first so shares are honored fairly
+        for owner in sorted(self.waiting, key=self.waiting.get):
+            wakeup = self.wakeups.get(owner)
+            if wakeup is not None:
+                wakeup()
+
+    def __repr__(self):
+        return "%s(concurrency=%r, bandwidth=%r, transferring=%d)" % (
+            self.__class__.__name__, self.concurrency, self.bandwidth, self.total_transferring)
@@ -0,0 +1,109 @@
+from time import time
+
+
+class SlotController:
+    """Concurrency limit of one downloader slot, learnt from its latency and errors
+
+    Every ``window`` responses the controller takes one decision:
+
+    * more than ``max_error_rate`` errors: multiply the limit by ``backoff``
+      (multiplicative decrease)
+    * average latency above ``tolerance`` times the lowest latency seen (the
+      host is queueing): scale the limit by that gradient, but not below the
+      Little's law estimate ``throughput * min_rtt * tolerance`` of what the
+      host serves without queueing
+    * otherwise, when the limit was actually used, add one (additive increase)
+
+    Every ``probe_interval`` decisions the limit is halved for one window
+    (``probe``) and the lowest latency of that window becomes the new
+    baseline, so a host that got slower for good does not keep a stale one
+    while queueing is not mistaken for its normal latency.
+    """
+
+    def __init__(self, limit, min_limit=1, max_limit=64, window=20, tolerance=1.5,
+                 backoff=0.7, max_error_rate=0.1, probe_interval=10):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(limit, min_limit), max_limit))
+        self.window = window
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.max_error_rate = max_error_rate
+        self.probe_interval = probe_interval
+        self.min_rtt = None
+        self.decisions = 0
+        self.probe_limit = None
+        self._reset(None)
+
+    def _reset(self, now):
+        self.samples = 0
+        self.errors = 0
+        self.rtt_sum = 0.0
+        self.window_min_rtt = None
+        self.max_in_flight = 0
+        self.started = now
+
+    def sample(self, rtt, in_flight, error=False, now=None):
+        """Record one response (or failure), return the decision once the window is full
+
+        The decision is one of ``increase``, ``hold``, ``decrease_latency``,
+        ``decrease_errors`` and ``probe``, or None while the window is filling.
+        """
+        now = time() if now is None else now
+        if self.started is None:
+            self.started = now - rtt
+        self.samples += 1
+        self.max_in_flight = max(self.max_in_flight, in_flight)
+        if error:
+            self.errors += 1
+        else:
+            self.rtt_sum += rtt
+            if self.window_min_rtt is None or rtt < self.window_min_rtt:
+                self.window_min_rtt = rtt
+        if self.samples < self.window:
+            return None
+        decision = self._decide(now)
+        self._reset(now)
+        return decision
+
+    def _decide(self, now):
+        self.decisions += 1
+        if self.probe_limit is not None:
+            # end of a probe window, its latency is the host's unloaded latency
+            if self.window_min_rtt is not None:
+                self.min_rtt = self.window_min_rtt
+            self.limit, self.probe_limit = self.probe_limit, None
+            return 'hold'
+        if self.window_min_rtt is not None and (self.min_rtt is None or self.window_min_rtt < self.min_rtt):
+            self.min_rtt = self.window_min_rtt
+
+        successes = self.samples - self.errors
+        if self.errors / self.samples > self.max_error_rate or not successes:
+            self.limit *= self.backoff
+            decision = 'decrease_errors'
+        else:
+            avg_rtt = self.rtt_sum / successes
+            acceptable = self.min_rtt * self.tolerance
+            if avg_rtt > acceptable:
+                throughput = self.samples / max(now - self.started, 1e-6)
+                little = throughput * acceptable
+                self.limit = min(self.limit, max(little, self.limit * max(0.5, acceptable / avg_rtt)))
+                decision = 'decrease_latency'
+            elif self.max_in_flight >= self.limit - 1:
+                self.limit += 1
+                decision = 'increase'
+            else:
+                decision = 'hold'
+        self.limit = min(max(self.limit, self.min_limit), self.max_limit)
+        if self.probe_interval and self.decisions % self.probe_interval == 0:
+            self.probe_limit = self.limit
+            self.limit = max(self.min_limit, self.limit / 2)
+            decision = 'probe'
+        return decision
+
+    @property
+    def concurrency(self):
+        return max(self.min_limit, int(round(self.limit)))
+
+    def __repr__(self):
+        return "%s(limit=%0.1f, min_rtt=%r)" % (self.__class__.__name__, self.limit, self.min_rtt)
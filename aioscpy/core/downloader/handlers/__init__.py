@@ -0,0 +1,6 @@
+def proxy_routes(settings):
+    """Number of routes out of the crawler: the PROXY_POOL proxies plus the direct one.
+    Handlers keying pooled clients by proxy size their pool from it."""
+    if not settings.getbool('PROXY_POOL_ENABLED'):
+        return 1
+    return len(settings.getlist('PROXY_POOL')) + 1
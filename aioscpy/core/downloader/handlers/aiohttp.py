@@ -1,11 +1,14 @@
 import asyncio
-import ssl
 import aiohttp
 import ujson
 import json
 
 from anti_header import Headers
-from anti_useragent.utils.cipers import generate_cipher
+from yarl import URL
+
+from aioscpy.core.downloader.handlers.streaming import CHUNK_SIZE, BodyCollector
+from aioscpy.core.downloader.handlers.tls import SSLContextPool
+from aioscpy.utils.othtypes import urlparse_cached
 
 
 class AioHttpDownloadHandler(object):
@@ -13,22 +16,19 @@ class AioHttpDownloadHandler(object):
     def __init__(self, settings, crawler):
         self.settings = settings
         self.crawler = crawler
-        self.aiohttp_client_session = {
-            'timeout': aiohttp.ClientTimeout(total=20),
-            'trust_env': True,
-            'json_serialize': ujson.dumps,
-            "connector": aiohttp.TCPConnector(
-                verify_ssl=False,
-                limit=1000,
-                force_close=True,
-                use_dns_cache=False,
-                limit_per_host=200,
-                enable_cleanup_closed=True
-            )
-        }
-        self.session_stats = self.settings.getbool("REQUESTS_SESSION_STATS", False)
+        self.stats = getattr(crawler, 'stats', None)
+        # REQUESTS_SESSION_STATS is the historical switch for the shared session
+        self.pooled = settings.getbool('AIOHTTP_POOLED', True) or settings.getbool("REQUESTS_SESSION_STATS", False)
+        self.limit = settings.getint('AIOHTTP_POOL_LIMIT') or settings.getint('CONCURRENT_REQUESTS', 16)
+        self.limit_per_host = settings.getint('AIOHTTP_POOL_LIMIT_PER_HOST') or \
+            settings.getint('CONCURRENT_REQUESTS_PER_IP') or settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN', 8)
+        self.keepalive_timeout = settings.getfloat('AIOHTTP_KEEPALIVE_TIMEOUT', 15.0)
+        self.dns_cache_ttl = settings.getint('AIOHTTP_DNS_CACHE_TTL', 300)
+        self.max_redirects = settings.getint('AIOHTTP_MAX_REDIRECTS', 10)
+        self.resolver = getattr(crawler, 'resolver', None)
         self.session = None
         self.context = None
+        self.ssl_contexts = None
 
     @classmethod
     def from_settings(cls, settings, crawler):
@@ -38,10 +38,62 @@ class AioHttpDownloadHandler(object):
     def from_crawler(cls, crawler):
         return cls.from_settings(crawler.settings, crawler)
 
+    def _get_session(self):
+        """Return the shared session, created on first use inside the running loop"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                ssl=False,
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                # the shared resolver caches lookups itself, aiohttp's cache is the fallback
+                resolver=self.resolver,
+                use_dns_cache=self.resolver is None,
+                ttl_dns_cache=self.dns_cache_ttl,
+                enable_cleanup_closed=True,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.settings.getfloat('DOWNLOAD_TIMEOUT', 20)),
+                trust_env=True,
+                json_serialize=ujson.dumps,
+                # every request carries its own cookies, the shared session must not keep any
+                cookie_jar=aiohttp.DummyCookieJar(),
+                trace_configs=[self._trace_config()] if self.stats is not None else None,
+            )
+        return self.session
+
+    def _trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+
+        def inc(key):
+            async def callback(session, context, params):
+                self.stats.inc_value(key)
+            return callback
+
+        trace_config.on_connection_create_end.append(inc('aiohttp/pool/connections_created'))
+        trace_config.on_connection_reuseconn.append(inc('aiohttp/pool/connections_reused'))
+        trace_config.on_connection_queued_start.append(inc('aiohttp/pool/queued'))
+        trace_config.on_dns_cache_hit.append(inc('aiohttp/dns_cache/hit'))
+        trace_config.on_dns_cache_miss.append(inc('aiohttp/dns_cache/miss'))
+        return trace_config
+
+    def pool_stats(self):
+        """Connections currently checked out of and idling in the shared pool"""
+        connector = self.session.connector if self.session is not None else None
+        if connector is None or connector.closed:
+            return {'acquired': 0, 'idle': 0, 'limit': self.limit, 'limit_per_host': self.limit_per_host}
+        # aiohttp has no public counters, the connector internals may go away
+        return {
+            'acquired': len(getattr(connector, '_acquired', ())),
+            'idle': sum(len(conns) for conns in getattr(connector, '_conns', {}).values()),
+            'limit': connector.limit,
+            'limit_per_host': connector.limit_per_host,
+        }
+
     async def download_request(self, request, spider):
         session_kwargs = {
-            'timeout': self.settings.get('DOWNLOAD_TIMEOUT'),
-            'cookies': dict(request.cookies),
+            'timeout': aiohttp.ClientTimeout(total=self.settings.getfloat('DOWNLOAD_TIMEOUT', 20)),
             "data": request.body,
             "json": request.json
         }
@@ -51,34 +103,73 @@ class AioHttpDownloadHandler(object):
         session_kwargs['headers'] = headers
 
         if request.meta.get('TLS_CIPHERS') or self.settings.get('TLS_CIPHERS'):
-            self.context = ssl.create_default_context()
-            self.context.set_ciphers(generate_cipher())
-            session_kwargs['ssl'] = self.context
+            if self.ssl_contexts is None:
+                self.ssl_contexts = SSLContextPool.from_settings(self.settings, self.logger)
+            # the connector only reuses connections opened with the same context object
+            _, session_kwargs['ssl'] = self.ssl_contexts.get(urlparse_cached(request).hostname)
 
         if request.meta.get("proxy"):
             session_kwargs["proxy"] = request.meta['proxy']
             self.logger.debug(f"use {request.meta['proxy']} crawling: {request.url}")
 
-        if self.session_stats:
-            if self.session is None:
-                self.session = aiohttp.ClientSession(**self.aiohttp_client_session)
-            response = await self.session.request(request.method, request.url, **session_kwargs)
-            content = await response.read()
+        collector = BodyCollector.from_handler(self, request, spider)
+        if self.pooled:
+            response = await self._fetch(self._get_session(), request, session_kwargs, collector)
         else:
             async with aiohttp.ClientSession(
                 timeout=aiohttp.ClientTimeout(total=20),
                 trust_env=True,
-                connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
-                async with session.request(request.method, request.url, **session_kwargs) as response:
-                    content = await response.read()
+                connector=aiohttp.TCPConnector(ssl=False)) as session:
+                response = await self._fetch(session, request, session_kwargs, collector)
+        content = collector.getvalue()
 
-        return self.di.get("response")(
+        return collector.finish(self.di.get("response")(
             str(response.url),
             status=response.status,
             headers=response.headers,
             body=content,
+            flags=collector.flags,
             cookies=response.cookies,
-            _response=response)
+            _response=response))
+
+    async def _fetch(self, session, request, session_kwargs, collector):
+        """Stream the response, following redirects here: the cookies of the
+        request and those set along the way live in a jar of this request only,
+        the shared session's jar never keeps any"""
+        method, url = request.method, URL(request.url)
+        jar = aiohttp.CookieJar(unsafe=True)
+        jar.update_cookies(dict(request.cookies), url)
+        headers = dict(session_kwargs.pop('headers') or {})
+
+        for _ in range(self.max_redirects + 1):
+            # sent as a header, the session would drop cookies of IP hosts
+            hop_headers = dict(headers)
+            cookie = '; '.join(f'{name}={morsel.coded_value}' for name, morsel in jar.filter_cookies(url).items())
+            if cookie:
+                hop_headers['Cookie'] = f"{headers['Cookie']}; {cookie}" if headers.get('Cookie') else cookie
+            async with session.request(method, url, headers=hop_headers, allow_redirects=False,
+                                       **session_kwargs) as response:
+                location = response.headers.get('Location') if response.status in (301, 302, 303, 307, 308) else None
+                if location is None:
+                    if self.stats is not None and self.pooled:
+                        self.stats.max_value('aiohttp/pool/max_acquired', self.pool_stats()['acquired'])
+                    await self._read(response, collector)
+                    return response
+                jar.update_cookies(response.cookies, response.url)
+                # drain the redirect so its connection goes back to the pool
+                await response.read()
+            url = response.url.join(URL(location))
+            if (response.status == 303 and method != 'HEAD') or (response.status in (301, 302) and method == 'POST'):
+                method = 'GET'
+                session_kwargs.update(data=None, json=None)
+        raise aiohttp.TooManyRedirects(response.request_info, (response,))
+
+    @staticmethod
+    async def _read(response, collector):
+        if await collector.headers_received(response.headers):
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                if not await collector.bytes_received(chunk):
+                    break
 
     async def close(self):
         if self.session is not None:
@@ -1,10 +1,19 @@
 import asyncio
+import inspect
 import random
 
+from collections import OrderedDict
+
 from curl_cffi.requests import AsyncSession
 
 from anti_header import Headers
 
+from aioscpy.core.downloader.handlers import proxy_routes
+from aioscpy.core.downloader.handlers.streaming import CHUNK_SIZE, BodyCollector
+
+# keep response cookies out of pooled sessions where curl_cffi allows it
+_DISCARD_COOKIES = 'discard_cookies' in inspect.signature(AsyncSession.request).parameters
+
 
 class CurlCffiDownloadHandler(object):
 
@@ -33,6 +42,13 @@ class CurlCffiDownloadHandler(object):
             "safari15_3",
             "safari15_5",
         ]
+        # one session per (impersonation profile, proxy): by default room for all of them
+        profiles = len(self.browsers) if settings.getbool('TLS_CIPHERS') else 1
+        self.max_sessions = settings.getint('CURL_CFFI_MAX_SESSIONS') or max(16, proxy_routes(settings) * profiles)
+        self.max_clients = settings.getint('CURL_CFFI_MAX_CLIENTS', 10)
+        self.sessions = OrderedDict()
+        # delayed closes of evicted sessions, referenced so they are not collected mid-flight
+        self.closing = {}
 
     @classmethod
     def from_settings(cls, settings, crawler):
@@ -42,6 +58,34 @@ class CurlCffiDownloadHandler(object):
     def from_crawler(cls, crawler):
         return cls.from_settings(crawler.settings, crawler)
 
+    def _get_session(self, impersonate=None, proxy=None):
+        """Return the pooled session for an (impersonate, proxy) pair, creating it if needed"""
+        key = (impersonate, proxy)
+        session = self.sessions.get(key)
+        if session is not None:
+            self.sessions.move_to_end(key)
+            return session
+
+        session_args = {'max_clients': self.max_clients}
+        if impersonate:
+            session_args['impersonate'] = impersonate
+        if proxy:
+            session_args['proxies'] = {'http': proxy, 'https': proxy}
+        session = AsyncSession(**session_args)
+        self.sessions[key] = session
+
+        while len(self.sessions) > self.max_sessions:
+            _, evicted = self.sessions.popitem(last=False)
+            task = asyncio.create_task(self._close_session_later(evicted))
+            self.closing[task] = evicted
+            task.add_done_callback(lambda task: self.closing.pop(task, None))
+        return session
+
+    async def _close_session_later(self, session):
+        # give requests still running on an evicted session the chance to finish
+        await asyncio.sleep(self.settings.getfloat('DOWNLOAD_TIMEOUT', 20))
+        await session.close()
+
     async def download_request(self, request, spider):
         headers = request.headers
         if isinstance(headers, Headers):
@@ -55,27 +99,41 @@ class CurlCffiDownloadHandler(object):
             "json": request.json
         }
 
+        if _DISCARD_COOKIES:
+            session_kwargs['discard_cookies'] = True
+
+        impersonate = None
         if request.meta.get('TLS_CIPHERS') or self.settings.get('TLS_CIPHERS'):
-            session_kwargs['impersonate'] = random.choice(self.browsers)
-
-        if request.meta.get("proxy"):
-            session_kwargs['proxies'] = {
-                'http': request.meta["proxy"],
-                'https': request.meta["proxy"]
-            }
-            self.logger.debug(f"use {request.meta['proxy']} crawling: {request.url}")
-        
-        async with AsyncSession() as session:
-            response = await session.request(request.method, request.url, **session_kwargs)
-            content = response.content
-
-        return self.di.get("response")(
+            impersonate = random.choice(self.browsers)
+
+        proxy = request.meta.get("proxy")
+        if proxy:
+            self.logger.debug(f"use {proxy} crawling: {request.url}")
+
+        session = self._get_session(impersonate, proxy)
+        collector = BodyCollector.from_handler(self, request, spider)
+        async with session.stream(request.method, request.url, **session_kwargs) as response:
+            if await collector.headers_received(response.headers):
+                async for chunk in response.aiter_content(CHUNK_SIZE):
+                    if not await collector.bytes_received(chunk):
+                        break
+        content = collector.getvalue()
+
+        return collector.finish(self.di.get("response")(
             str(response.url),
             status=response.status_code,
             headers=response.headers,
             body=content,
+            flags=collector.flags,
             cookies=response.cookies,
-            _response=response)
+            _response=response))
 
     async def close(self):
-        await asyncio.sleep(0.1)
+        sessions, self.sessions = list(self.sessions.values()), OrderedDict()
+        # evicted sessions are closed now instead of after their delay
+        closing, self.closing = self.closing, {}
+        for task in closing:
+            task.cancel()
+        sessions.extend(closing.values())
+        await asyncio.gather(*closing, return_exceptions=True)
+        await asyncio.gather(*[session.close() for session in sessions], return_exceptions=True)
@@ -1,9 +1,20 @@
 import asyncio
-import ssl
+import inspect
 import httpx
 
+from collections import OrderedDict
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
 from anti_header import Headers
-from anti_useragent.utils.cipers import generate_cipher
+
+from aioscpy.exceptions import DownloadError, StopDownload
+from aioscpy.utils.othtypes import urlparse_cached
+from aioscpy.core.downloader.handlers import proxy_routes
+from aioscpy.core.downloader.handlers.streaming import CHUNK_SIZE, BodyCollector
+from aioscpy.core.downloader.handlers.tls import SSLContextPool
+
+# httpx>=0.26 takes a single ``proxy``, older releases only know ``proxies``
+_PROXY_ARG = 'proxy' if 'proxy' in inspect.signature(httpx.AsyncClient.__init__).parameters else 'proxies'
 
 
 class HttpxDownloadHandler(object):
@@ -12,6 +23,30 @@ class HttpxDownloadHandler(object):
         self.settings = settings
         self.crawler = crawler
         self.context = None
+        self.limits = httpx.Limits(
+            max_connections=settings.getint('HTTPX_MAX_CONNECTIONS', 100),
+            max_keepalive_connections=settings.getint('HTTPX_MAX_KEEPALIVE_CONNECTIONS', 20),
+            keepalive_expiry=settings.getfloat('HTTPX_KEEPALIVE_EXPIRY', 5.0),
+        )
+        # one client per (proxy, TLS profile): by default room for all of them
+        profiles = settings.getint('TLS_CONTEXT_POOL_SIZE', 8) if settings.getbool('TLS_CIPHERS') else 1
+        self.max_clients = settings.getint('HTTPX_MAX_CLIENTS') or max(32, proxy_routes(settings) * profiles)
+        self.clients = OrderedDict()
+        # delayed closes of evicted clients, referenced so they are not collected mid-flight
+        self.closing = {}
+        self.stats = getattr(crawler, 'stats', None)
+        self.http2 = settings.getbool('HTTPX_HTTP2', False)
+        if self.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                self.http2 = False
+                self.logger.warning("HTTPX_HTTP2 needs the h2 package (pip install httpx[http2]), using HTTP/1.1")
+        # streams multiplexed on one HTTP/2 connection are bounded by the downloader slot
+        # concurrency already, HTTPX_HTTP2_MAX_STREAMS lowers that bound per slot
+        self.max_streams = settings.getint('HTTPX_HTTP2_MAX_STREAMS', 0)
+        self.streams = {}
+        self.ssl_contexts = None
 
     @classmethod
     def from_settings(cls, settings, crawler):
@@ -21,48 +56,91 @@ class HttpxDownloadHandler(object):
     def from_crawler(cls, crawler):
         return cls.from_settings(crawler.settings, crawler)
 
+    def _get_client(self, proxy=None, tls_profile=None, verify=True):
+        """Return the pooled client for a (proxy, TLS profile) pair, creating it if needed"""
+        key = (proxy, tls_profile)
+        client = self.clients.get(key)
+        if client is not None:
+            self.clients.move_to_end(key)
+            return client
+
+        httpx_client_session = {
+            'limits': self.limits,
+            'verify': verify,
+            'http2': self.http2,
+            # never store response cookies, they would leak into unrelated requests
+            'cookies': CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        }
+        if proxy:
+            httpx_client_session[_PROXY_ARG] = proxy
+        client = httpx.AsyncClient(**httpx_client_session)
+        self.clients[key] = client
+
+        while len(self.clients) > self.max_clients:
+            _, evicted = self.clients.popitem(last=False)
+            task = asyncio.create_task(self._close_client_later(evicted))
+            self.closing[task] = evicted
+            task.add_done_callback(lambda task: self.closing.pop(task, None))
+        return client
+
+    async def _close_client_later(self, client):
+        # give requests still running on an evicted client the chance to finish
+        await asyncio.sleep(self.settings.getfloat('DOWNLOAD_TIMEOUT', 20))
+        await client.aclose()
+
     async def download_request(self, request, spider):
         headers = request.headers
         if isinstance(headers, Headers):
             headers = headers.to_unicode_dict()
-        httpx_client_session = {}
+        verify, tls_profile = True, None
 
-        # Configure TLS settings if needed
+        # Randomized ciphers come from the context pool, one client per pooled context
         if request.meta.get('TLS_CIPHERS') or self.settings.get('TLS_CIPHERS'):
-            try:
-                self.context = ssl.create_default_context()
-                self.context.set_ciphers(generate_cipher())
-                httpx_client_session['verify'] = self.context
-            except Exception as e:
-                self.logger.warning(f"Error configuring TLS for {request.url}: {str(e)}")
+            if self.ssl_contexts is None:
+                self.ssl_contexts = SSLContextPool.from_settings(self.settings, self.logger)
+            tls_profile, verify = self.ssl_contexts.get(urlparse_cached(request).hostname)
 
         # Configure proxy if specified
-        if request.meta.get("proxy"):
-            httpx_client_session['proxies'] = request.meta["proxy"]
-            self.logger.debug(f"Using proxy {request.meta['proxy']} for: {request.url}")
+        proxy = request.meta.get("proxy")
+        if proxy:
+            self.logger.debug(f"Using proxy {proxy} for: {request.url}")
 
-        # Prepare session arguments
+        # Pooled clients must not keep cookies, so send the request's own as a header
+        if request.cookies:
+            headers = dict(headers)
+            cookie = '; '.join(f'{k}={v}' for k, v in dict(request.cookies).items())
+            headers['Cookie'] = f"{headers['Cookie']}; {cookie}" if headers.get('Cookie') else cookie
+
+        # Prepare session arguments, redirects are followed by _fetch
         session_kwargs = {
             'timeout': self.settings.get('DOWNLOAD_TIMEOUT'),
-            'cookies': dict(request.cookies),
             'headers': headers,
-            'follow_redirects': True,
             "data": request.body,
             "json": request.json
         }
 
         try:
-            async with httpx.AsyncClient(**httpx_client_session) as session:
-                response = await session.request(request.method, request.url, **session_kwargs)
-                content = response.read()
-
-            return self.di.get("response")(
+            session = self._get_client(proxy, tls_profile, verify)
+            collector = BodyCollector.from_handler(self, request, spider)
+            if self.http2 and self.max_streams:
+                response = await self._request_stream(session, request, session_kwargs, collector)
+            else:
+                response = await self._fetch(session, request, session_kwargs, collector)
+            content = collector.getvalue()
+            if self.stats is not None:
+                self.stats.inc_value(f'httpx/protocol/{response.http_version}')
+
+            return collector.finish(self.di.get("response")(
                 str(response.url),
                 status=response.status_code,
                 headers=response.headers,
                 body=content,
+                flags=collector.flags,
                 cookies=response.cookies,
-                _response=response)
+                _response=response))
+
+        except (DownloadError, StopDownload):
+            raise
 
         except httpx.TimeoutException as e:
             self.logger.warning(f"Request to {request.url} timed out: {str(e)}")
@@ -76,5 +154,58 @@ class HttpxDownloadHandler(object):
             self.logger.error(f"Unexpected error when downloading {request.url}: {str(e)}")
             raise self.di.get("exceptions").DownloadError(f"Unexpected error: {str(e)}")
 
+    async def _fetch(self, session, request, session_kwargs, collector):
+        """Stream the response, following redirects here: the cookies of the
+        request and those set along the way live in a jar of this request only,
+        the pooled client's jar never keeps any"""
+        jar = httpx.Cookies()
+        hostname = urlparse_cached(request).hostname
+        for name, value in dict(request.cookies).items():
+            jar.set(name, value, domain=hostname)
+
+        history = []
+        http_request = session.build_request(request.method, request.url, **session_kwargs)
+        for _ in range(session.max_redirects + 1):
+            response = await session.send(http_request, stream=True, follow_redirects=False)
+            try:
+                if response.next_request is None:
+                    response.history = history
+                    if await collector.headers_received(response.headers):
+                        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                            if not await collector.bytes_received(chunk):
+                                break
+                    return response
+                jar.extract_cookies(response)
+                # drain the redirect so its connection goes back to the pool
+                await response.aread()
+            finally:
+                await response.aclose()
+            history.append(response)
+            http_request = response.next_request
+            jar.set_cookie_header(http_request)
+        raise httpx.TooManyRedirects('Exceeded maximum allowed redirects.', request=http_request)
+
+    async def _request_stream(self, session, request, session_kwargs, collector):
+        key = request.meta.get('download_slot') or urlparse_cached(request).hostname
+        # [semaphore, requests holding or waiting on it], dropped once nobody uses it
+        streams = self.streams.get(key)
+        if streams is None:
+            streams = self.streams[key] = [asyncio.Semaphore(self.max_streams), 0]
+        streams[1] += 1
+        try:
+            async with streams[0]:
+                return await self._fetch(session, request, session_kwargs, collector)
+        finally:
+            streams[1] -= 1
+            if not streams[1]:
+                self.streams.pop(key, None)
+
     async def close(self):
-        await asyncio.sleep(0.1)
+        clients, self.clients = list(self.clients.values()), OrderedDict()
+        # evicted clients are closed now instead of after their delay
+        closing, self.closing = self.closing, {}
+        for task in closing:
+            task.cancel()
+        clients.extend(closing.values())
+        await asyncio.gather(*closing, return_exceptions=True)
+        await asyncio.gather(*[client.aclose() for client in clients], return_exceptions=True)
@@ -1,8 +1,15 @@
 import asyncio
 import pyhttpx
 
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
 from anti_header import Headers
 
+from aioscpy.core.downloader.handlers.streaming import BodyCollector
+from aioscpy.utils.othtypes import urlparse_cached
+
 
 class PyHttpxDownloadHandler(object):
 
@@ -10,6 +17,13 @@ class PyHttpxDownloadHandler(object):
         self.settings = settings
         self.crawler = crawler
         self.context = None
+        self.max_workers = settings.getint('PYHTTPX_MAX_WORKERS') or settings.getint('CONCURRENT_REQUESTS', 16)
+        self.max_sessions = settings.getint('PYHTTPX_MAX_SESSIONS', 64)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='aioscpy-pyhttpx')
+        # idle sessions keyed by (netloc, proxy), least recently used first;
+        # a HttpSession keeps per-request state, so it is checked out by one request at a time
+        self.sessions = OrderedDict()
+        self.idle_count = 0
 
     @classmethod
     def from_settings(cls, settings, crawler):
@@ -19,6 +33,36 @@ class PyHttpxDownloadHandler(object):
     def from_crawler(cls, crawler):
         return cls.from_settings(crawler.settings, crawler)
 
+    def _inc_stats(self, key):
+        stats = getattr(self.crawler, 'stats', None)
+        if stats is not None:
+            stats.inc_value(key)
+
+    def _acquire(self, key):
+        """Take an idle session for ``key``, or open a new one"""
+        idle = self.sessions.get(key)
+        if idle:
+            self.sessions.move_to_end(key)
+            self.idle_count -= 1
+            self._inc_stats('pyhttpx/sessions_reused')
+            return idle.pop()
+        self._inc_stats('pyhttpx/sessions_created')
+        return pyhttpx.HttpSession(http2=True)
+
+    def _release(self, key, session):
+        """Give ``session`` back to the pool, closing the least recently used ones past ``max_sessions``"""
+        # never keep response cookies, they would leak into unrelated requests
+        session.cookie_manger.cookies.clear()
+        self.sessions.setdefault(key, []).append(session)
+        self.sessions.move_to_end(key)
+        self.idle_count += 1
+        while self.idle_count > self.max_sessions:
+            oldest_key, idle = next(iter(self.sessions.items()))
+            idle.pop(0).close()
+            self.idle_count -= 1
+            if not idle:
+                del self.sessions[oldest_key]
+
     async def download_request(self, request, spider):
         headers = request.headers
         if isinstance(headers, Headers):
@@ -32,21 +76,42 @@ class PyHttpxDownloadHandler(object):
             "json": request.json
         }
 
-        if request.meta.get("proxy"):
-            pyhttpx_client_session['proxies'] = {'https': request.meta["proxy"]}
-            self.logger.debug(f"use {request.meta['proxy']} crawling: {request.url}")
-        
-        session_args = {'http2': True}
-        with pyhttpx.HttpSession(**session_args) as session:
-            response = await asyncio.to_thread(session.request, request.method, request.url, **pyhttpx_client_session)
+        proxy = request.meta.get("proxy")
+        if proxy:
+            pyhttpx_client_session['proxies'] = {'https': proxy}
+            self.logger.debug(f"use {proxy} crawling: {request.url}")
+
+        key = (urlparse_cached(request).netloc, proxy)
+        session = self._acquire(key)
+        future = self.executor.submit(
+            partial(session.request, request.method, request.url, **pyhttpx_client_session))
+        try:
+            response = await asyncio.wrap_future(future)
+        except BaseException:
+            # the connection state of a failed session is unknown, drop it; a cancelled
+            # request leaves it to the worker thread, so close it once that is done
+            future.add_done_callback(lambda _: session.close())
+            raise
+        self._release(key, session)
+
+        # pyhttpx reads the whole body itself, the limits can only be checked afterwards
+        collector = BodyCollector.from_handler(self, request, spider)
+        if await collector.headers_received(response.headers):
+            await collector.bytes_received(response.content)
 
-        return self.di.get("response")(
+        return collector.finish(self.di.get("response")(
             str(request.url),
             status=response.status_code,
             headers=response.headers,
-            body=response.content,
+            body=collector.getvalue(),
+            flags=collector.flags,
             cookies=response.cookies,
-            _response=response)
+            _response=response))
 
     async def close(self):
-        await asyncio.sleep(0.1)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        sessions, self.sessions = list(self.sessions.values()), OrderedDict()
+        self.idle_count = 0
+        for idle in sessions:
+            for session in idle:
+                session.close()
@@ -1,15 +1,49 @@
 import asyncio
+import threading
 import requests
 
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.ssl_ import create_urllib3_context
+
 from anti_header import Headers
 from anti_useragent.utils.cipers import generate_cipher
 
+from aioscpy.core.downloader.handlers.streaming import CHUNK_SIZE, BodyCollector
+
+
+class CipherAdapter(HTTPAdapter):
+    """HTTPAdapter whose TLS connections use a randomized cipher list"""
+
+    def __init__(self, ciphers, *args, **kwargs):
+        self.ssl_context = create_urllib3_context(ciphers=ciphers)
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.ssl_context
+        return super().proxy_manager_for(*args, **kwargs)
+
 
 class RequestsDownloadHandler(object):
 
     def __init__(self, settings, crawler):
         self.settings = settings
         self.crawler = crawler
+        self.max_workers = settings.getint('REQUESTS_MAX_WORKERS') or settings.getint('CONCURRENT_REQUESTS', 16)
+        self.pool_connections = settings.getint('REQUESTS_POOL_CONNECTIONS', 10)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='aioscpy-requests')
+        self.local = threading.local()
+        self.sessions = []
+        self.sessions_lock = threading.Lock()
+        if settings.get('TLS_CIPHERS'):
+            requests.packages.urllib3.disable_warnings()
 
     @classmethod
     def from_settings(cls, settings, crawler):
@@ -32,12 +66,7 @@ class RequestsDownloadHandler(object):
             "json": request.json,
         }
 
-        if request.meta.get('TLS_CIPHERS') or self.settings.get('TLS_CIPHERS'):
-            requests.adapters.DEFAULT_RETRIES = 10
-            requests.packages.urllib3.disable_warnings()
-            cipers_real = generate_cipher()
-            self.logger.debug(cipers_real)
-            requests.packages.urllib3.util.ssl_.DEFAULT_CIPHERS = cipers_real
+        tls_ciphers = bool(request.meta.get('TLS_CIPHERS') or self.settings.get('TLS_CIPHERS'))
 
         if request.meta.get("proxy"):
             requests_client_session['proxies'] = {
@@ -48,15 +77,59 @@ class RequestsDownloadHandler(object):
 
 
         
-        response = await asyncio.to_thread(requests.request, request.method, request.url, **requests_client_session)
+        collector = BodyCollector.from_handler(self, request, spider)
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self.executor, partial(self._fetch, request, requests_client_session, collector, loop, tls_ciphers))
 
-        return self.di.get("response")(
+        return collector.finish(self.di.get("response")(
             str(response.url),
             status=response.status_code,
             headers=response.headers,
-            body=response.content,
+            body=collector.getvalue(),
+            flags=collector.flags,
             cookies=response.cookies,
-            _response=response)
+            _response=response))
+
+    def _get_session(self, tls_ciphers=False):
+        """Return this worker thread's session, one with randomized ciphers when ``tls_ciphers``"""
+        attr = 'cipher_session' if tls_ciphers else 'session'
+        session = getattr(self.local, attr, None)
+        if session is None:
+            session = requests.Session()
+            # never store response cookies, they would leak into unrelated requests
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            # a thread runs one request at a time, so one connection per host is enough
+            adapter_args = {'pool_connections': self.pool_connections, 'pool_maxsize': 1}
+            if tls_ciphers:
+                ciphers = generate_cipher()
+                self.logger.debug(ciphers)
+                adapter = CipherAdapter(ciphers, max_retries=10, **adapter_args)
+            else:
+                adapter = HTTPAdapter(**adapter_args)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            setattr(self.local, attr, session)
+            with self.sessions_lock:
+                self.sessions.append(session)
+        return session
+
+    def _fetch(self, request, requests_client_session, collector, loop, tls_ciphers=False):
+        def call(coro):
+            # signals and limits are checked on the event loop, the transfer stays in this thread
+            return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+        session = self._get_session(tls_ciphers)
+        with session.request(request.method, request.url, stream=True, **requests_client_session) as response:
+            if call(collector.headers_received(response.headers)):
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if not call(collector.bytes_received(chunk)):
+                        break
+        return response
 
     async def close(self):
-        await asyncio.sleep(0.1)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.sessions_lock:
+            sessions, self.sessions = self.sessions, []
+        for session in sessions:
+            session.close()
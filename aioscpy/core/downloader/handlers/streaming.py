@@ -0,0 +1,192 @@
+import inspect
+import tempfile
+
+from functools import partial
+
+from aioscpy import signals
+from aioscpy.http.response.spool import SpooledBody
+from aioscpy.exceptions import DownloadMaxSizeExceeded, StopDownload
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_size_limits(settings, request, spider=None):
+    """Return ``(maxsize, warnsize)`` for ``request``, 0 meaning no limit
+
+    ``request.meta['download_maxsize']`` / ``['download_warnsize']`` win over
+    the spider's ``download_maxsize`` / ``download_warnsize`` attributes,
+    which win over the DOWNLOAD_MAXSIZE / DOWNLOAD_WARNSIZE settings.
+    """
+    maxsize = getattr(spider, 'download_maxsize', settings.getint('DOWNLOAD_MAXSIZE'))
+    warnsize = getattr(spider, 'download_warnsize', settings.getint('DOWNLOAD_WARNSIZE'))
+    return (int(request.meta.get('download_maxsize', maxsize) or 0),
+            int(request.meta.get('download_warnsize', warnsize) or 0))
+
+
+class BodyCollector:
+    """Accumulate a response body chunk by chunk and stop it at ``maxsize`` bytes
+
+    ``headers_received`` and ``bytes_received`` are sent while streaming; a
+    receiver raising StopDownload ends the transfer and the handler returns
+    the partial response, flagged ``download_stopped``, through ``finish()``.
+    The collector of a hedge copy holds its signals and stats back, they are
+    only sent through ``replay()`` once the copy won the race.
+    """
+
+    def __init__(self, request, maxsize=0, warnsize=0, stats=None, logger=None, signals=None, spider=None,
+                 spool_size=0, spool_dir=None):
+        self.request = request
+        self.maxsize = maxsize
+        self.warnsize = warnsize
+        self.spool_size = spool_size
+        self.spool_dir = spool_dir
+        self.spool = None
+        self.stats = stats
+        self.logger = logger
+        self.signals = signals
+        self.spider = spider
+        self.chunks = []
+        self.size = 0
+        self.warned = False
+        self.stopped = None
+        # (size, effect) pairs held back while racing, None when sent right away
+        self.held = None
+
+    @classmethod
+    def from_handler(cls, handler, request, spider=None):
+        maxsize, warnsize = get_size_limits(handler.settings, request, spider)
+        collector = cls(request, maxsize, warnsize,
+                        stats=getattr(handler.crawler, 'stats', None),
+                        logger=handler.logger,
+                        signals=getattr(handler.crawler, 'signals', None), spider=spider,
+                        spool_size=handler.settings.getint('DOWNLOAD_SPOOL_SIZE'),
+                        spool_dir=handler.settings.get('DOWNLOAD_SPOOL_DIR'))
+        hedge_copy = request.meta.get('hedge_copy')
+        if hedge_copy:
+            collector.held = []
+            hedge_copy.collector = collector
+        return collector
+
+    @property
+    def flags(self):
+        return ['download_stopped'] if self.stopped is not None else []
+
+    async def headers_received(self, headers):
+        """Check the announced Content-Length before any byte of the body is read,
+        return False when a signal receiver stopped the download"""
+        try:
+            expected = int(headers.get('Content-Length') or headers.get('content-length') or -1)
+        except (TypeError, ValueError):
+            expected = -1
+        if self.maxsize and expected > self.maxsize:
+            self._abort(f"Cancelling download of {self.request.url}: expected response "
+                        f"size ({expected}) larger than download max size ({self.maxsize}).")
+        if self.warnsize and expected > self.warnsize:
+            self._warn(f"Expected response size ({expected}) larger than "
+                       f"download warn size ({self.warnsize}) in request {self.request}.")
+        await self._send(signals.headers_received, headers=headers, body_length=expected)
+        return self.stopped is None
+
+    async def bytes_received(self, chunk):
+        """Add ``chunk`` to the body, return False when the download must stop"""
+        if not chunk:
+            return self.stopped is None
+        self.size += len(chunk)
+        if self.spool is not None:
+            self.spool.write(chunk)
+        else:
+            self.chunks.append(chunk)
+            if self.spool_size and self.size > self.spool_size:
+                self._start_spool()
+        if self.maxsize and self.size > self.maxsize:
+            self._abort(f"Received ({self.size}) bytes larger than download "
+                        f"max size ({self.maxsize}) in request {self.request}.")
+        if self.warnsize and self.size > self.warnsize:
+            self._warn(f"Received more bytes than download "
+                       f"warn size ({self.warnsize}) in request {self.request}.")
+        await self._send(signals.bytes_received, data=chunk)
+        return self.stopped is None
+
+    def getvalue(self):
+        """The body as ``bytes``, or as a SpooledBody once it passed ``spool_size``"""
+        if self.spool is not None:
+            return SpooledBody(self.spool)
+        return b''.join(self.chunks)
+
+    def _start_spool(self):
+        self.spool = tempfile.TemporaryFile(prefix='aioscpy-body-', dir=self.spool_dir)
+        self.spool.writelines(self.chunks)
+        self.chunks = []
+        if self.stats is not None:
+            self._effect(partial(self.stats.inc_value, 'downloader/spooled_count'))
+
+    def finish(self, response):
+        """Return ``response``, or raise the StopDownload carrying it when it asked to fail"""
+        if self.stopped is not None and self.stopped.fail:
+            response.request = self.request
+            self.stopped.response = response
+            raise self.stopped
+        return response
+
+    async def replay(self, response):
+        """Send what was held back while this hedge copy raced its primary, and
+        return ``response`` as it would have been with the effects sent live"""
+        held, self.held = self.held or [], None
+        for size, effect in held:
+            result = effect()
+            if inspect.isawaitable(result):
+                await result
+            if self.stopped is not None:
+                # the body a live download would have stopped at
+                response = response.replace(body=response.body[:size], flags=response.flags + self.flags,
+                                            _response=response._response)
+                break
+        return self.finish(response)
+
+    def _effect(self, effect):
+        """Call ``effect`` now, or hold it for replay() along with the size it was called at"""
+        if self.held is not None:
+            self.held.append((self.size, effect))
+        else:
+            return effect()
+
+    async def _send(self, signal, **kwargs):
+        if self.signals is None:
+            return
+        if self.held is not None:
+            self._effect(partial(self._send, signal, **kwargs))
+            return
+        results = await self.signals.send_catch_log(
+            signal=signal, request=self.request, spider=self.spider, **kwargs)
+        for receiver, result in results:
+            if isinstance(result, StopDownload):
+                self.stopped = result
+                if self.logger is not None:
+                    self.logger.debug(f"Download stopped for {self.request} from signal handler {receiver}")
+
+    def _warn(self, message):
+        if self.warned:
+            return
+        self.warned = True
+        self._effect(partial(self._report_warning, message))
+
+    def _report_warning(self, message):
+        if self.stats is not None:
+            self.stats.inc_value('downloader/warnsize_count')
+        if self.logger is not None:
+            self.logger.warning(message)
+
+    def _abort(self, message):
+        self.chunks = []
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+        # an aborted hedge copy cannot win, nothing of it is ever reported
+        if self.held is not None:
+            raise DownloadMaxSizeExceeded(message)
+        if self.stats is not None:
+            self.stats.inc_value('downloader/maxsize_aborted_count')
+            self.stats.inc_value('downloader/maxsize_aborted_bytes', self.size)
+        if self.logger is not None:
+            self.logger.warning(message)
+        raise DownloadMaxSizeExceeded(message)
@@ -0,0 +1,93 @@
+import ssl
+
+from anti_useragent.utils.cipers import generate_cipher
+
+from aioscpy.utils.othtypes import LocalCache
+
+
+class _SessionSSLObject(ssl.SSLObject):
+    """Stores the TLS session of each finished handshake on its context"""
+
+    def _save_session(self):
+        session = self.session
+        if session is not None and self.server_hostname:
+            self.context.sessions[self.server_hostname] = session
+            self._has_ticket = session.has_ticket
+
+    def do_handshake(self):
+        super().do_handshake()
+        self._save_session()
+
+    def read(self, *args, **kwargs):
+        data = super().read(*args, **kwargs)
+        # TLS 1.3 tickets only arrive after the handshake, along with the first data
+        if getattr(self, '_has_ticket', True) is False:
+            self._save_session()
+        return data
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """Client context resuming the last TLS session of a host
+
+    asyncio, and so aiohttp and httpx, never pass ``session=`` when
+    wrapping a connection. The context looks up the stored session of the
+    server name itself.
+    """
+
+    sslobject_class = _SessionSSLObject
+
+    def __init__(self, protocol=ssl.PROTOCOL_TLS_CLIENT, maxhosts=10000):
+        self.sessions = LocalCache(maxhosts)
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if session is None and not server_side and server_hostname:
+            session = self.sessions.get(server_hostname)
+        return super().wrap_bio(incoming, outgoing, server_side=server_side,
+                                server_hostname=server_hostname, session=session)
+
+
+class SSLContextPool:
+    """A fixed set of SSL contexts with randomized cipher lists, shared by the handlers
+
+    The contexts are built once, on first use. New hosts are assigned the
+    contexts in turn, and a host keeps the same context afterwards. Its
+    keep-alive connections stay reusable, its new connections resume its
+    last TLS session, and the server sees a stable fingerprint for it.
+    Fingerprints still vary across hosts.
+    """
+
+    def __init__(self, size=8, maxhosts=10000, logger=None):
+        self.size = max(size, 1)
+        self.logger = logger
+        self.maxhosts = maxhosts
+        self.contexts = []
+        self.hosts = LocalCache(maxhosts)
+        self.next = 0
+
+    @classmethod
+    def from_settings(cls, settings, logger=None):
+        return cls(size=settings.getint('TLS_CONTEXT_POOL_SIZE', 8), logger=logger)
+
+    def _build(self):
+        for _ in range(self.size):
+            ciphers = generate_cipher()
+            # what ssl.create_default_context() sets up for a client
+            context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT, maxhosts=self.maxhosts)
+            context.load_default_certs()
+            try:
+                context.set_ciphers(ciphers)
+            except ssl.SSLError as e:
+                # a cipher list OpenSSL does not accept keeps the default ciphers
+                if self.logger is not None:
+                    self.logger.warning(f"Unusable TLS cipher list {ciphers}: {e}")
+            self.contexts.append(context)
+
+    def get(self, host):
+        """Return ``(index, context)`` for ``host``, ``index`` identifying the context in the pool"""
+        if not self.contexts:
+            self._build()
+        index = self.hosts.get(host)
+        if index is None:
+            index = self.hosts[host] = self.next
+            self.next = (self.next + 1) % self.size
+        return index, self.contexts[index]
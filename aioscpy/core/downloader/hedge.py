@@ -0,0 +1,129 @@
+import asyncio
+
+from collections import deque
+from time import time
+
+
+class Hedger:
+    """Send a second copy of a slow request and keep whichever answers first
+
+    Handler latencies are kept per slot. A hedgeable request that has not
+    completed after the slot's ``percentile`` latency is downloaded a second
+    time, the first successful download wins and the other one is cancelled.
+    Hedges are capped at ``budget`` times the number of requests.
+    Only GET and HEAD requests are hedged. DOWNLOAD_HEDGE_ENABLED turns hedging
+    on for all of them, ``meta['hedge']`` turns it on or off per request.
+    The second copy carries a HedgeCopy in ``meta['hedge_copy']``: its
+    handler holds the signals and size stats back and they are replayed only
+    if the copy wins, so only the losing copy stays quiet.
+    """
+
+    METHODS = ('GET', 'HEAD')
+
+    def __init__(self, enabled=False, percentile=95, min_samples=20, budget=0.05, window=200, stats=None):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget
+        self.window = window
+        self.stats = stats
+        self.requests = 0
+        self.hedges = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            enabled=settings.getbool('DOWNLOAD_HEDGE_ENABLED', False),
+            percentile=settings.getfloat('DOWNLOAD_HEDGE_PERCENTILE', 95),
+            min_samples=settings.getint('DOWNLOAD_HEDGE_MIN_SAMPLES', 20),
+            budget=settings.getfloat('DOWNLOAD_HEDGE_BUDGET', 0.05),
+            stats=getattr(crawler, 'stats', None),
+        )
+
+    def _inc_stats(self, key, spider):
+        if self.stats is not None:
+            self.stats.inc_value(f'downloader/hedge/{key}', spider=spider)
+
+    def record(self, slot, latency):
+        if slot.latencies is None:
+            slot.latencies = deque(maxlen=self.window)
+        slot.latencies.append(latency)
+
+    def delay(self, slot):
+        """The slot's ``percentile`` latency, None until ``min_samples`` were recorded"""
+        latencies = slot.latencies
+        if not latencies or len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+
+    def _hedgeable(self, request):
+        return request.meta.get('hedge', self.enabled) and request.method in self.METHODS
+
+    async def fetch(self, download, request, spider, slot):
+        """Return ``await download(request, spider)``, hedged when the request allows it"""
+        self.requests += 1
+        start = time()
+        delay = self.delay(slot) if self._hedgeable(request) else None
+        if delay is None:
+            response = await download(request, spider)
+            self.record(slot, time() - start)
+            return response
+
+        primary = asyncio.ensure_future(download(request, spider))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except BaseException:
+            primary.cancel()
+            raise
+        if done or self.hedges >= self.budget * self.requests:
+            if not done:
+                self._inc_stats('budget_exhausted', spider)
+            response = await primary
+            self.record(slot, time() - start)
+            return response
+
+        self.hedges += 1
+        self._inc_stats('sent', spider)
+        hedge_start = time()
+        copy = HedgeCopy()
+        hedge = asyncio.ensure_future(download(request.replace(meta=dict(request.meta, hedge_copy=copy)), spider))
+        starts = {primary: start, hedge: hedge_start}
+        pending, failed, winner = {primary, hedge}, None, None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    if task is primary or failed is None:
+                        failed = task.exception()
+            if winner is None:
+                raise failed
+        finally:
+            for task in (primary, hedge):
+                task.cancel()
+                # the loser may have failed in the same wakeup, its exception is dropped
+                task.add_done_callback(_discard_result)
+
+        self.record(slot, time() - starts[winner])
+        if winner is hedge:
+            self._inc_stats('won', spider)
+            if copy.collector is not None:
+                return await copy.collector.replay(winner.result())
+        return winner.result()
+
+
+class HedgeCopy:
+    """``meta['hedge_copy']`` of a second copy, the handler sets ``collector``
+    to the BodyCollector holding the copy's signals and stats back"""
+
+    def __init__(self):
+        self.collector = None
+
+
+def _discard_result(task):
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,56 @@
+from fnmatch import fnmatchcase
+from time import time
+
+
+class TokenBucket:
+    """Allow ``rate`` requests per second on average, with bursts of up to ``burst``"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(self.rate, 1))
+        self.tokens = self.burst
+        self.stamp = time()
+
+    def _refill(self, now):
+        if now > self.stamp:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+
+    def ready_at(self, now=None):
+        """Timestamp at which the next token will be available"""
+        now = time() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            return now
+        return now + (1 - self.tokens) / self.rate
+
+    def full(self, now=None):
+        """Whether the bucket is back to ``burst`` tokens, as a new one would be"""
+        self._refill(time() if now is None else now)
+        return self.tokens >= self.burst
+
+    def consume(self, now=None, tokens=1):
+        now = time() if now is None else now
+        self._refill(now)
+        self.tokens -= tokens
+
+    def __repr__(self):
+        return "%s(rate=%r, burst=%r, tokens=%0.2f)" % (
+            self.__class__.__name__, self.rate, self.burst, self.tokens)
+
+
+def get_rate_limiter(key, limits):
+    """Build a TokenBucket for slot ``key`` from the first matching pattern of ``limits``
+
+    ``limits`` maps a slot key or a glob pattern such as ``*.example.com``
+    to ``{'rate': requests_per_second, 'burst': max_burst}``.
+    """
+    conf = limits.get(key)
+    if conf is None:
+        for pattern, value in limits.items():
+            if fnmatchcase(key, pattern):
+                conf = value
+                break
+    if not conf or not conf.get('rate'):
+        return None
+    return TokenBucket(conf['rate'], conf.get('burst'))
@@ -0,0 +1,111 @@
+import asyncio
+import ipaddress
+import socket
+
+from time import time
+
+from aioscpy.utils.othtypes import LocalCache
+
+
+class CachingResolver:
+    """Asynchronous DNS cache shared by the downloader and the download handlers
+
+    Successful lookups are kept for ``ttl`` seconds and failures for
+    ``negative_ttl`` seconds. Concurrent lookups of the same host share a
+    single ``getaddrinfo`` call. ``resolve()`` and ``close()`` follow aiohttp's
+    resolver interface, so an instance can be given to a ``TCPConnector``.
+    """
+
+    def __init__(self, ttl=300, negative_ttl=30, maxsize=10000, timeout=60):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.cache = LocalCache(maxsize)
+        self.inflight = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        if not settings.getbool('DNSCACHE_ENABLED', True):
+            return None
+        return cls(
+            ttl=settings.getfloat('DNSCACHE_TTL', 300),
+            negative_ttl=settings.getfloat('DNSCACHE_NEGATIVE_TTL', 30),
+            maxsize=settings.getint('DNSCACHE_SIZE', 10000),
+            timeout=settings.getfloat('DNS_TIMEOUT', 60),
+        )
+
+    @staticmethod
+    def _is_ip(host):
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return True
+
+    def _cached(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires < time():
+            del self.cache[key]
+            return None
+        return result
+
+    def _lookup(self, host, family):
+        """Return the task resolving ``host``, starting one unless it is cached or running"""
+        key = (host, family)
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = asyncio.create_task(self._getaddrinfo(host, family))
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return task
+
+    async def _getaddrinfo(self, host, family):
+        key = (host, family)
+        try:
+            infos = await asyncio.wait_for(asyncio.get_running_loop().getaddrinfo(
+                host, None, family=family, type=socket.SOCK_STREAM), self.timeout)
+        except (OSError, asyncio.TimeoutError) as exc:
+            if not isinstance(exc, OSError):
+                exc = socket.gaierror(socket.EAI_AGAIN, f'DNS lookup timed out for {host}')
+            self.cache[key] = (time() + self.negative_ttl, exc)
+            return exc
+        addresses = []
+        for info_family, _, proto, _, sockaddr in infos:
+            if (info_family, sockaddr[0], proto) not in addresses:
+                addresses.append((info_family, sockaddr[0], proto))
+        self.cache[key] = (time() + self.ttl, addresses)
+        return addresses
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        if self._is_ip(host):
+            return [{'hostname': host, 'host': host, 'port': port, 'family': family,
+                     'proto': 0, 'flags': socket.AI_NUMERICHOST}]
+
+        result = self._cached((host, family))
+        if result is None:
+            result = await asyncio.shield(self._lookup(host, family))
+        if isinstance(result, Exception):
+            raise result
+        return [{'hostname': host, 'host': address, 'port': port, 'family': info_family,
+                 'proto': proto, 'flags': socket.AI_NUMERICHOST}
+                for info_family, address, proto in result]
+
+    async def address(self, host):
+        """First address of ``host``, or ``host`` itself when it cannot be resolved"""
+        if not host:
+            return host
+        try:
+            return (await self.resolve(host, family=socket.AF_UNSPEC))[0]['host']
+        except OSError:
+            return host
+
+    def prefetch(self, host, family=socket.AF_UNSPEC):
+        """Start resolving ``host`` in the background unless it is already known"""
+        if host and not self._is_ip(host) and self._cached((host, family)) is None:
+            self._lookup(host, family)
+
+    async def close(self):
+        for task in list(self.inflight.values()):
+            task.cancel()
@@ -228,16 +228,19 @@ class ExecutionEngine(object):
                 await self._spider_idle(spider)
 
             # Log statistics
-            co = '<logstats: %(spname)s> pid: %(pid)s, transferring: %(transfer)s, queue: %(queue)s, active: %(active)s, ingress: %(ingress)s, scraper-active: %(sactive)s, scraper-queue: %(squeue)s, scraper-size: %(size)s' % {
+            co = '<logstats: %(spname)s> pid: %(pid)s, slots: %(slots)s, transferring: %(transfer)s, queue: %(queue)s, active: %(active)s, ingress: %(ingress)s, scraper-active: %(sactive)s, scraper-queue: %(squeue)s, scraper-size: %(size)s, scraper-spooled: %(spooled)s, scraper-cached: %(cached)s' % {
                 'spname': spider.name,
                 'pid': os.getpid(),
-                'transfer': len(self.downloader.slot.transferring),
-                'queue': len(self.downloader.slot.queue),
+                'slots': len(self.downloader.slots),
+                'transfer': sum(len(s.transferring) for s in self.downloader.slots.values()),
+                'queue': sum(len(s.queue) for s in self.downloader.slots.values()),
                 'active': len(self.downloader.active),
                 'ingress': len(self.slot.inprogress),
                 'sactive': len(self.scraper.slot.active),
                 'squeue': len(self.scraper.slot.queue),
                 'size': self.scraper.slot.active_size,
+                'spooled': self.scraper.slot.spooled_size,
+                'cached': self.scraper.slot.cached_size,
             }
             self.logger.debug(co)
 
@@ -1,4 +1,8 @@
 import asyncio
+import heapq
+
+from itertools import count
+from time import time
 
 
 class Scheduler(object):
@@ -7,6 +11,11 @@ class Scheduler(object):
         self.queue = _queue_df
         self.stats = stats
         self.spider = spider
+        # requests with a future meta['not_before'], held here until it passes
+        self.delayed = []
+        self._delayed_seq = count()
+        self._delayed_wakeup = asyncio.Event()
+        self._delayed_task = None
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -14,11 +23,38 @@ class Scheduler(object):
             '{} from_crawler method must define'.format(cls.__class__.__name__))
 
     async def enqueue_request(self, request):
+        not_before = request.meta.get('not_before')
+        if not_before and not_before > time():
+            self._delay(request, not_before)
+            return True
         if self.stats:
             self.stats.inc_value('scheduler/enqueued/redis', spider=self.spider)
         await self.queue.push(request)
         return True
 
+    def _delay(self, request, not_before):
+        heapq.heappush(self.delayed, (not_before, next(self._delayed_seq), request))
+        if self.stats:
+            self.stats.inc_value('scheduler/delayed', spider=self.spider)
+        if self._delayed_task is None or self._delayed_task.done():
+            self._delayed_task = asyncio.create_task(self._release_delayed())
+        else:
+            self._delayed_wakeup.set()
+
+    async def _release_delayed(self):
+        """Move delayed requests to the queue as their not-before time passes"""
+        while self.delayed:
+            self._delayed_wakeup.clear()
+            wait = self.delayed[0][0] - time()
+            if wait > 0:
+                try:
+                    await asyncio.wait_for(self._delayed_wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, request = heapq.heappop(self.delayed)
+            await self.enqueue_request(request)
+
     async def async_next_request(self, count=None):
         # Use the provided count or get from settings
         if count is None:
@@ -36,13 +72,19 @@ class Scheduler(object):
             await self.enqueue_request(request)
 
     async def close(self, slot):
+        if self._delayed_task is not None:
+            self._delayed_task.cancel()
         if slot.inprogress:
             for request in slot.inprogress:
                 await self.enqueue_request(request)
+        # delayed requests are kept, without their delay, by persistent queues
+        delayed, self.delayed = self.delayed, []
+        for _, _, request in delayed:
+            await self.queue.push(request)
         await self.queue.close()
 
     def __len__(self):
-        return self.queue.qsize()
+        return self.queue.qsize() + len(self.delayed)
 
     async def has_pending_requests(self):
         return len(self) > 0
@@ -12,4 +12,4 @@ class RedisScheduler(Scheduler):
         return cls(_queue_df=aio_priority_queue(queue_key, redis_tcp, crawler.spider), spider=crawler.spider, stats=crawler.stats)
 
     async def has_pending_requests(self):
-        return await self.queue.qsize() > 0
+        return bool(self.delayed) or await self.queue.qsize() > 0
@@ -9,11 +9,15 @@ from aioscpy import signals, call_grace_instance
 class Slot:
     MIN_RESPONSE_SIZE = 1024
 
-    def __init__(self, max_active_size: int = 5000):
+    def __init__(self, max_active_size: int = 5000, max_spooled_size: int = 0):
         self.max_active_size = max_active_size
+        self.max_spooled_size = max_spooled_size
         self.queue = deque()
         self.active = set()
         self.active_size = 0
+        self.spooled_size = 0
+        # body bytes held by the in-memory response cache, within max_active_size too
+        self.cached_size = 0
         self.itemproc_size = 0
         self.closing_future = None
         self.closing_lock = True
@@ -21,8 +25,24 @@ class Slot:
     def add_response_request(self, response, request):
         self.queue.append((response, request))
         self.active.add(request)
+        if getattr(response, 'spooled', False):
+            # spooled bodies live in the page cache until they are read into memory
+            self.spooled_size += response.body_size
+            if not response.body_loaded:
+                response.on_body_load = self._spooled_body_loaded
+        self.active_size += self._response_size(response)
+
+    def _response_size(self, response):
+        if getattr(response, 'spooled', False):
+            if not response.body_loaded:
+                return self.MIN_RESPONSE_SIZE
+            return max(response.body_size, self.MIN_RESPONSE_SIZE)
         if hasattr(response, 'body') and response.body is not None:
-            self.active_size += max(len(response.body), self.MIN_RESPONSE_SIZE)
+            return max(len(response.body), self.MIN_RESPONSE_SIZE)
+        return 0
+
+    def _spooled_body_loaded(self, response):
+        self.active_size += max(response.body_size, self.MIN_RESPONSE_SIZE) - self.MIN_RESPONSE_SIZE
 
     def next_response_request_deferred(self):
         response, request = self.queue.popleft()
@@ -31,15 +51,18 @@ class Slot:
     def finish_response(self, request, response):
         self.active.discard(request)
         # self.logger.warning(f'start finish response active del: {self.active_size}, active: {len(self.active)}, response: {len(response.body)}')
-        if hasattr(response, 'body') and response.body is not None:
-            self.active_size -= max(len(response.body), self.MIN_RESPONSE_SIZE)
+        if getattr(response, 'spooled', False):
+            self.spooled_size -= response.body_size
+            response.on_body_load = None
+        self.active_size -= self._response_size(response)
         request, response = None, None        
 
     def is_idle(self):
         return self.queue or self.active
 
     def needs_backout(self):
-        return self.active_size > self.max_active_size
+        return self.active_size > self.max_active_size or \
+            bool(self.max_spooled_size and self.spooled_size > self.max_spooled_size)
 
 
 class Scraper:
@@ -55,7 +78,8 @@ class Scraper:
         self.task_scrape_next = None
 
     async def open_spider(self, spider):
-        self.slot = call_grace_instance(Slot, self.crawler.settings.getint('SCRAPER_SLOT_MAX_ACTIVE_SIZE', 500000))
+        self.slot = call_grace_instance(Slot, self.crawler.settings.getint('SCRAPER_SLOT_MAX_ACTIVE_SIZE', 500000),
+                                        self.crawler.settings.getint('SCRAPER_SLOT_MAX_SPOOLED_SIZE', 0))
         await self.itemproc.open_spider(spider)
         self.task_scrape_next = asyncio.create_task(self._scrape_next(spider, self.slot))
 
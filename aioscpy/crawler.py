@@ -11,6 +11,8 @@ from aioscpy.settings import Settings
 from aioscpy.signalmanager import SignalManager
 from aioscpy.utils.ossignal import install_shutdown_handlers, signal_names
 from aioscpy.inject import DependencyInjection
+from aioscpy.core.downloader.budget import ConcurrencyBudget
+from aioscpy.core.downloader.resolver import CachingResolver
 from aioscpy import call_grace_instance
 from aioscpy.spider import Spider
 
@@ -35,6 +37,8 @@ class Crawler(object):
         self.crawling = False
         self.spider = self._create_spider(*args, **kwargs)
         self.engine = None
+        self.budget = None
+        self.resolver = None
         self.stats = call_grace_instance('stats', self)
         self.DI = self._create_dependency()
         self.extensions = self.load('extension')
@@ -93,11 +97,16 @@ class CrawlerProcess(object):
         self._active = set()
         self.bootstrap_failed = False
         self._group = []
+        self.budget = ConcurrencyBudget.from_settings(settings)
+        self.resolver = CachingResolver.from_settings(settings)
         install_shutdown_handlers(self._signal_shutdown)
         self.di.get("log").std_log_aioscpy_info(settings)
 
     def crawl(self, crawler_or_spidercls: Union[Type[Spider], Crawler], *args, **kwargs) -> Crawler:
         crawler = self.create_crawler(crawler_or_spidercls, *args, **kwargs)
+        if self.budget.enabled:
+            crawler.budget = self.budget
+        crawler.resolver = self.resolver
         self.crawlers.add(crawler)
         return crawler
 
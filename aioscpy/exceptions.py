@@ -33,6 +33,25 @@ class _InvalidOutput(TypeError):
     pass
 
 
+# Downloading
+
+
+class DownloadError(Exception):
+    """A download handler failed to fetch a request"""
+
+
+class TimeoutError(DownloadError):
+    """The download did not complete within DOWNLOAD_TIMEOUT"""
+
+
+class ConnectionError(DownloadError):
+    """The connection to the remote host failed"""
+
+
+class DownloadMaxSizeExceeded(DownloadError):
+    """The response body is larger than DOWNLOAD_MAXSIZE"""
+
+
 # HTTP and crawling
 
 
@@ -3,6 +3,7 @@ from urllib.parse import urljoin
 
 from aioscpy.http.request import Request
 from aioscpy.http.request.form import FormRequest
+from aioscpy.http.response.spool import SpooledBody
 from aioscpy import call_grace_instance
 from aioscpy.utils.tools import obsolete_setter
 
@@ -12,6 +13,8 @@ class Response(object):
     def __init__(self, url, status=200, headers=None, body=b'', flags=None, request=None, certificate=None, _response=None):
         self.headers = headers or {}
         self.status = int(status)
+        # called with the response when a spooled body is read into memory
+        self.on_body_load = None
         self._set_body(body)
         self._set_url(url)
         self.request = request
@@ -52,11 +55,20 @@ class Response(object):
     url = property(_get_url, obsolete_setter(_set_url, 'url'))
 
     def _get_body(self):
+        if self._body is None:
+            # a spooled body is only copied into memory when ``body`` is read
+            self._body = self._spooled.tobytes()
+            if self.on_body_load is not None:
+                self.on_body_load(self)
         return self._body
 
     def _set_body(self, body):
+        self._spooled = None
         if body is None:
             self._body = b''
+        elif isinstance(body, SpooledBody):
+            self._spooled = body
+            self._body = None
         elif not isinstance(body, bytes):
             raise TypeError(
                 "Response body must be bytes. "
@@ -67,6 +79,30 @@ class Response(object):
 
     body = property(_get_body, obsolete_setter(_set_body, 'body'))
 
+    @property
+    def spooled(self):
+        """Whether the body was spooled to a temporary file"""
+        return self._spooled is not None
+
+    @property
+    def body_loaded(self):
+        """Whether the body is in memory, False until a spooled body is read"""
+        return self._body is not None
+
+    @property
+    def body_size(self):
+        """Length of the body, without loading a spooled body into memory"""
+        if self._spooled is not None:
+            return len(self._spooled)
+        return len(self._body)
+
+    @property
+    def body_view(self):
+        """Read-only memoryview of the body, mmap-backed when the body is spooled"""
+        if self._spooled is not None:
+            return self._spooled.view
+        return memoryview(self._body)
+
     def __str__(self):
         return "<%d %s>" % (self.status, self.url)
 
@@ -80,8 +116,9 @@ class Response(object):
         """Create a new Response with the same attributes except for those
         given new values.
         """
-        for x in ['url', 'status', 'headers', 'body', 'request', 'flags', 'certificate']:
+        for x in ['url', 'status', 'headers', 'request', 'flags', 'certificate']:
             kwargs.setdefault(x, getattr(self, x))
+        kwargs.setdefault('body', self._spooled if self._spooled is not None else self.body)
         cls = kwargs.pop('cls', self.__class__)
         return cls(*args, **kwargs)
 
@@ -0,0 +1,43 @@
+import mmap
+
+
+class SpooledBody:
+    """Response body kept in an anonymous temporary file and read through mmap
+
+    The file descriptor is closed right away: the mapping keeps the data
+    reachable, and the unlinked file is released once the mapping is gone.
+    Reads go through the OS page cache instead of a ``bytes`` copy.
+    """
+
+    def __init__(self, file):
+        file.flush()
+        file.seek(0, 2)
+        self.size = file.tell()
+        self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        file.close()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def view(self):
+        """Read-only memoryview over the mapped file"""
+        if self._mmap is None:
+            return memoryview(b'')
+        return memoryview(self._mmap)
+
+    def tobytes(self):
+        if self._mmap is None:
+            return b''
+        return self._mmap[:]
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # a body_view is still alive, the mapping goes away with it
+                pass
+
+    def __repr__(self):
+        return "<%s size=%d>" % (self.__class__.__name__, self.size)
@@ -1,6 +1,7 @@
 from contextlib import suppress
 
 import re
+import json as _json
 import parsel
 from w3lib.encoding import (html_body_declared_encoding, html_to_unicode,
                             http_content_type_encoding, resolve_encoding)
@@ -9,7 +10,7 @@ from parsel import Selector
 
 from aioscpy.http import Request
 from aioscpy.http.response import Response
-from aioscpy.utils.tools import to_unicode, memoizemethod_noargs, call_helper
+from aioscpy.utils.tools import to_unicode, memoizemethod_noargs
 
 
 class TextResponse(Response):
@@ -42,6 +43,7 @@ class TextResponse(Response):
 
     def _set_body(self, body):
         self._body = b''  # used by encoding detection
+        self._spooled = None
         if isinstance(body, str):
             if self._encoding is None:
                 raise TypeError('Cannot convert unicode body - %s has no encoding' %
@@ -79,7 +81,8 @@ class TextResponse(Response):
 
     @property
     async def json(self):
-        return await call_helper(self._response.json)
+        # handlers stream the body, so the client's own response may have nothing left to read
+        return _json.loads(self.text)
 
     @memoizemethod_noargs
     def _headers_encoding(self):
@@ -0,0 +1,142 @@
+from aioscpy import signals
+from aioscpy import call_grace_instance
+from aioscpy.exceptions import NotConfigured, IgnoreRequest, DownloadError
+from aioscpy.inject import load_object
+from aioscpy.libs.extensions.httpcache import build_headers, get_header, header_items
+
+
+class HttpCacheMiddleware:
+    """Serve responses from an on-disk cache
+
+    HTTPCACHE_POLICY decides what is stored and whether a cached response
+    is still fresh, HTTPCACHE_STORAGE keeps the responses. A fresh cached
+    response is returned from ``process_request``, so it never reaches the
+    download handlers, and carries the ``cached`` flag. ``meta['dont_cache']``
+    keeps a request out of the cache.
+
+    A stale response is revalidated when HTTPCACHE_REVALIDATE is set: the
+    request is sent with If-None-Match / If-Modified-Since from its ETag /
+    Last-Modified, and a 304 answer gives back the cached response with the
+    ``not_modified`` flag, so spiders can skip parsing pages that did not
+    change.
+    """
+
+    DOWNLOAD_EXCEPTIONS = (DownloadError, OSError)
+    # headers of a 304 that describe its (empty) body, not the cached one
+    NOT_MODIFIED_IGNORED_HEADERS = {'content-length', 'content-encoding', 'transfer-encoding', 'content-type'}
+
+    def __init__(self, settings, stats):
+        if not settings.getbool('HTTPCACHE_ENABLED'):
+            raise NotConfigured
+        self.policy = load_object(settings['HTTPCACHE_POLICY'])(settings)
+        self.storage = call_grace_instance(load_object(settings['HTTPCACHE_STORAGE']), settings)
+        self.ignore_missing = settings.getbool('HTTPCACHE_IGNORE_MISSING')
+        self.revalidate = settings.getbool('HTTPCACHE_REVALIDATE', True)
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        o = cls(crawler.settings, crawler.stats)
+        crawler.signals.connect(o.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(o.spider_closed, signal=signals.spider_closed)
+        return o
+
+    def spider_opened(self, spider):
+        self.storage.open_spider(spider)
+
+    def spider_closed(self, spider):
+        self.storage.close_spider(spider)
+
+    def process_request(self, request, spider):
+        if request.meta.get('dont_cache', False):
+            return None
+
+        if not self.policy.should_cache_request(request):
+            request.meta['_dont_cache'] = True
+            return None
+
+        cachedresponse = self.storage.retrieve_response(spider, request)
+        if cachedresponse is None:
+            self.stats.inc_value('httpcache/miss', spider=spider)
+            if self.ignore_missing:
+                self.stats.inc_value('httpcache/ignore', spider=spider)
+                raise IgnoreRequest(f"Ignored request not in cache: {request}")
+            return None
+
+        cachedresponse.flags.append('cached')
+        if 'stale' not in cachedresponse.flags and self.policy.is_cached_response_fresh(cachedresponse, request):
+            self.stats.inc_value('httpcache/hit', spider=spider)
+            return cachedresponse
+
+        # stale: revalidate or download again, the cached response is the fallback
+        if self.revalidate:
+            self._set_conditional_validators(request, cachedresponse)
+        request.meta['cached_response'] = cachedresponse
+        return None
+
+    def process_response(self, request, response, spider):
+        if request.meta.get('dont_cache', False):
+            return response
+
+        if request.meta.pop('_dont_cache', False) or 'cached' in response.flags:
+            return response
+
+        cachedresponse = request.meta.pop('cached_response', None)
+        if cachedresponse is None:
+            self.stats.inc_value('httpcache/firsthand', spider=spider)
+            self._cache_response(spider, response, request)
+            return response
+
+        if response.status == 304 and self.policy.is_cached_response_valid(cachedresponse, response, request):
+            self.stats.inc_value('httpcache/not_modified', spider=spider)
+            self.stats.inc_value('httpcache/not_modified_bytes', cachedresponse.body_size, spider=spider)
+            return self._not_modified(spider, request, cachedresponse, response)
+
+        if self.policy.is_cached_response_valid(cachedresponse, response, request):
+            self.stats.inc_value('httpcache/revalidate', spider=spider)
+            return cachedresponse
+
+        self.stats.inc_value('httpcache/invalidate', spider=spider)
+        self._cache_response(spider, response, request)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        cachedresponse = request.meta.pop('cached_response', None)
+        if cachedresponse is not None and isinstance(exception, self.DOWNLOAD_EXCEPTIONS):
+            self.stats.inc_value('httpcache/errorrecovery', spider=spider)
+            return cachedresponse
+        return None
+
+    def _set_conditional_validators(self, request, cachedresponse):
+        etag = get_header(cachedresponse.headers, 'ETag')
+        last_modified = get_header(cachedresponse.headers, 'Last-Modified')
+        if etag is None and last_modified is None:
+            return
+        # the headers object may be shared with other requests
+        headers = request.headers.copy() if request.headers else {}
+        if etag is not None and get_header(headers, 'If-None-Match') is None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None and get_header(headers, 'If-Modified-Since') is None:
+            headers['If-Modified-Since'] = last_modified
+        request.headers = headers
+
+    def _not_modified(self, spider, request, cachedresponse, response):
+        """Return the cached response updated with the headers of the 304, stored
+        again so it is fresh for another period"""
+        updates = [(name, value) for name, value in header_items(response.headers)
+                   if name.lower() not in self.NOT_MODIFIED_IGNORED_HEADERS]
+        names = {name.lower() for name, _ in updates}
+        headers = build_headers([(name, value) for name, value in header_items(cachedresponse.headers)
+                                 if name.lower() not in names] + updates)
+        flags = [flag for flag in cachedresponse.flags if flag != 'stale']
+        refreshed = cachedresponse.replace(headers=headers, flags=flags + ['not_modified'])
+        if self.policy.should_cache_response(refreshed, request):
+            self.storage.store_response(spider, request, refreshed)
+        return refreshed
+
+    def _cache_response(self, spider, response, request):
+        if self.policy.should_cache_response(response, request):
+            self.stats.inc_value('httpcache/store', spider=spider)
+            self.storage.store_response(spider, request, response)
+        else:
+            self.stats.inc_value('httpcache/uncacheable', spider=spider)
@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from time import time
+
+from aioscpy.exceptions import NotConfigured
+from aioscpy.utils.request import request_fingerprint
+
+
+class LRUResponseCache:
+    """Responses keyed by request fingerprint, the least recently used ones
+    evicted once their bodies take more than ``max_size`` bytes"""
+
+    def __init__(self, max_size, expiration_secs=0):
+        self.max_size = max_size
+        self.expiration_secs = expiration_secs
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, now=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        response, stored = entry
+        if 0 < self.expiration_secs < (now or time()) - stored:
+            self.pop(key)
+            return None
+        self.entries.move_to_end(key)
+        return response
+
+    def put(self, key, response, now=None):
+        self.pop(key)
+        self.entries[key] = (response, now or time())
+        self.size += response.body_size
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[0].body_size
+        return entry
+
+    def shrink(self, max_size):
+        """Evict the least recently used responses until the bodies fit in
+        ``max_size`` bytes, return how many were evicted"""
+        evicted = 0
+        while self.entries and self.size > max_size:
+            _, (response, _) = self.entries.popitem(last=False)
+            self.size -= response.body_size
+            evicted += 1
+        return evicted
+
+
+class MemoryCacheMiddleware:
+    """Serve repeated GETs of one run from memory
+
+    Successful responses are kept in an LRU cache of at most
+    MEMORY_CACHE_MAX_SIZE body bytes, and for MEMORY_CACHE_EXPIRATION_SECS
+    when that is set. The cache shares SCRAPER_SLOT_MAX_ACTIVE_SIZE with the
+    responses being scraped: its size is reported as the scraper slot's
+    ``cached_size`` and it evicts whenever ``active_size`` needs the room.
+    A hit is a copy bound to the new request with the ``cached`` and
+    ``memory_cached`` flags. ``meta['dont_cache']`` keeps a request out.
+    """
+
+    # flags of the disk cache, they describe one download and not the cached response
+    CACHE_FLAGS = ('cached', 'stale', 'not_modified')
+
+    def __init__(self, crawler, max_size, expiration_secs=0):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.cache = LRUResponseCache(max_size, expiration_secs)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('MEMORY_CACHE_ENABLED'):
+            raise NotConfigured
+        return cls(crawler, settings.getint('MEMORY_CACHE_MAX_SIZE', 2 * 1024 * 1024),
+                   settings.getfloat('MEMORY_CACHE_EXPIRATION_SECS', 0))
+
+    def _scraper_slot(self):
+        # looked up lazily, the engine is built after the downloader middlewares
+        engine = getattr(self.crawler, 'engine', None)
+        scraper = getattr(engine, 'scraper', None)
+        return getattr(scraper, 'slot', None)
+
+    def _fit(self, spider, incoming=0):
+        """Evict what does not fit next to ``incoming`` bytes and the scraper's active responses"""
+        slot = self._scraper_slot()
+        max_size = self.cache.max_size - incoming
+        if slot is not None:
+            max_size = min(max_size, slot.max_active_size - slot.active_size - incoming)
+        evicted = self.cache.shrink(max(max_size, 0))
+        if evicted:
+            self.stats.inc_value('memory_cache/evictions', evicted, spider=spider)
+        if slot is not None:
+            slot.cached_size = self.cache.size
+
+    def _cacheable(self, request):
+        return request.method == 'GET' and not request.meta.get('dont_cache', False)
+
+    def process_request(self, request, spider):
+        if not self._cacheable(request):
+            return None
+        self._fit(spider)
+        response = self.cache.get(request_fingerprint(request))
+        if response is None:
+            self.stats.inc_value('memory_cache/miss', spider=spider)
+            return None
+        self.stats.inc_value('memory_cache/hit', spider=spider)
+        return response.replace(request=request, flags=response.flags + ['cached', 'memory_cached'])
+
+    def process_response(self, request, response, spider):
+        if not self._cacheable(request) or 'memory_cached' in response.flags:
+            return response
+        if response.status != 200 or getattr(response, 'spooled', False):
+            return response
+        size = response.body_size
+        if size > self.cache.max_size:
+            return response
+        self._fit(spider, incoming=size)
+        slot = self._scraper_slot()
+        if slot is not None and slot.active_size + size > slot.max_active_size:
+            # no room next to the responses being scraped
+            return response
+        flags = [flag for flag in response.flags if flag not in self.CACHE_FLAGS]
+        self.cache.put(request_fingerprint(request), response.replace(request=None, flags=flags))
+        if slot is not None:
+            slot.cached_size = self.cache.size
+        self.stats.inc_value('memory_cache/store', spider=spider)
+        return response
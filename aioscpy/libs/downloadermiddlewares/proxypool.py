@@ -0,0 +1,172 @@
+import asyncio
+import random
+
+from time import time
+
+from aioscpy.exceptions import NotConfigured
+
+
+class ProxyState:
+    """Health of one proxy of the pool"""
+
+    def __init__(self, url):
+        self.url = url
+        self.active = 0
+        self.successes = 0
+        self.failures = 0
+        self.bans = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.backoffs = 0
+        self.retry_at = 0.0
+
+    def available(self, now, max_concurrency):
+        return self.retry_at <= now and (not max_concurrency or self.active < max_concurrency)
+
+    @property
+    def score(self):
+        """Smoothed success rate over latency, higher is healthier"""
+        success_rate = (self.successes + 1) / (self.successes + self.failures + 2)
+        return success_rate / (1 + (self.latency or 0))
+
+    def __repr__(self):
+        return "<%s %s active=%d score=%.3f retry_at=%.1f>" % (
+            self.__class__.__name__, self.url, self.active, self.score, self.retry_at)
+
+
+class ProxyPoolMiddleware:
+    """Send requests through a pool of proxies, preferring the healthy ones
+
+    A proxy is picked for each request that does not set ``meta['proxy']``
+    itself (or sets ``meta['dont_proxy']``), weighted by its success rate and
+    latency, and never with more than PROXY_POOL_MAX_CONCURRENCY requests in
+    flight. A ban status, or PROXY_POOL_MAX_FAILURES errors in a row, takes the
+    proxy out of rotation for PROXY_POOL_BACKOFF_BASE seconds, doubling on each
+    new strike up to PROXY_POOL_BACKOFF_MAX. The handlers keep their connection
+    pools per proxy, so switching proxies does not redo handshakes.
+    """
+
+    PROXY_META = 'proxy_pool_proxy'
+
+    def __init__(self, proxies, stats=None, max_concurrency=4, max_failures=3, ban_codes=(),
+                 backoff_base=30.0, backoff_max=1800.0, latency_alpha=0.3):
+        self.proxies = {url: ProxyState(url) for url in proxies}
+        self.stats = stats
+        self.max_concurrency = max_concurrency
+        self.max_failures = max_failures
+        self.ban_codes = set(ban_codes)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency_alpha = latency_alpha
+        self.released = asyncio.Event()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('PROXY_POOL_ENABLED'):
+            raise NotConfigured
+        proxies = settings.getlist('PROXY_POOL')
+        if not proxies:
+            raise NotConfigured('PROXY_POOL is empty')
+        return cls(
+            proxies,
+            stats=crawler.stats,
+            max_concurrency=settings.getint('PROXY_POOL_MAX_CONCURRENCY', 4),
+            max_failures=settings.getint('PROXY_POOL_MAX_FAILURES', 3),
+            ban_codes=[int(code) for code in settings.getlist('PROXY_POOL_BAN_CODES', [403, 407, 429])],
+            backoff_base=settings.getfloat('PROXY_POOL_BACKOFF_BASE', 30.0),
+            backoff_max=settings.getfloat('PROXY_POOL_BACKOFF_MAX', 1800.0),
+        )
+
+    def _inc_stats(self, key, spider=None):
+        if self.stats is not None:
+            self.stats.inc_value(f'proxy_pool/{key}', spider=spider)
+
+    def _choose(self, now):
+        candidates = [state for state in self.proxies.values() if state.available(now, self.max_concurrency)]
+        if not candidates:
+            return None
+        return random.choices(candidates, weights=[state.score for state in candidates])[0]
+
+    async def _acquire(self, spider):
+        """Wait for a proxy with a free slot that is not backing off"""
+        waited = False
+        while True:
+            now = time()
+            state = self._choose(now)
+            if state is not None:
+                state.active += 1
+                return state
+            if not waited:
+                waited = True
+                self._inc_stats('wait_count', spider)
+            # wake up on a release, or when the first backoff runs out
+            retry_at = [s.retry_at for s in self.proxies.values() if s.retry_at > now]
+            timeout = min(retry_at) - now if retry_at else None
+            self.released.clear()
+            try:
+                await asyncio.wait_for(self.released.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _release(self, request):
+        """Return the proxy of ``request`` to the pool, once per download"""
+        start = request.meta.pop('proxy_pool_start', None)
+        state = self.proxies.get(request.meta.get(self.PROXY_META))
+        if start is None or state is None:
+            return None, None
+        state.active -= 1
+        self.released.set()
+        return state, time() - start
+
+    def _back_off(self, state, spider):
+        state.backoffs += 1
+        delay = min(self.backoff_base * 2 ** (state.backoffs - 1), self.backoff_max)
+        state.retry_at = time() + delay
+        self._inc_stats('backoff_count', spider)
+        self.logger.debug(f"Proxy {state.url} out of rotation for {delay:.0f}s")
+
+    async def process_request(self, request, spider):
+        if request.meta.get('dont_proxy'):
+            return None
+        proxy = request.meta.get('proxy')
+        if proxy and proxy != request.meta.get(self.PROXY_META):
+            # an explicit proxy wins over the pool
+            return None
+        state = await self._acquire(spider)
+        request.meta['proxy'] = request.meta[self.PROXY_META] = state.url
+        request.meta['proxy_pool_start'] = time()
+        self._inc_stats('request_count', spider)
+        return None
+
+    async def process_response(self, request, response, spider):
+        state, latency = self._release(request)
+        if state is None or 'cached' in response.flags:
+            # served from a cache, it says nothing about the proxy
+            return response
+        if response.status in self.ban_codes:
+            state.bans += 1
+            state.failures += 1
+            self._inc_stats('ban_count', spider)
+            self._back_off(state, spider)
+            return response
+        state.successes += 1
+        state.consecutive_failures = 0
+        state.backoffs = 0
+        if state.latency is None:
+            state.latency = latency
+        else:
+            state.latency += self.latency_alpha * (latency - state.latency)
+        return response
+
+    async def process_exception(self, request, exception, spider):
+        state, _ = self._release(request)
+        if state is None:
+            return None
+        state.failures += 1
+        state.consecutive_failures += 1
+        self._inc_stats('failure_count', spider)
+        if state.consecutive_failures >= self.max_failures:
+            state.consecutive_failures = 0
+            self._back_off(state, spider)
+        return None
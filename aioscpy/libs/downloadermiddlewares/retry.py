@@ -0,0 +1,143 @@
+import random
+
+from collections import deque
+from time import time
+
+from aioscpy.exceptions import NotConfigured
+from aioscpy.inject import load_object
+from aioscpy.utils.othtypes import urlparse_cached
+from aioscpy.libs.downloadermiddlewares.stats import global_object_name
+
+
+class RetryBudget:
+    """Retries allowed for one domain: ``minimum`` plus ``ratio`` of its
+    requests, both counted over the last ``window`` seconds"""
+
+    def __init__(self, ratio=0.2, minimum=10, window=60.0):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self.requests = deque()
+        self.retries = deque()
+
+    def _trim(self, now):
+        for times in (self.requests, self.retries):
+            while times and times[0] < now - self.window:
+                times.popleft()
+
+    def deposit(self, now=None):
+        self.requests.append(now or time())
+
+    def withdraw(self, now=None):
+        """Take one retry from the budget, return False when it is spent"""
+        now = now or time()
+        self._trim(now)
+        if len(self.retries) >= self.minimum + self.ratio * len(self.requests):
+            return False
+        self.retries.append(now)
+        return True
+
+
+class RetryMiddleware:
+    """Retry failed downloads later through the scheduler
+
+    A response with a status in RETRY_HTTP_CODES, or one of RETRY_EXCEPTIONS,
+    is retried up to RETRY_TIMES times (``meta['max_retry_times']`` per
+    request, ``meta['dont_retry']`` to opt out). The retry goes back to the
+    scheduler with ``meta['not_before']`` set RETRY_BACKOFF_BASE * 2 ** n
+    seconds ahead, capped at RETRY_BACKOFF_MAX, half of it randomized.
+    Each domain may spend RETRY_BUDGET_MIN retries plus RETRY_BUDGET_RATIO
+    of its requests within RETRY_BUDGET_WINDOW seconds, so a failing host
+    does not turn into a retry storm.
+    """
+
+    def __init__(self, settings, stats=None):
+        self.max_retry_times = settings.getint('RETRY_TIMES', 2)
+        self.retry_http_codes = {int(code) for code in settings.getlist('RETRY_HTTP_CODES')}
+        self.priority_adjust = settings.getint('RETRY_PRIORITY_ADJUST', -1)
+        self.backoff_base = settings.getfloat('RETRY_BACKOFF_BASE', 1.0)
+        self.backoff_max = settings.getfloat('RETRY_BACKOFF_MAX', 60.0)
+        self.budget_ratio = settings.getfloat('RETRY_BUDGET_RATIO', 0.2)
+        self.budget_min = settings.getint('RETRY_BUDGET_MIN', 10)
+        self.budget_window = settings.getfloat('RETRY_BUDGET_WINDOW', 60.0)
+        self.budgets = {}
+        self.exceptions_to_retry = tuple(self._load_exceptions(settings.getlist('RETRY_EXCEPTIONS')))
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('RETRY_ENABLED'):
+            raise NotConfigured
+        return cls(crawler.settings, crawler.stats)
+
+    @staticmethod
+    def _load_exceptions(paths):
+        for path in paths:
+            if not isinstance(path, str):
+                yield path
+                continue
+            try:
+                yield load_object(path)
+            except ImportError:
+                # the exceptions of a handler library that is not installed
+                continue
+
+    def _budget(self, request):
+        """The retry budget of the request's domain, None when budgets are disabled"""
+        if not self.budget_ratio and not self.budget_min:
+            return None
+        domain = urlparse_cached(request).hostname or ''
+        budget = self.budgets.get(domain)
+        if budget is None:
+            budget = self.budgets[domain] = RetryBudget(self.budget_ratio, self.budget_min, self.budget_window)
+        return budget
+
+    def _backoff(self, retries):
+        delay = min(self.backoff_base * 2 ** (retries - 1), self.backoff_max)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _retry(self, request, reason, spider):
+        retries = request.meta.get('retry_times', 0) + 1
+        max_retry_times = request.meta.get('max_retry_times', self.max_retry_times)
+
+        if retries > max_retry_times:
+            if self.stats is not None:
+                self.stats.inc_value('retry/max_reached', spider=spider)
+            self.logger.error(f"Gave up retrying {request} (failed {retries} times): {reason}")
+            return None
+
+        budget = self._budget(request)
+        if budget is not None and not budget.withdraw():
+            if self.stats is not None:
+                self.stats.inc_value('retry/budget_exhausted', spider=spider)
+            self.logger.warning(f"Retry budget of {urlparse_cached(request).hostname} spent, "
+                                f"not retrying {request}: {reason}")
+            return None
+
+        delay = self._backoff(retries)
+        self.logger.debug(f"Retrying {request} in {delay:.2f}s (failed {retries} times): {reason}")
+        retryreq = request.copy()
+        retryreq.meta['retry_times'] = retries
+        retryreq.meta['not_before'] = time() + delay
+        retryreq.dont_filter = True
+        retryreq.priority = request.priority + self.priority_adjust
+        if self.stats is not None:
+            self.stats.inc_value('retry/count', spider=spider)
+            self.stats.inc_value(f'retry/reason_count/{reason}', spider=spider)
+        return retryreq
+
+    def process_request(self, request, spider):
+        budget = self._budget(request)
+        if budget is not None and not request.meta.get('retry_times'):
+            budget.deposit()
+
+    def process_response(self, request, response, spider):
+        if request.meta.get('dont_retry', False):
+            return response
+        if response.status in self.retry_http_codes:
+            return self._retry(request, str(response.status), spider) or response
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if isinstance(exception, self.exceptions_to_retry) and not request.meta.get('dont_retry', False):
+            return self._retry(request, global_object_name(exception.__class__), spider)
@@ -0,0 +1,362 @@
+import gzip
+import os
+import pickle
+import sqlite3
+
+from email.utils import mktime_tz, parsedate_tz
+from http.client import HTTPMessage
+from importlib import import_module
+from time import time
+from weakref import WeakKeyDictionary
+
+from aioscpy.utils.othtypes import urlparse_cached
+from aioscpy.utils.request import request_fingerprint
+
+
+def get_header(headers, name):
+    """Return the first value of header ``name`` as str, or None
+
+    Works with the header types of every download handler as well as the
+    plain dicts of requests.
+    """
+    if not headers:
+        return None
+    value = headers.get(name)
+    if value is None:
+        value = headers.get(name.lower())
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    return value
+
+
+def header_items(headers):
+    """Return the (name, value) str pairs of ``headers``, repeated headers included"""
+    if not headers:
+        return []
+    items = headers.multi_items() if hasattr(headers, 'multi_items') else headers.items()
+    pairs = []
+    for name, values in items:
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        for value in values:
+            pairs.append((
+                name.decode('latin-1') if isinstance(name, bytes) else str(name),
+                value.decode('latin-1') if isinstance(value, bytes) else str(value),
+            ))
+    return pairs
+
+
+def build_headers(pairs):
+    """Case insensitive headers keeping repeated ones, from (name, value) pairs
+
+    Cached responses come back the same whichever download handler stored
+    them, ``headers.get(name)`` gives the first value, ``get_all`` every one.
+    """
+    headers = HTTPMessage()
+    for name, value in pairs:
+        headers[name] = value
+    return headers
+
+
+def has_validators(response):
+    return (get_header(response.headers, 'ETag') is not None
+            or get_header(response.headers, 'Last-Modified') is not None)
+
+
+def parse_cachecontrol(header):
+    """Parse a Cache-Control header into a dict of lower case directives,
+    ``'public, max-age=60'`` gives ``{'public': None, 'max-age': '60'}``"""
+    directives = {}
+    for directive in (header or '').split(','):
+        key, sep, value = directive.strip().partition('=')
+        if key:
+            directives[key.lower()] = value.strip('"') if sep else None
+    return directives
+
+
+def rfc1123_to_epoch(date_str):
+    try:
+        return mktime_tz(parsedate_tz(date_str))
+    except Exception:
+        return None
+
+
+class DummyPolicy:
+    """Cache every response and never check its freshness
+
+    Good for replaying a crawl offline or while developing a spider,
+    HTTPCACHE_EXPIRATION_SECS is the only way cached responses get stale.
+    Stale responses are revalidated with the server when HTTPCACHE_REVALIDATE
+    is set, so a daily recrawl only downloads the pages that changed.
+    """
+
+    def __init__(self, settings):
+        self.ignore_schemes = settings.getlist('HTTPCACHE_IGNORE_SCHEMES')
+        self.ignore_http_codes = [int(x) for x in settings.getlist('HTTPCACHE_IGNORE_HTTP_CODES')]
+
+    def should_cache_request(self, request):
+        return urlparse_cached(request).scheme not in self.ignore_schemes
+
+    def should_cache_response(self, response, request):
+        return response.status not in self.ignore_http_codes
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        return True
+
+    def is_cached_response_valid(self, cachedresponse, response, request):
+        return response.status == 304
+
+
+class RFC2616Policy:
+    """Cache responses as an HTTP/1.1 client cache would
+
+    Cache-Control, Expires, Age and Date decide what is stored and for how
+    long it stays fresh, with Firefox's heuristics for responses that do
+    not say. A stale response is revalidated (or downloaded again when it
+    has no validators), and kept serving when the server answers with a 5xx
+    or the download fails, unless it was sent with ``must-revalidate``.
+    """
+
+    MAXAGE = 3600 * 24 * 365  # one year
+
+    def __init__(self, settings):
+        self.always_store = settings.getbool('HTTPCACHE_ALWAYS_STORE')
+        self.ignore_schemes = settings.getlist('HTTPCACHE_IGNORE_SCHEMES')
+        self.ignore_response_cache_controls = [
+            cc.lower() for cc in settings.getlist('HTTPCACHE_IGNORE_RESPONSE_CACHE_CONTROLS')]
+        self._cc_parsed = WeakKeyDictionary()
+
+    def _parse_cachecontrol(self, r, is_response=True):
+        if r not in self._cc_parsed:
+            parsed = parse_cachecontrol(get_header(r.headers, 'Cache-Control'))
+            if is_response:
+                for key in self.ignore_response_cache_controls:
+                    parsed.pop(key, None)
+            self._cc_parsed[r] = parsed
+        return self._cc_parsed[r]
+
+    def should_cache_request(self, request):
+        if urlparse_cached(request).scheme in self.ignore_schemes:
+            return False
+        # obey the user agent directive "Cache-Control: no-store"
+        return 'no-store' not in self._parse_cachecontrol(request, is_response=False)
+
+    def should_cache_response(self, response, request):
+        # https://www.w3.org/Protocols/rfc2616/rfc2616-sec13.html#sec13.4
+        # 206 is left out, the cache does not deal with partial content
+        cc = self._parse_cachecontrol(response)
+        if 'no-store' in cc:
+            return False
+        if response.status == 304:
+            return False
+        if self.always_store:
+            return True
+        # any hint on the expiration is good
+        if 'max-age' in cc or get_header(response.headers, 'Expires') is not None:
+            return True
+        # Firefox falls back to one year for these
+        if response.status in (300, 301, 308):
+            return True
+        # other statuses without expiration need at least one validator
+        if response.status in (200, 203, 401):
+            return has_validators(response)
+        return False
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        cc = self._parse_cachecontrol(cachedresponse)
+        ccreq = self._parse_cachecontrol(request, is_response=False)
+        if 'no-cache' in cc or 'no-cache' in ccreq:
+            return False
+
+        now = time()
+        freshnesslifetime = self._compute_freshness_lifetime(cachedresponse, now)
+        currentage = self._compute_current_age(cachedresponse, now)
+
+        reqmaxage = self._get_max_age(ccreq)
+        if reqmaxage is not None:
+            freshnesslifetime = min(freshnesslifetime, reqmaxage)
+
+        if currentage < freshnesslifetime:
+            return True
+
+        if 'max-stale' in ccreq and 'must-revalidate' not in cc:
+            # the client accepts a stale response, of any age when max-stale has no value
+            staleage = ccreq['max-stale']
+            if staleage is None:
+                return True
+            try:
+                if currentage < freshnesslifetime + max(0, int(staleage)):
+                    return True
+            except ValueError:
+                pass
+        return False
+
+    def is_cached_response_valid(self, cachedresponse, response, request):
+        # keep serving the cached response while the server fails, unless told not to
+        if response.status >= 500:
+            return 'must-revalidate' not in self._parse_cachecontrol(cachedresponse)
+        return response.status == 304
+
+    def _get_max_age(self, cc):
+        try:
+            return max(0, int(cc['max-age']))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _compute_freshness_lifetime(self, response, now):
+        # Reference nsHttpResponseHead::ComputeFreshnessLifetime
+        maxage = self._get_max_age(self._parse_cachecontrol(response))
+        if maxage is not None:
+            return maxage
+
+        date = rfc1123_to_epoch(get_header(response.headers, 'Date')) or now
+        expires = get_header(response.headers, 'Expires')
+        if expires is not None:
+            expires = rfc1123_to_epoch(expires)
+            # an Expires that does not parse is in the past (RFC 2616 14.21)
+            return max(0, expires - date) if expires else 0
+
+        # Firefox's heuristic on Last-Modified
+        lastmodified = rfc1123_to_epoch(get_header(response.headers, 'Last-Modified'))
+        if lastmodified and lastmodified <= date:
+            return (date - lastmodified) / 10
+
+        if response.status in (300, 301, 308):
+            return self.MAXAGE
+        return 0
+
+    def _compute_current_age(self, response, now):
+        # Reference nsHttpResponseHead::ComputeCurrentAge
+        currentage = 0
+        # without a Date header the clocks are assumed in sync
+        date = rfc1123_to_epoch(get_header(response.headers, 'Date')) or now
+        if now > date:
+            currentage = now - date
+        try:
+            currentage = max(currentage, int(get_header(response.headers, 'Age')))
+        except (TypeError, ValueError):
+            pass
+        return currentage
+
+
+class _CacheStorage:
+    """Shared parts of the storages: records are pickled dicts keyed by the
+    request fingerprint, with the body gzipped when HTTPCACHE_GZIP is set
+
+    Expired responses are dropped, or returned with the ``stale`` flag when
+    HTTPCACHE_REVALIDATE is set and they carry an ETag or a Last-Modified.
+    """
+
+    def __init__(self, settings):
+        self.cachedir = settings.get('HTTPCACHE_DIR', '.aioscpy/httpcache')
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.use_gzip = settings.getbool('HTTPCACHE_GZIP', True)
+        self.revalidate = settings.getbool('HTTPCACHE_REVALIDATE', True)
+
+    def _path(self, spider, suffix):
+        os.makedirs(self.cachedir, exist_ok=True)
+        return os.path.join(self.cachedir, f'{spider.name}{suffix}')
+
+    def _expired(self, stored):
+        return 0 < self.expiration_secs < time() - stored
+
+    def _load(self, data, stored):
+        expired = self._expired(stored)
+        if expired and not self.revalidate:
+            return None
+        response = self._decode(data)
+        if expired:
+            if not has_validators(response):
+                return None
+            response.flags.append('stale')
+        return response
+
+    def _encode(self, request, response):
+        body = response.body
+        record = {
+            'url': response.url,
+            'status': response.status,
+            'headers': header_items(response.headers),
+            'body': gzip.compress(body, compresslevel=6) if self.use_gzip else body,
+            'gzip': self.use_gzip,
+            'request_url': request.url,
+        }
+        return pickle.dumps(record, protocol=4)
+
+    def _decode(self, data):
+        record = pickle.loads(data)
+        body = gzip.decompress(record['body']) if record['gzip'] else record['body']
+        return self.di.get('response')(
+            record['url'],
+            status=record['status'],
+            headers=build_headers(record['headers']),
+            body=body,
+        )
+
+
+class DbmCacheStorage(_CacheStorage):
+    """Responses in one dbm database per spider, HTTPCACHE_DBM_MODULE picks the
+    implementation"""
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.dbmodule = import_module(settings.get('HTTPCACHE_DBM_MODULE', 'dbm'))
+        self.db = None
+
+    def open_spider(self, spider):
+        self.db = self.dbmodule.open(self._path(spider, '.db'), 'c')
+
+    def close_spider(self, spider):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def retrieve_response(self, spider, request):
+        key = request_fingerprint(request)
+        stored = self.db.get(f'{key}_time')
+        data = self.db.get(f'{key}_data')
+        if stored is None or data is None:
+            return None
+        return self._load(data, float(stored))
+
+    def store_response(self, spider, request, response):
+        key = request_fingerprint(request)
+        self.db[f'{key}_data'] = self._encode(request, response)
+        self.db[f'{key}_time'] = str(time())
+
+
+class SqliteCacheStorage(_CacheStorage):
+    """Responses in one SQLite database per spider"""
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.db = None
+
+    def open_spider(self, spider):
+        self.db = sqlite3.connect(self._path(spider, '.sqlite3'))
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                        'fingerprint TEXT PRIMARY KEY, stored REAL NOT NULL, data BLOB NOT NULL)')
+        if self.expiration_secs > 0 and not self.revalidate:
+            self.db.execute('DELETE FROM responses WHERE stored < ?', (time() - self.expiration_secs,))
+        self.db.commit()
+
+    def close_spider(self, spider):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def retrieve_response(self, spider, request):
+        row = self.db.execute('SELECT stored, data FROM responses WHERE fingerprint = ?',
+                              (request_fingerprint(request),)).fetchone()
+        if row is None:
+            return None
+        return self._load(row[1], row[0])
+
+    def store_response(self, spider, request, response):
+        self.db.execute('INSERT OR REPLACE INTO responses (fingerprint, stored, data) VALUES (?, ?, ?)',
+                        (request_fingerprint(request), time(), self._encode(request, response)))
+        self.db.commit()
@@ -2,14 +2,20 @@ import time
 from collections import deque
 
 from aioscpy.middleware.manager import MiddlewareManager
+from aioscpy.core.downloader.controller import SlotController
+
+# responses that did not come from a download of their own, their time says nothing of the server
+UNTIMED_FLAGS = ('cached', 'coalesced', 'not_modified')
 
 
 class AdaptiveConcurrencyMiddleware:
     """
     Middleware that adjusts concurrency based on response times.
     
-    This middleware monitors response times and adjusts the concurrency
-    settings dynamically to maintain optimal performance.
+    This middleware monitors response times and changes the downloader's
+    global concurrency through ``Downloader.set_concurrency`` to keep the
+    average response time close to the target. Responses served by a cache
+    or shared with another request are not sampled.
     """
     
     def __init__(self, crawler):
@@ -32,8 +38,6 @@ class AdaptiveConcurrencyMiddleware:
         self.last_adjustment_time = time.time()
         self.current_concurrency = self.settings.getint('CONCURRENT_REQUESTS', 16)
         
-        # Set initial concurrency
-        self.crawler.settings.set('CONCURRENT_REQUESTS', self.current_concurrency)
         self.logger.info(f"Adaptive concurrency enabled. Initial concurrency: {self.current_concurrency}")
     
     @classmethod
@@ -51,6 +55,8 @@ class AdaptiveConcurrencyMiddleware:
     async def process_response(self, request, response, spider):
         if not self.enabled or 'request_start_time' not in request.meta:
             return response
+        if any(flag in response.flags for flag in UNTIMED_FLAGS):
+            return response
             
         # Calculate response time
         response_time = time.time() - request.meta['request_start_time']
@@ -61,6 +67,8 @@ class AdaptiveConcurrencyMiddleware:
         if (current_time - self.last_adjustment_time) >= self.adjustment_interval and len(self.response_times) >= self.window_size:
             self._adjust_concurrency()
             self.last_adjustment_time = current_time
+            # the next decision only looks at responses downloaded under the new limit
+            self.response_times.clear()
             
         return response
     
@@ -78,8 +86,98 @@ class AdaptiveConcurrencyMiddleware:
         # Only update if there's a significant change
         if new_concurrency != self.current_concurrency:
             self.current_concurrency = new_concurrency
-            self.crawler.settings.set('CONCURRENT_REQUESTS', new_concurrency)
+            # settings are frozen once the crawler runs, the downloader takes the new limit live
+            downloader = getattr(getattr(self.crawler, 'engine', None), 'downloader', None)
+            if downloader is not None:
+                downloader.set_concurrency(new_concurrency)
             self.logger.info(
                 f"Adjusted concurrency to {new_concurrency} (avg response time: {avg_response_time:.2f}s, "
                 f"target: {self.target_response_time:.2f}s)"
             )
+
+
+class SlotConcurrencyMiddleware:
+    """
+    Middleware that gives every downloader slot its own concurrency limit.
+
+    Each slot gets a SlotController fed with the latency, the in-flight count
+    and the failures of its responses. Its decisions go to the downloader
+    through ``Downloader.set_slot_concurrency``, so fast and slow hosts run
+    at their own limits. Decisions are counted in the stats, and the current
+    limit and latency of each slot are kept there too.
+
+    It sits next to the download handlers, above RetryMiddleware, so failed
+    responses are seen before they are retried. Responses served by a cache
+    are not sampled.
+    """
+
+    ERROR_CODES = {429, 500, 502, 503, 504, 522, 524}
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.settings = crawler.settings
+        self.enabled = self.settings.getbool('ADAPTIVE_SLOT_CONCURRENCY_ENABLED', False)
+        self.stats = getattr(crawler, 'stats', None)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _downloader(self):
+        return getattr(getattr(self.crawler, 'engine', None), 'downloader', None)
+
+    def _controller(self, slot):
+        # kept on the slot, so it goes away when the downloader drops the idle slot
+        if slot.controller is None:
+            slot.controller = SlotController(
+                limit=slot.concurrency,
+                min_limit=self.settings.getint('ADAPTIVE_SLOT_CONCURRENCY_MIN', 1),
+                max_limit=self.settings.getint('ADAPTIVE_SLOT_CONCURRENCY_MAX', 64),
+                window=self.settings.getint('ADAPTIVE_SLOT_CONCURRENCY_WINDOW', 20),
+                tolerance=self.settings.getfloat('ADAPTIVE_SLOT_CONCURRENCY_TOLERANCE', 1.5),
+                backoff=self.settings.getfloat('ADAPTIVE_SLOT_CONCURRENCY_BACKOFF', 0.7),
+                max_error_rate=self.settings.getfloat('ADAPTIVE_SLOT_CONCURRENCY_MAX_ERROR_RATE', 0.1),
+            )
+        return slot.controller
+
+    async def process_request(self, request, spider):
+        if not self.enabled:
+            return None
+        downloader = self._downloader()
+        slot = downloader.slots.get(request.meta.get('download_slot')) if downloader is not None else None
+        request.meta['slot_request_start_time'] = time.time()
+        request.meta['slot_in_flight'] = len(slot.transferring) if slot is not None else 1
+        return None
+
+    def _sample(self, request, spider, error, cached=False):
+        start = request.meta.pop('slot_request_start_time', None)
+        in_flight = request.meta.pop('slot_in_flight', 1)
+        downloader = self._downloader()
+        if start is None or downloader is None or cached:
+            return
+        key = request.meta.get('download_slot')
+        slot = downloader.slots.get(key)
+        if slot is None:
+            return
+        controller = self._controller(slot)
+        decision = controller.sample(time.time() - start, in_flight, error)
+        if decision is None:
+            return
+        downloader.set_slot_concurrency(key, controller.concurrency)
+        if self.stats is not None:
+            self.stats.inc_value(f'adaptive_slot/decisions/{decision}', spider=spider)
+            self.stats.set_value(f'adaptive_slot/{key}/limit', controller.concurrency, spider=spider)
+            self.stats.set_value(f'adaptive_slot/{key}/min_rtt', round(controller.min_rtt or 0, 4), spider=spider)
+        self.logger.debug(f"Slot {key}: {decision}, concurrency {controller.concurrency} "
+                          f"(min latency {controller.min_rtt or 0:.3f}s)")
+
+    async def process_response(self, request, response, spider):
+        if self.enabled:
+            untimed = any(flag in response.flags for flag in UNTIMED_FLAGS)
+            self._sample(request, spider, response.status in self.ERROR_CODES, untimed)
+        return response
+
+    async def process_exception(self, request, exception, spider):
+        if self.enabled:
+            self._sample(request, spider, True)
+        return None
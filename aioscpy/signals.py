@@ -15,6 +15,8 @@ request_scheduled = object()
 request_dropped = object()
 request_reached_downloader = object()
 request_left_downloader = object()
+headers_received = object()
+bytes_received = object()
 response_received = object()
 response_downloaded = object()
 item_scraped = object()
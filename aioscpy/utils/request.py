@@ -0,0 +1,43 @@
+import hashlib
+import json
+
+from typing import Iterable, Optional
+from weakref import WeakKeyDictionary
+
+from w3lib.url import canonicalize_url
+
+from aioscpy.http import Request
+from aioscpy.utils.tools import to_bytes
+
+
+_fingerprint_cache: "WeakKeyDictionary[Request, dict]" = WeakKeyDictionary()
+
+
+def request_fingerprint(request: Request, include_headers: Optional[Iterable[str]] = None,
+                        keep_fragments: bool = False) -> str:
+    """Return the hex SHA1 fingerprint of ``request``
+
+    Requests with the same method, body and canonical URL (query arguments
+    sorted, fragment dropped unless ``keep_fragments``) share a fingerprint.
+    Headers are ignored, except the ones named in ``include_headers``.
+    The result is cached on the request, so it must not be changed afterwards.
+    """
+    headers = tuple(sorted(h.lower() for h in include_headers)) if include_headers else ()
+    cache = _fingerprint_cache.setdefault(request, {})
+    cache_key = (headers, keep_fragments)
+    if cache_key not in cache:
+        fp = hashlib.sha1()
+        fp.update(to_bytes(request.method))
+        fp.update(to_bytes(canonicalize_url(request.url, keep_fragments=keep_fragments)))
+        if request.json is not None:
+            fp.update(to_bytes(json.dumps(request.json, sort_keys=True, default=str)))
+        elif request.body:
+            fp.update(to_bytes(request.body))
+        if headers:
+            request_headers = {k.lower(): v for k, v in request.headers.items()}
+            for name in headers:
+                if name in request_headers:
+                    fp.update(to_bytes(name))
+                    fp.update(to_bytes(str(request_headers[name])))
+        cache[cache_key] = fp.hexdigest()
+    return cache[cache_key]
@@ -0,0 +1,89 @@
+"""Local benchmark for HttpxDownloadHandler.
+
+Starts an aiohttp server on localhost and fetches it through:
+
+* ``per-request``: a new ``httpx.AsyncClient`` for every request, which is how
+  the handler used to work (no keep-alive, a TCP handshake per request);
+* ``pooled``: ``HttpxDownloadHandler`` with its persistent client pool.
+
+Usage::
+
+    python benchmarks/bench_httpx_handler.py [requests] [concurrency]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from unittest.mock import MagicMock
+
+import httpx
+from aiohttp import web
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aioscpy import call_grace_instance
+from aioscpy.http import Request
+from aioscpy.settings import Settings
+from aioscpy.signalmanager import SignalManager
+from aioscpy.core.downloader.handlers.httpx import HttpxDownloadHandler
+
+
+async def start_server():
+    async def page(request):
+        return web.Response(text='<html><body>' + 'x' * 2048 + '</body></html>', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/{n}', page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+async def run(fetch, urls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(url):
+        async with semaphore:
+            await fetch(url)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[bounded(url) for url in urls])
+    return len(urls) / (time.perf_counter() - start)
+
+
+async def main(total=2000, concurrency=16):
+    runner, base = await start_server()
+    urls = [f'{base}/{i}' for i in range(total)]
+
+    async def per_request(url):
+        async with httpx.AsyncClient() as client:
+            response = await client.request('GET', url, timeout=20, follow_redirects=True)
+            response.read()
+
+    # the handler sends headers_received / bytes_received through the crawler's signals
+    crawler = MagicMock()
+    crawler.signals = SignalManager(crawler)
+    crawler.stats = None
+    handler = call_grace_instance(HttpxDownloadHandler, Settings(), crawler)
+
+    async def pooled(url):
+        await handler.download_request(Request(url), None)
+
+    try:
+        before = await run(per_request, urls, concurrency)
+        after = await run(pooled, urls, concurrency)
+    finally:
+        await handler.close()
+        await runner.cleanup()
+
+    print(f'requests: {total}, concurrency: {concurrency}')
+    print(f'per-request client: {before:8.1f} req/s')
+    print(f'pooled client:      {after:8.1f} req/s  ({after / before:.1f}x)')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:3]]))
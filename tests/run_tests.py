@@ -10,6 +10,26 @@ from test_engine_memory_management import TestEngineMemoryManagement
 from test_engine_task_beat import TestEngineTaskBeat
 from test_httpx_handler import TestHttpxHandler
 from test_adaptive_concurrency import TestAdaptiveConcurrencyMiddleware
+from test_downloader_budget import TestConcurrencyBudget
+from test_downloader_slots import TestDownloaderSlots
+from test_downloader_ratelimit import TestTokenBucket, TestDownloaderRateLimit
+from test_curl_cffi_handler import TestCurlCffiHandler
+from test_aiohttp_handler import TestAioHttpHandler
+from test_downloader_resolver import TestCachingResolver
+from test_download_maxsize import TestBodyCollector, TestStopDownload
+from test_response_spool import TestSpooledBody
+from test_requests_handler import TestRequestsHandler
+from test_pyhttpx_handler import TestPyHttpxHandler
+from test_tls_context_pool import TestSSLContextPool
+from test_proxy_pool import TestProxyPoolMiddleware
+from test_retry import TestRetryMiddleware
+from test_downloader_backoff import TestSlotBackoff
+from test_slot_controller import TestSlotController
+from test_downloader_hedging import TestHedger
+from test_request_coalescing import TestRequestFingerprint, TestRequestCoalescing
+from test_httpcache import TestDbmCacheStorage, TestSqliteCacheStorage, TestRFC2616Policy, TestHttpCacheMiddleware
+from test_httpcache import TestHttpCacheRevalidation
+from test_memory_cache import TestLRUResponseCache, TestMemoryCacheMiddleware
 
 
 def run_tests():
@@ -22,6 +42,33 @@ def run_tests():
     test_suite.addTest(unittest.makeSuite(TestEngineTaskBeat))
     test_suite.addTest(unittest.makeSuite(TestHttpxHandler))
     test_suite.addTest(unittest.makeSuite(TestAdaptiveConcurrencyMiddleware))
+    test_suite.addTest(unittest.makeSuite(TestConcurrencyBudget))
+    test_suite.addTest(unittest.makeSuite(TestDownloaderSlots))
+    test_suite.addTest(unittest.makeSuite(TestTokenBucket))
+    test_suite.addTest(unittest.makeSuite(TestDownloaderRateLimit))
+    test_suite.addTest(unittest.makeSuite(TestCurlCffiHandler))
+    test_suite.addTest(unittest.makeSuite(TestAioHttpHandler))
+    test_suite.addTest(unittest.makeSuite(TestCachingResolver))
+    test_suite.addTest(unittest.makeSuite(TestBodyCollector))
+    test_suite.addTest(unittest.makeSuite(TestStopDownload))
+    test_suite.addTest(unittest.makeSuite(TestSpooledBody))
+    test_suite.addTest(unittest.makeSuite(TestRequestsHandler))
+    test_suite.addTest(unittest.makeSuite(TestPyHttpxHandler))
+    test_suite.addTest(unittest.makeSuite(TestSSLContextPool))
+    test_suite.addTest(unittest.makeSuite(TestProxyPoolMiddleware))
+    test_suite.addTest(unittest.makeSuite(TestRetryMiddleware))
+    test_suite.addTest(unittest.makeSuite(TestSlotBackoff))
+    test_suite.addTest(unittest.makeSuite(TestSlotController))
+    test_suite.addTest(unittest.makeSuite(TestHedger))
+    test_suite.addTest(unittest.makeSuite(TestRequestFingerprint))
+    test_suite.addTest(unittest.makeSuite(TestRequestCoalescing))
+    test_suite.addTest(unittest.makeSuite(TestDbmCacheStorage))
+    test_suite.addTest(unittest.makeSuite(TestSqliteCacheStorage))
+    test_suite.addTest(unittest.makeSuite(TestRFC2616Policy))
+    test_suite.addTest(unittest.makeSuite(TestHttpCacheMiddleware))
+    test_suite.addTest(unittest.makeSuite(TestHttpCacheRevalidation))
+    test_suite.addTest(unittest.makeSuite(TestLRUResponseCache))
+    test_suite.addTest(unittest.makeSuite(TestMemoryCacheMiddleware))
     
     # Run the tests
     runner = unittest.TextTestRunner(verbosity=2)
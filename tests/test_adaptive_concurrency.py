@@ -1,17 +1,23 @@
+import asyncio
 import unittest
 import time
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, AsyncMock, patch
 
+from aioscpy import call_grace_instance
+from aioscpy.http import Request, Response
+from aioscpy.settings import Settings
 from aioscpy.middleware.adaptive_concurrency import AdaptiveConcurrencyMiddleware
 
+from test_downloader_slots import get_downloader
 
-class TestAdaptiveConcurrencyMiddleware(unittest.TestCase):
+
+class TestAdaptiveConcurrencyMiddleware(unittest.IsolatedAsyncioTestCase):
     """Test the AdaptiveConcurrencyMiddleware."""
 
     def setUp(self):
         # Create mocks
         self.crawler = MagicMock()
-        self.crawler.settings = {
+        self.crawler.settings = Settings({
             'ADAPTIVE_CONCURRENCY_ENABLED': True,
             'ADAPTIVE_CONCURRENCY_TARGET_RESPONSE_TIME': 0.5,
             'ADAPTIVE_CONCURRENCY_MIN_REQUESTS': 5,
@@ -19,17 +25,16 @@ class TestAdaptiveConcurrencyMiddleware(unittest.TestCase):
             'ADAPTIVE_CONCURRENCY_WINDOW_SIZE': 10,
             'ADAPTIVE_CONCURRENCY_ADJUSTMENT_INTERVAL': 1,
             'CONCURRENT_REQUESTS': 10,
-        }
-        self.crawler.settings.getbool = lambda key, default: self.crawler.settings.get(key, default)
-        self.crawler.settings.getfloat = lambda key, default: self.crawler.settings.get(key, default)
-        self.crawler.settings.getint = lambda key, default: self.crawler.settings.get(key, default)
+        })
+        self.crawler.settings.freeze()
         
         self.spider = MagicMock()
         self.spider.name = 'test_spider'
         
         # Create middleware
-        self.middleware = AdaptiveConcurrencyMiddleware(self.crawler)
+        self.middleware = call_grace_instance(AdaptiveConcurrencyMiddleware, self.crawler)
         self.middleware.logger = MagicMock()
+        self.downloader = self.crawler.engine.downloader
         
         # Create request and response mocks
         self.request = MagicMock()
@@ -62,6 +67,17 @@ class TestAdaptiveConcurrencyMiddleware(unittest.TestCase):
         self.assertEqual(len(self.middleware.response_times), 1)
         self.assertGreaterEqual(self.middleware.response_times[0], 0.3)
 
+    async def test_cached_responses_not_sampled(self):
+        """Test that cached, not modified and coalesced responses leave the response times alone."""
+        for flags in (['cached'], ['cached', 'not_modified'], ['coalesced']):
+            self.request.meta['request_start_time'] = time.time() - 0.3
+            response = Response('http://example.com/', flags=flags)
+            self.assertIs(await self.middleware.process_response(self.request, response, self.spider), response)
+        self.assertEqual(len(self.middleware.response_times), 0)
+
+        await self.middleware.process_response(self.request, Response('http://example.com/'), self.spider)
+        self.assertEqual(len(self.middleware.response_times), 1)
+
     async def test_adjust_concurrency_faster_responses(self):
         """Test that concurrency is increased when responses are faster than target."""
         # Fill the response times deque with fast responses (0.2s)
@@ -74,8 +90,8 @@ class TestAdaptiveConcurrencyMiddleware(unittest.TestCase):
         # Verify that concurrency was increased
         self.assertGreater(self.middleware.current_concurrency, 10)
         
-        # Verify that the setting was updated
-        self.crawler.settings.set.assert_called_with('CONCURRENT_REQUESTS', self.middleware.current_concurrency)
+        # Verify that the downloader took the new limit
+        self.downloader.set_concurrency.assert_called_with(self.middleware.current_concurrency)
         
         # Verify that the change was logged
         self.middleware.logger.info.assert_called_once()
@@ -92,8 +108,8 @@ class TestAdaptiveConcurrencyMiddleware(unittest.TestCase):
         # Verify that concurrency was decreased
         self.assertLess(self.middleware.current_concurrency, 10)
         
-        # Verify that the setting was updated
-        self.crawler.settings.set.assert_called_with('CONCURRENT_REQUESTS', self.middleware.current_concurrency)
+        # Verify that the downloader took the new limit
+        self.downloader.set_concurrency.assert_called_with(self.middleware.current_concurrency)
         
         # Verify that the change was logged
         self.middleware.logger.info.assert_called_once()
@@ -143,5 +159,49 @@ class TestAdaptiveConcurrencyMiddleware(unittest.TestCase):
         self.assertEqual(len(self.middleware.response_times), 0)
 
 
+    async def test_in_flight_tracks_target_latency(self):
+        """Test that the downloader's in-flight requests settle where latency meets the target."""
+        # the fake server answers in 5ms per request it is working on, so 0.05s means 10 in flight
+        downloader = get_downloader(CONCURRENT_REQUESTS=40, CONCURRENT_REQUESTS_PER_DOMAIN=100)
+        crawler = downloader.crawler
+        crawler.settings = Settings({
+            'ADAPTIVE_CONCURRENCY_ENABLED': True,
+            'ADAPTIVE_CONCURRENCY_TARGET_RESPONSE_TIME': 0.05,
+            'ADAPTIVE_CONCURRENCY_MIN_REQUESTS': 2,
+            'ADAPTIVE_CONCURRENCY_MAX_REQUESTS': 40,
+            'ADAPTIVE_CONCURRENCY_WINDOW_SIZE': 10,
+            'ADAPTIVE_CONCURRENCY_ADJUSTMENT_INTERVAL': 0,
+            'CONCURRENT_REQUESTS': 40,
+        })
+        crawler.engine.downloader = downloader
+        middleware = call_grace_instance(AdaptiveConcurrencyMiddleware, crawler)
+        middleware.logger = MagicMock()
+        downloader.middleware = call_grace_instance(
+            downloader.di.get('downloader_middleware'), crawler=crawler, middlewares=[middleware])
+
+        samples = []
+
+        async def download_request(request, spider):
+            samples.append(downloader.in_flight)
+            await asyncio.sleep(0.005 * downloader.in_flight)
+            return Response(request.url)
+
+        downloader.handlers = MagicMock(download_request=download_request, close=AsyncMock())
+        engine = MagicMock(_handle_downloader_output=AsyncMock())
+        spider = MagicMock(spec=['name'])
+        await downloader.open(spider, engine)
+        try:
+            for i in range(600):
+                await downloader.fetch(Request(f'http://example.com/{i}'))
+            await asyncio.sleep(1.5)
+        finally:
+            await downloader.close()
+
+        self.assertLessEqual(max(samples), 40)
+        self.assertTrue(6 <= downloader.total_concurrency <= 15, downloader.total_concurrency)
+        settled = samples[-50:]
+        self.assertTrue(6 <= sum(settled) / len(settled) <= 15, settled)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import MagicMock
+
+from aiohttp import web
+
+from aioscpy.http import Request
+from aioscpy.settings import Settings
+from aioscpy.signalmanager import SignalManager
+from aioscpy.libs.statscollectors import MemoryStatsCollector
+from aioscpy.core.downloader.handlers.aiohttp import AioHttpDownloadHandler
+
+
+class TestAioHttpHandler(unittest.IsolatedAsyncioTestCase):
+    """Test the shared connection pool of the aiohttp download handler."""
+
+    async def asyncSetUp(self):
+        async def page(request):
+            return web.Response(text=request.match_info['n'])
+
+        async def login(request):
+            response = web.HTTPFound('/home')
+            response.set_cookie('sid', 'abc')
+            raise response
+
+        async def home(request):
+            return web.Response(text=request.headers.get('Cookie', ''))
+
+        app = web.Application()
+        app.router.add_get('/login', login)
+        app.router.add_get('/home', home)
+        app.router.add_get('/{n}', page)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.base_url = 'http://127.0.0.1:%d' % site._server.sockets[0].getsockname()[1]
+
+        crawler = MagicMock()
+        crawler.stats = MemoryStatsCollector(crawler)
+        crawler.resolver = None
+        crawler.signals = SignalManager(crawler)
+        self.stats = crawler.stats
+        self.spider = MagicMock(spec=['name'])
+        self.handler = self._handler(crawler, CONCURRENT_REQUESTS=4, CONCURRENT_REQUESTS_PER_DOMAIN=2)
+
+    async def asyncTearDown(self):
+        await self.handler.close()
+        await self.runner.cleanup()
+
+    def _handler(self, crawler, **settings):
+        handler = AioHttpDownloadHandler(Settings(settings), crawler)
+        handler.logger = MagicMock()
+        handler.di = MagicMock()
+        handler.di.get.return_value = lambda url, body=None, **kwargs: body
+        return handler
+
+    def test_limits_follow_concurrency(self):
+        """Test that the pool limits default to the downloader concurrency."""
+        self.assertEqual(self.handler.limit, 4)
+        self.assertEqual(self.handler.limit_per_host, 2)
+
+    async def test_connections_are_reused(self):
+        """Test that sequential requests reuse a kept-alive connection."""
+        for i in range(3):
+            body = await self.handler.download_request(Request(f'{self.base_url}/{i}'), self.spider)
+            self.assertEqual(body, str(i).encode())
+
+        self.assertEqual(self.stats.get_value('aiohttp/pool/connections_created'), 1)
+        self.assertEqual(self.stats.get_value('aiohttp/pool/connections_reused'), 2)
+        self.assertEqual(self.handler.pool_stats()['idle'], 1)
+
+    async def test_redirect_keeps_cookies(self):
+        """Test that cookies set on a redirect hop reach the next hop, not the shared session."""
+        request = Request(f'{self.base_url}/login', cookies={'lang': 'en'})
+        body = await self.handler.download_request(request, self.spider)
+        self.assertEqual(sorted(body.decode().split('; ')), ['lang=en', 'sid=abc'])
+
+        body = await self.handler.download_request(Request(f'{self.base_url}/home'), self.spider)
+        self.assertEqual(body, b'')
+
+    async def test_unpooled_mode(self):
+        """Test that AIOHTTP_POOLED=False keeps the per-request sessions."""
+        handler = self._handler(MagicMock(stats=None, resolver=None, signals=None), AIOHTTP_POOLED=False)
+        body = await handler.download_request(Request(f'{self.base_url}/7'), self.spider)
+        self.assertEqual(body, b'7')
+        self.assertIsNone(handler.session)
+
+
+if __name__ == '__main__':
+    unittest.main()
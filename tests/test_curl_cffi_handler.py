@@ -0,0 +1,99 @@
+import unittest
+from contextlib import asynccontextmanager
+from unittest.mock import MagicMock, patch, AsyncMock
+
+from aioscpy.http import Request
+from aioscpy.settings import Settings
+from aioscpy.signalmanager import SignalManager
+from aioscpy.core.downloader.handlers.curl_cffi import CurlCffiDownloadHandler
+
+
+class TestCurlCffiHandler(unittest.IsolatedAsyncioTestCase):
+    """Test the session pool of the curl_cffi download handler."""
+
+    def setUp(self):
+        self.settings = Settings({'CURL_CFFI_MAX_SESSIONS': 2})
+        crawler = MagicMock()
+        crawler.signals = SignalManager(crawler)
+        self.handler = CurlCffiDownloadHandler(self.settings, crawler)
+        self.handler.logger = MagicMock()
+        self.handler.di = MagicMock()
+        self.spider = MagicMock(spec=['name'])
+
+        patcher = patch('aioscpy.core.downloader.handlers.curl_cffi.AsyncSession')
+        self.mock_session_cls = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_session_cls.side_effect = self._make_session
+
+    @staticmethod
+    def _make_session(**kwargs):
+        async def aiter_content(chunk_size=None):
+            yield b'response content'
+
+        response = MagicMock(url='https://example.com', status_code=200, headers={}, aiter_content=aiter_content)
+        session = MagicMock(request=AsyncMock(return_value=response), close=AsyncMock())
+
+        @asynccontextmanager
+        async def stream(*args, **kwargs):
+            yield await session.request(*args, **kwargs)
+        session.stream = stream
+        return session
+
+    async def test_session_is_reused(self):
+        """Test that requests with the same profile and proxy share a session."""
+        await self.handler.download_request(Request('https://example.com/1'), self.spider)
+        await self.handler.download_request(Request('https://example.com/2'), self.spider)
+
+        self.assertEqual(self.mock_session_cls.call_count, 1)
+        session = self.handler.sessions[(None, None)]
+        self.assertEqual(session.request.await_count, 2)
+
+    async def test_session_per_proxy(self):
+        """Test that every proxy gets its own session."""
+        proxy = 'http://proxy.example.com:8080'
+        await self.handler.download_request(Request('https://example.com/', meta={'proxy': proxy}), self.spider)
+        await self.handler.download_request(Request('https://example.com/'), self.spider)
+
+        self.assertEqual(list(self.handler.sessions), [(None, proxy), (None, None)])
+        _, kwargs = self.mock_session_cls.call_args_list[0]
+        self.assertEqual(kwargs['proxies'], {'http': proxy, 'https': proxy})
+
+    async def test_session_pool_is_bounded(self):
+        """Test that the least recently used session is evicted."""
+        with patch.object(self.handler, '_close_session_later', new=AsyncMock()) as close_later:
+            for profile in ('chrome110', 'edge101', 'safari15_5'):
+                self.handler._get_session(profile)
+
+        self.assertEqual(list(self.handler.sessions), [('edge101', None), ('safari15_5', None)])
+        close_later.assert_called_once()
+
+    def test_session_pool_fits_proxy_pool(self):
+        """Test that the default session cap leaves room for every proxy."""
+        proxies = [f'http://10.0.0.{i}:8080' for i in range(20)]
+        settings = Settings({'PROXY_POOL_ENABLED': True, 'PROXY_POOL': proxies})
+        self.assertEqual(CurlCffiDownloadHandler(Settings(), MagicMock()).max_sessions, 16)
+        self.assertEqual(CurlCffiDownloadHandler(settings, MagicMock()).max_sessions, 21)
+
+    async def test_close_closes_sessions(self):
+        """Test that close() closes every pooled session."""
+        session = self.handler._get_session()
+        await self.handler.close()
+
+        session.close.assert_awaited_once()
+        self.assertEqual(len(self.handler.sessions), 0)
+
+    async def test_close_closes_evicted_sessions(self):
+        """Test that close() does not leave evicted sessions waiting for their delayed close."""
+        evicted = self.handler._get_session('chrome110')
+        for profile in ('edge101', 'safari15_5'):
+            self.handler._get_session(profile)
+        self.assertEqual(list(self.handler.closing.values()), [evicted])
+
+        await self.handler.close()
+
+        evicted.close.assert_awaited_once()
+        self.assertEqual(len(self.handler.closing), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import MagicMock
+
+from aioscpy.http import Request
+from aioscpy.settings import Settings
+from aioscpy import signals
+from aioscpy.signalmanager import SignalManager
+from aioscpy.exceptions import DownloadMaxSizeExceeded, StopDownload
+from aioscpy.core.downloader.handlers.streaming import BodyCollector, get_size_limits
+
+
+class TestBodyCollector(unittest.IsolatedAsyncioTestCase):
+    """Test DOWNLOAD_MAXSIZE / DOWNLOAD_WARNSIZE enforcement on streamed bodies."""
+
+    def setUp(self):
+        self.request = Request('http://example.com/file')
+        self.stats = MagicMock()
+        self.logger = MagicMock()
+
+    def test_size_limits_precedence(self):
+        """Test that request meta wins over the spider, which wins over settings."""
+        settings = Settings({'DOWNLOAD_MAXSIZE': 100, 'DOWNLOAD_WARNSIZE': 10})
+        spider = MagicMock(spec=['name', 'download_maxsize'])
+        spider.download_maxsize = 50
+        self.assertEqual(get_size_limits(settings, self.request), (100, 10))
+        self.assertEqual(get_size_limits(settings, self.request, spider), (50, 10))
+        request = Request('http://example.com/', meta={'download_maxsize': 0})
+        self.assertEqual(get_size_limits(settings, request, spider), (0, 10))
+
+    async def test_content_length_checked_early(self):
+        """Test that an announced oversized body is refused before reading it."""
+        collector = BodyCollector(self.request, maxsize=100, stats=self.stats, logger=self.logger)
+        with self.assertRaises(DownloadMaxSizeExceeded):
+            await collector.headers_received({'Content-Length': '101'})
+        self.stats.inc_value.assert_any_call('downloader/maxsize_aborted_count')
+        self.stats.inc_value.assert_any_call('downloader/maxsize_aborted_bytes', 0)
+
+    async def test_abort_while_streaming(self):
+        """Test that the download stops once the received bytes pass maxsize."""
+        collector = BodyCollector(self.request, maxsize=100, stats=self.stats, logger=self.logger)
+        await collector.headers_received({})
+        await collector.bytes_received(b'x' * 60)
+        with self.assertRaises(DownloadMaxSizeExceeded):
+            await collector.bytes_received(b'x' * 60)
+        self.stats.inc_value.assert_any_call('downloader/maxsize_aborted_bytes', 120)
+        self.assertEqual(collector.getvalue(), b'')
+
+    async def test_warnsize_logged_once(self):
+        """Test that bodies above warnsize are logged once and kept."""
+        collector = BodyCollector(self.request, warnsize=10, stats=self.stats, logger=self.logger)
+        await collector.headers_received({'content-length': '30'})
+        for _ in range(3):
+            await collector.bytes_received(b'x' * 10)
+        self.assertEqual(collector.getvalue(), b'x' * 30)
+        self.logger.warning.assert_called_once()
+        self.stats.inc_value.assert_called_once_with('downloader/warnsize_count')
+
+
+class TestStopDownload(unittest.IsolatedAsyncioTestCase):
+    """Test stopping a download from headers_received / bytes_received receivers."""
+
+    def setUp(self):
+        self.request = Request('http://example.com/file')
+        self.signals = SignalManager(self)
+        self.collector = BodyCollector(self.request, logger=MagicMock(), signals=self.signals, spider=MagicMock())
+
+    async def test_stop_on_headers(self):
+        """Test that a receiver can refuse a body from its headers."""
+        def on_headers(headers, body_length, request, spider):
+            if headers['Content-Type'] != 'text/html':
+                raise StopDownload(fail=False)
+
+        self.signals.connect(on_headers, signals.headers_received)
+        self.assertFalse(await self.collector.headers_received({'Content-Type': 'application/pdf'}))
+        partial = MagicMock()
+        self.assertIs(self.collector.finish(partial), partial)
+        self.assertEqual(self.collector.flags, ['download_stopped'])
+
+    async def test_stop_on_bytes_fails_with_partial_response(self):
+        """Test that StopDownload(fail=True) carries the partial response."""
+        def on_bytes(data, request, spider):
+            raise StopDownload()
+
+        self.signals.connect(on_bytes, signals.bytes_received)
+        self.assertTrue(await self.collector.headers_received({}))
+        self.assertFalse(await self.collector.bytes_received(b'first chunk'))
+        self.assertEqual(self.collector.getvalue(), b'first chunk')
+
+        partial = MagicMock()
+        with self.assertRaises(StopDownload) as cm:
+            self.collector.finish(partial)
+        self.assertIs(cm.exception.response, partial)
+        self.assertIs(partial.request, self.request)
+
+
+if __name__ == '__main__':
+    unittest.main()
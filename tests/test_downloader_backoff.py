@@ -0,0 +1,76 @@
+import unittest
+from email.utils import formatdate
+from unittest.mock import MagicMock
+
+from aioscpy.http import Response
+from aioscpy.libs.statscollectors import MemoryStatsCollector
+from aioscpy.core.downloader import Slot
+from aioscpy.core.downloader.backoff import SlotBackoff, get_retry_after
+
+from test_downloader_slots import get_downloader
+
+
+class TestSlotBackoff(unittest.TestCase):
+    """Test the Retry-After and 429/503 aware backoff of downloader slots."""
+
+    def test_retry_after(self):
+        """Test that both forms of Retry-After are parsed."""
+        self.assertEqual(get_retry_after({'Retry-After': '120'}), 120)
+        self.assertEqual(get_retry_after({'retry-after': [b'7']}), 7)
+        self.assertAlmostEqual(get_retry_after({'Retry-After': formatdate(1030, usegmt=True)}, now=1000), 30)
+        self.assertEqual(get_retry_after({'Retry-After': 'soon'}), 0)
+        self.assertEqual(get_retry_after({}), 0)
+
+    def test_back_off_and_recover(self):
+        """Test that a slot is throttled once per pause and recovers step by step."""
+        slot = Slot(8, False, delay=0.5)
+        backoff = SlotBackoff(slot.concurrency, slot.delay, max_delay=60, recovery=0.5)
+        backoff.back_off(slot, retry_after=10, now=1000)
+        self.assertEqual((slot.concurrency, slot.delay, slot.next_allowed), (4, 10, 1010))
+
+        # responses of requests already in flight do not throttle further
+        backoff.back_off(slot, retry_after=0, now=1001)
+        self.assertEqual((slot.concurrency, backoff.count), (4, 1))
+        self.assertFalse(backoff.recover(slot, now=1005))
+        self.assertEqual(slot.concurrency, 4)
+
+        steps = 0
+        while not backoff.recover(slot, now=1011):
+            steps += 1
+        self.assertEqual((slot.concurrency, slot.delay), (8, 0.5))
+        self.assertEqual(steps, 4)
+
+    def test_retry_after_capped(self):
+        """Test that DOWNLOAD_BACKOFF_MAX_DELAY caps Retry-After and the delay."""
+        slot = Slot(2, False)
+        SlotBackoff(2, 0, max_delay=30).back_off(slot, retry_after=3600, now=0)
+        self.assertEqual((slot.delay, slot.next_allowed), (30, 30))
+
+    def test_downloader_updates_slot(self):
+        """Test that the downloader throttles the slot on 429 and exposes the state in stats."""
+        downloader = get_downloader(CONCURRENT_REQUESTS_PER_DOMAIN=4)
+        downloader.crawler.stats = stats = MemoryStatsCollector(MagicMock())
+        downloader.logger = MagicMock()
+        slot = Slot(4, False)
+
+        downloader._update_backoff('a.example', slot, Response('http://a.example/', status=200))
+        self.assertIsNone(slot.backoff)
+        self.assertIsNone(stats.get_value('downloader/backoff/a.example/concurrency'))
+
+        throttled = Response('http://a.example/', status=429, headers={'Retry-After': '0'})
+        downloader._update_backoff('a.example', slot, throttled)
+        self.assertEqual(slot.concurrency, 2)
+        self.assertEqual(stats.get_value('downloader/backoff_count'), 1)
+        self.assertEqual(stats.get_value('downloader/backoff/a.example/count'), 1)
+        self.assertEqual(stats.get_value('downloader/backoff/a.example/concurrency'), 2)
+
+        slot.backoff.until = 0
+        for _ in range(4):
+            downloader._update_backoff('a.example', slot, Response('http://a.example/', status=200))
+        self.assertIsNone(slot.backoff)
+        self.assertEqual(stats.get_value('downloader/backoff/a.example/concurrency'), 4)
+        self.assertEqual(stats.get_value('downloader/backoff/a.example/delay'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from aioscpy.settings import Settings
+from aioscpy.core.downloader.budget import ConcurrencyBudget
+
+
+class TestConcurrencyBudget(unittest.TestCase):
+    """Test the process-wide ConcurrencyBudget shared by downloaders."""
+
+    def setUp(self):
+        self.budget = ConcurrencyBudget(concurrency=4)
+        self.heavy = object()
+        self.light = object()
+        self.budget.register(self.heavy, 3)
+        self.budget.register(self.light, 1)
+
+    def test_from_settings(self):
+        """Test that the budget reads the global settings."""
+        budget = ConcurrencyBudget.from_settings(Settings({'GLOBAL_CONCURRENT_REQUESTS': 10}))
+        self.assertEqual(budget.concurrency, 10)
+        self.assertTrue(budget.enabled)
+        self.assertFalse(ConcurrencyBudget.from_settings(Settings()).enabled)
+
+    def test_weighted_share(self):
+        """Test that shares follow the crawler weights."""
+        self.assertEqual(self.budget.share(self.heavy), 3)
+        self.assertEqual(self.budget.share(self.light), 1)
+
+    def test_global_limit(self):
+        """Test that the total in-flight count never exceeds the budget."""
+        acquired = [self.budget.acquire(self.heavy) for _ in range(6)]
+        self.assertEqual(acquired.count(True), 4)
+        self.assertEqual(self.budget.total_transferring, 4)
+
+    def test_idle_capacity_is_lent(self):
+        """Test that a crawler may borrow beyond its share while nobody else waits."""
+        for _ in range(4):
+            self.assertTrue(self.budget.acquire(self.light))
+
+    def test_share_is_honored_when_contended(self):
+        """Test that a crawler over its share yields to a waiting crawler."""
+        for _ in range(3):
+            self.assertTrue(self.budget.acquire(self.heavy))
+        self.assertTrue(self.budget.acquire(self.light))
+        self.assertFalse(self.budget.acquire(self.light))
+
+        wakeup = MagicMock()
+        self.budget.wakeups[self.light] = wakeup
+        self.budget.release(self.heavy)
+        wakeup.assert_called_once()
+
+        # heavy is at its share and light is waiting, so light goes first
+        self.assertTrue(self.budget.acquire(self.light))
+        self.assertNotIn(self.light, self.budget.waiting)
+
+    def test_unregister_releases_slots(self):
+        """Test that unregistering a crawler frees its transfers."""
+        for _ in range(4):
+            self.budget.acquire(self.heavy)
+        self.budget.unregister(self.heavy)
+        self.assertTrue(self.budget.acquire(self.light))
+
+    def test_bandwidth_limit(self):
+        """Test that transferred bytes throttle new transfers."""
+        budget = ConcurrencyBudget(bandwidth=1000)
+        owner = object()
+        budget.register(owner)
+        with patch('aioscpy.core.downloader.budget.time', return_value=budget._stamp):
+            self.assertTrue(budget.acquire(owner))
+            budget.release(owner, 3000)
+            self.assertFalse(budget.acquire(owner))
+            self.assertAlmostEqual(budget.bandwidth_delay(), 2.0)
+        with patch('aioscpy.core.downloader.budget.time', return_value=budget._stamp + 2.5):
+            self.assertTrue(budget.acquire(owner))
+
+
+if __name__ == '__main__':
+    unittest.main()
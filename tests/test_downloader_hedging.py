@@ -0,0 +1,267 @@
+import asyncio
+import gc
+import unittest
+from unittest.mock import MagicMock
+
+from aioscpy import signals
+from aioscpy.http import Request, Response
+from aioscpy.settings import Settings
+from aioscpy.signalmanager import SignalManager
+from aioscpy.exceptions import StopDownload
+from aioscpy.libs.statscollectors import MemoryStatsCollector
+from aioscpy.core.downloader import Slot
+from aioscpy.core.downloader.hedge import Hedger, HedgeCopy
+from aioscpy.core.downloader.handlers.streaming import BodyCollector
+
+
+class FakeHandler:
+    """Download handler answering after the delays it is given, one per call"""
+
+    def __init__(self, delays, fail=()):
+        self.delays = list(delays)
+        self.fail = set(fail)
+        self.calls = 0
+        self.cancelled = 0
+        self.requests = []
+
+    async def download_request(self, request, spider):
+        call = self.calls
+        self.calls += 1
+        self.requests.append(request)
+        try:
+            await asyncio.sleep(self.delays[call] if call < len(self.delays) else 0)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if call in self.fail:
+            raise ConnectionError(f'call {call} failed')
+        return call
+
+
+class TestHedger(unittest.IsolatedAsyncioTestCase):
+    """Test hedged downloads of requests slower than their slot's p95."""
+
+    def setUp(self):
+        self.spider = MagicMock(spec=['name'])
+        self.stats = MemoryStatsCollector(MagicMock())
+        self.slot = Slot(8, False)
+
+    def get_hedger(self, **kwargs):
+        kwargs.setdefault('enabled', True)
+        kwargs.setdefault('min_samples', 20)
+        kwargs.setdefault('budget', 1.0)
+        hedger = Hedger(stats=self.stats, **kwargs)
+        self.fill(hedger)
+        return hedger
+
+    def fill(self, hedger):
+        """Give the slot a p95 of 10ms"""
+        self.slot.latencies = None
+        for _ in range(hedger.min_samples):
+            hedger.record(self.slot, 0.01)
+
+    def test_delay(self):
+        """Test that the p95 is only known after enough samples."""
+        hedger = Hedger(min_samples=20)
+        for i in range(19):
+            hedger.record(self.slot, i / 100)
+        self.assertIsNone(hedger.delay(self.slot))
+        hedger.record(self.slot, 1.0)
+        self.assertEqual(hedger.delay(self.slot), 1.0)
+        for i in range(80):
+            hedger.record(self.slot, 0.01)
+        self.assertEqual(hedger.delay(self.slot), 0.15)
+
+    async def test_hedge_wins(self):
+        """Test that a stalled request is hedged and the stalled copy cancelled."""
+        hedger = self.get_hedger()
+        handler = FakeHandler([10, 0])
+        result = await asyncio.wait_for(
+            hedger.fetch(handler.download_request, Request('http://example.com/'), self.spider, self.slot), 2)
+        self.assertEqual(result, 1)
+        await asyncio.sleep(0)
+        self.assertEqual((handler.calls, handler.cancelled), (2, 1))
+        self.assertEqual(self.stats.get_value('downloader/hedge/sent'), 1)
+        self.assertEqual(self.stats.get_value('downloader/hedge/won'), 1)
+
+    async def test_hedge_copy_is_marked(self):
+        """Test that the second copy is flagged so the handlers keep it quiet."""
+        hedger = self.get_hedger()
+        handler = FakeHandler([10, 0])
+        request = Request('http://example.com/', meta={'page': 1})
+        await hedger.fetch(handler.download_request, request, self.spider, self.slot)
+
+        primary, copy = handler.requests
+        self.assertIs(primary, request)
+        self.assertEqual(request.meta, {'page': 1})
+        self.assertEqual(set(copy.meta), {'page', 'hedge_copy'})
+        self.assertIsInstance(copy.meta['hedge_copy'], HedgeCopy)
+
+        crawler = MagicMock()
+        collector = BodyCollector.from_handler(
+            MagicMock(settings=Settings(), crawler=crawler), copy, self.spider)
+        self.assertEqual(collector.held, [])
+        self.assertIs(copy.meta['hedge_copy'].collector, collector)
+        collector = BodyCollector.from_handler(
+            MagicMock(settings=Settings(), crawler=crawler), primary, self.spider)
+        self.assertIsNone(collector.held)
+
+    def streaming_handler(self, crawler, delays, stop_at=None):
+        """Download handler streaming two chunks through a BodyCollector, slow for the calls in ``delays``"""
+        handler = MagicMock(settings=Settings({'DOWNLOAD_WARNSIZE': 4}), crawler=crawler)
+        calls = []
+
+        async def download_request(request, spider):
+            calls.append(request)
+            await asyncio.sleep(delays[len(calls) - 1])
+            collector = BodyCollector.from_handler(handler, request, spider)
+            if await collector.headers_received({}):
+                for chunk in (b'abc', b'def'):
+                    if not await collector.bytes_received(chunk):
+                        break
+            return collector.finish(Response(request.url, body=collector.getvalue(), flags=collector.flags))
+        return download_request
+
+    async def test_winning_hedge_copy_sends_signals(self):
+        """Test that a winning hedge copy replays its signals and stats, and the losing copy sends none."""
+        crawler = MagicMock(stats=self.stats)
+        crawler.signals = SignalManager(crawler)
+        received = []
+
+        def on_bytes(data, request, spider):
+            received.append(data)
+        crawler.signals.connect(on_bytes, signals.bytes_received)
+        hedger = self.get_hedger()
+
+        download_request = self.streaming_handler(crawler, [10, 0])
+        response = await hedger.fetch(download_request, Request('http://example.com/'), self.spider, self.slot)
+        self.assertEqual(response.body, b'abcdef')
+        self.assertEqual(received, [b'abc', b'def'])
+        self.assertEqual(self.stats.get_value('downloader/warnsize_count'), 1)
+
+    async def test_winning_hedge_copy_honours_stop_download(self):
+        """Test that a StopDownload raised while replaying a winning copy cuts its body."""
+        crawler = MagicMock(stats=self.stats)
+        crawler.signals = SignalManager(crawler)
+
+        def on_bytes(data, request, spider):
+            raise StopDownload(fail=False)
+        crawler.signals.connect(on_bytes, signals.bytes_received)
+        hedger = self.get_hedger()
+
+        download_request = self.streaming_handler(crawler, [10, 0])
+        response = await hedger.fetch(download_request, Request('http://example.com/'), self.spider, self.slot)
+        self.assertEqual(response.body, b'abc')
+        self.assertEqual(response.flags, ['download_stopped'])
+
+        self.fill(hedger)
+        crawler.signals.disconnect(on_bytes, signals.bytes_received)
+
+        def on_bytes_fail(data, request, spider):
+            raise StopDownload()
+        crawler.signals.connect(on_bytes_fail, signals.bytes_received)
+        download_request = self.streaming_handler(crawler, [10, 0])
+        with self.assertRaises(StopDownload) as cm:
+            await hedger.fetch(download_request, Request('http://example.com/'), self.spider, self.slot)
+        self.assertEqual(cm.exception.response.body, b'abc')
+
+    async def test_loser_exception_retrieved(self):
+        """Test that a copy failing in the same wakeup as the winner leaves no unretrieved exception."""
+        hedger = self.get_hedger()
+        release = asyncio.Event()
+        calls = []
+
+        async def download_request(request, spider):
+            calls.append(request)
+            failing = len(calls) == 2
+            await release.wait()
+            if failing:
+                raise ConnectionError('hedge failed')
+            return 'primary'
+
+        errors = []
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        try:
+            task = asyncio.ensure_future(
+                hedger.fetch(download_request, Request('http://example.com/'), self.spider, self.slot))
+            while len(calls) < 2:
+                await asyncio.sleep(0.01)
+            release.set()
+            self.assertEqual(await task, 'primary')
+            del task
+            await asyncio.sleep(0)
+            gc.collect()
+        finally:
+            loop.set_exception_handler(None)
+        self.assertEqual(errors, [])
+
+    async def test_primary_wins(self):
+        """Test that the original request still wins when it answers first."""
+        hedger = self.get_hedger()
+        handler = FakeHandler([0.05, 10])
+        result = await hedger.fetch(handler.download_request, Request('http://example.com/'), self.spider, self.slot)
+        self.assertEqual(result, 0)
+        await asyncio.sleep(0)
+        self.assertEqual((handler.calls, handler.cancelled), (2, 1))
+        self.assertIsNone(self.stats.get_value('downloader/hedge/won'))
+
+    async def test_failure_waits_for_other_copy(self):
+        """Test that a failed copy does not decide the race, and both failing raises."""
+        hedger = self.get_hedger()
+        handler = FakeHandler([0.05, 0.1], fail={0})
+        result = await hedger.fetch(handler.download_request, Request('http://example.com/'), self.spider, self.slot)
+        self.assertEqual(result, 1)
+
+        handler = FakeHandler([0.05, 0.1], fail={0, 1})
+        with self.assertRaisesRegex(ConnectionError, 'call 0'):
+            await hedger.fetch(handler.download_request, Request('http://example.com/'), self.spider, self.slot)
+
+    async def test_not_hedged(self):
+        """Test that disabled, opted out and non idempotent requests are never duplicated."""
+        hedger = self.get_hedger(enabled=False)
+        requests = [
+            Request('http://example.com/'),
+            Request('http://example.com/', meta={'hedge': False}),
+            Request('http://example.com/', method='POST', meta={'hedge': True}),
+        ]
+        for request in requests:
+            handler = FakeHandler([0.05])
+            await hedger.fetch(handler.download_request, request, self.spider, self.slot)
+            self.assertEqual(handler.calls, 1)
+
+        self.fill(hedger)
+        handler = FakeHandler([0.05, 0])
+        await hedger.fetch(handler.download_request, Request('http://example.com/', meta={'hedge': True}),
+                           self.spider, self.slot)
+        self.assertEqual(handler.calls, 2)
+
+    async def test_budget(self):
+        """Test that hedges stay within the budget."""
+        hedger = self.get_hedger(budget=0.25)
+        sent = 0
+        for _ in range(8):
+            self.fill(hedger)
+            handler = FakeHandler([0.05, 0.05])
+            await hedger.fetch(handler.download_request, Request('http://example.com/'), self.spider, self.slot)
+            sent += handler.calls - 1
+        self.assertEqual(sent, 2)
+        self.assertEqual(self.stats.get_value('downloader/hedge/sent'), 2)
+        self.assertEqual(self.stats.get_value('downloader/hedge/budget_exhausted'), 6)
+
+    async def test_cancel_cancels_both(self):
+        """Test that cancelling a hedged download cancels both copies."""
+        hedger = self.get_hedger()
+        handler = FakeHandler([10, 10])
+        task = asyncio.ensure_future(
+            hedger.fetch(handler.download_request, Request('http://example.com/'), self.spider, self.slot))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        self.assertEqual((handler.calls, handler.cancelled), (2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
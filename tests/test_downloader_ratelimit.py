@@ -0,0 +1,74 @@
+import unittest
+import asyncio
+from unittest.mock import MagicMock, patch, AsyncMock
+
+from aioscpy import call_grace_instance
+from aioscpy.http import Request
+from aioscpy.settings import Settings
+from aioscpy.core.downloader.ratelimit import TokenBucket, get_rate_limiter
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test the token bucket used to rate limit downloader slots."""
+
+    def test_burst_then_rate(self):
+        """Test that a full bucket allows a burst and then refills at the rate."""
+        bucket = TokenBucket(rate=2, burst=3)
+        bucket.stamp = 100.0
+        for _ in range(3):
+            self.assertEqual(bucket.ready_at(100.0), 100.0)
+            bucket.consume(100.0)
+        self.assertAlmostEqual(bucket.ready_at(100.0), 100.5)
+        self.assertEqual(bucket.ready_at(100.5), 100.5)
+
+    def test_tokens_capped_at_burst(self):
+        """Test that an idle bucket never holds more than its burst."""
+        bucket = TokenBucket(rate=10, burst=2)
+        bucket.stamp = 0.0
+        bucket.ready_at(1000.0)
+        self.assertEqual(bucket.tokens, 2)
+
+    def test_get_rate_limiter_patterns(self):
+        """Test that limits are looked up by exact key first and then by pattern."""
+        limits = {'*.example.com': {'rate': 1}, 'api.example.com': {'rate': 5, 'burst': 10}}
+        self.assertEqual(get_rate_limiter('api.example.com', limits).rate, 5)
+        self.assertEqual(get_rate_limiter('www.example.com', limits).rate, 1)
+        self.assertIsNone(get_rate_limiter('example.org', limits))
+
+
+class TestDownloaderRateLimit(unittest.TestCase):
+    """Test that rate limited slots wait on the ready heap."""
+
+    def test_slot_waits_for_tokens(self):
+        crawler = MagicMock()
+        crawler.settings = Settings({'DOWNLOAD_RATE_LIMITS': {'api.example.com': {'rate': 1, 'burst': 2}}})
+        crawler.budget = None
+        crawler.resolver = None
+        downloader = call_grace_instance('downloader', crawler)
+        downloader.spider = spider = MagicMock(spec=['name'])
+
+        async def dispatch(now):
+            with patch('aioscpy.core.downloader.time', return_value=now):
+                timeout = downloader._process_ready_slots(spider)
+            await asyncio.sleep(0)
+            return timeout
+
+        async def run():
+            for i in range(4):
+                await downloader.fetch(Request(f'http://api.example.com/{i}'))
+            downloader._download = AsyncMock()
+            slot = downloader.slots['api.example.com']
+
+            timeout = await dispatch(1000.0)
+            self.assertEqual(len(slot.transferring), 2)
+            self.assertAlmostEqual(timeout, 1.0)
+
+            await dispatch(1001.0)
+            self.assertEqual(len(slot.transferring), 3)
+
+        with patch('aioscpy.core.downloader.ratelimit.time', return_value=1000.0):
+            asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
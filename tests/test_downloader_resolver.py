@@ -0,0 +1,95 @@
+import unittest
+import asyncio
+import socket
+from unittest.mock import MagicMock, patch
+
+from aioscpy.http import Request
+from aioscpy.settings import Settings
+from aioscpy.core.downloader.resolver import CachingResolver
+from aioscpy.core.downloader.handlers.httpx import HttpxDownloadHandler
+from test_downloader_slots import get_downloader
+
+INFOS = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 0))]
+
+
+class TestCachingResolver(unittest.IsolatedAsyncioTestCase):
+    """Test the shared async DNS cache."""
+
+    async def asyncSetUp(self):
+        self.resolver = CachingResolver(ttl=300, negative_ttl=30)
+        self.calls = 0
+
+        async def getaddrinfo(host, port, **kwargs):
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            if host == 'missing.example.com':
+                raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+            return INFOS
+
+        loop = asyncio.get_running_loop()
+        patcher = patch.object(loop, 'getaddrinfo', side_effect=getaddrinfo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_from_settings(self):
+        """Test that DNSCACHE_ENABLED=False disables the resolver."""
+        self.assertIsNone(CachingResolver.from_settings(Settings({'DNSCACHE_ENABLED': False})))
+        resolver = CachingResolver.from_settings(Settings({'DNSCACHE_TTL': 60}))
+        self.assertEqual(resolver.ttl, 60)
+
+    async def test_concurrent_lookups_are_deduplicated(self):
+        """Test that simultaneous lookups of one host share a single query."""
+        results = await asyncio.gather(*[self.resolver.resolve('a.example.com', 80) for _ in range(5)])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results[0][0]['host'], '10.0.0.1')
+        self.assertEqual(results[0][0]['port'], 80)
+
+        await self.resolver.resolve('a.example.com', 443)
+        self.assertEqual(self.calls, 1)
+
+    async def test_entries_expire(self):
+        """Test that cached addresses are dropped after the TTL."""
+        await self.resolver.address('a.example.com')
+        with patch('aioscpy.core.downloader.resolver.time', return_value=10 ** 10):
+            await self.resolver.address('a.example.com')
+        self.assertEqual(self.calls, 2)
+
+    async def test_negative_caching(self):
+        """Test that failed lookups are cached and raised again."""
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                await self.resolver.resolve('missing.example.com')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(await self.resolver.address('missing.example.com'), 'missing.example.com')
+
+    async def test_ip_literals_skip_lookup(self):
+        """Test that IP addresses are returned without a query."""
+        self.assertEqual(await self.resolver.address('127.0.0.1'), '127.0.0.1')
+        self.assertEqual(self.calls, 0)
+
+    async def test_prefetch_on_scheduled_request(self):
+        """Test that the downloader resolves hosts of scheduled requests in the background."""
+        downloader = get_downloader(self.resolver)
+        downloader.prefetch_dns(Request('http://a.example.com/'), spider=MagicMock())
+        self.assertEqual(len(self.resolver.inflight), 1)
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(await self.resolver.address('a.example.com'), '10.0.0.1')
+        self.assertEqual(self.calls, 1)
+
+    def test_prefetch_only_when_the_cache_is_used(self):
+        """Test that hosts are prefetched only for per IP slots or a handler using the resolver."""
+        def prefetches(downloader):
+            return any(call.args[0] == downloader.prefetch_dns
+                       for call in downloader.crawler.signals.connect.call_args_list)
+
+        # the httpx handler resolves hosts itself
+        self.assertFalse(prefetches(get_downloader(self.resolver)))
+        self.assertTrue(prefetches(get_downloader(self.resolver, CONCURRENT_REQUESTS_PER_IP=2)))
+        with patch.object(HttpxDownloadHandler, 'resolver', self.resolver, create=True):
+            self.assertTrue(prefetches(get_downloader(self.resolver)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import unittest
+import asyncio
+from unittest.mock import MagicMock, patch, AsyncMock
+
+from aioscpy import call_grace_instance
+from aioscpy.http import Request
+from aioscpy.settings import Settings
+from aioscpy.core.downloader.backoff import SlotBackoff
+from aioscpy.core.downloader.resolver import CachingResolver
+
+
+def get_downloader(resolver=None, **settings):
+    crawler = MagicMock()
+    crawler.settings = Settings(settings)
+    crawler.budget = None
+    crawler.resolver = resolver
+    return call_grace_instance('downloader', crawler)
+
+
+class TestDownloaderSlots(unittest.TestCase):
+    """Test the per-domain and per-IP slots of the Downloader."""
+
+    def setUp(self):
+        self.spider = MagicMock(spec=['name'])
+        self.spider.name = 'test_spider'
+
+    async def _fetch_all(self, downloader, requests):
+        downloader.spider = self.spider
+        for request in requests:
+            await downloader.fetch(request)
+
+    def test_slot_per_domain(self):
+        """Test that every domain gets its own slot and concurrency."""
+        downloader = get_downloader(CONCURRENT_REQUESTS_PER_DOMAIN=3)
+        requests = [Request('http://a.example.com/1'), Request('http://a.example.com/2'),
+                    Request('http://b.example.com/1')]
+        asyncio.run(self._fetch_all(downloader, requests))
+
+        self.assertEqual(set(downloader.slots), {'a.example.com', 'b.example.com'})
+        self.assertEqual(len(downloader.slots['a.example.com'].queue), 2)
+        self.assertEqual(downloader.slots['b.example.com'].concurrency, 3)
+        self.assertEqual(requests[2].meta['download_slot'], 'b.example.com')
+
+    def test_meta_download_slot(self):
+        """Test that meta['download_slot'] overrides the hostname."""
+        downloader = get_downloader()
+        requests = [Request('http://a.example.com/', meta={'download_slot': 'shared'}),
+                    Request('http://b.example.com/', meta={'download_slot': 'shared'})]
+        asyncio.run(self._fetch_all(downloader, requests))
+
+        self.assertEqual(list(downloader.slots), ['shared'])
+
+    def test_slot_per_ip(self):
+        """Test that hosts resolving to the same IP share a slot."""
+        resolver = CachingResolver()
+        resolver.cache[('a.example.com', 0)] = (float('inf'), [(2, '10.0.0.1', 6)])
+        resolver.cache[('b.example.com', 0)] = (float('inf'), [(2, '10.0.0.1', 6)])
+        downloader = get_downloader(resolver, CONCURRENT_REQUESTS_PER_IP=2)
+        requests = [Request('http://a.example.com/'), Request('http://b.example.com/')]
+        asyncio.run(self._fetch_all(downloader, requests))
+
+        self.assertEqual(list(downloader.slots), ['10.0.0.1'])
+        self.assertEqual(downloader.slots['10.0.0.1'].concurrency, 2)
+
+    def test_download_slots_setting(self):
+        """Test that DOWNLOAD_SLOTS overrides concurrency and delay per slot."""
+        downloader = get_downloader(DOWNLOAD_SLOTS={'slow.example.com': {'concurrency': 1, 'delay': 2.0}})
+        requests = [Request('http://slow.example.com/'), Request('http://fast.example.com/')]
+        asyncio.run(self._fetch_all(downloader, requests))
+
+        self.assertEqual(downloader.slots['slow.example.com'].concurrency, 1)
+        self.assertEqual(downloader.slots['slow.example.com'].delay, 2.0)
+        self.assertEqual(downloader.slots['fast.example.com'].delay, 0)
+
+    def test_slot_gc(self):
+        """Test that idle slots are garbage collected."""
+        downloader = get_downloader()
+        asyncio.run(self._fetch_all(downloader, [Request('http://a.example.com/'),
+                                                 Request('http://b.example.com/')]))
+        idle = downloader.slots['a.example.com']
+        idle.queue.clear()
+        idle.active.clear()
+
+        async def run_gc():
+            with patch('asyncio.sleep', new=AsyncMock(side_effect=[None, asyncio.CancelledError])):
+                with patch('aioscpy.core.downloader.time', return_value=idle.lastseen + 120):
+                    with self.assertRaises(asyncio.CancelledError):
+                        await downloader._slot_gc()
+
+        asyncio.run(run_gc())
+        self.assertEqual(list(downloader.slots), ['b.example.com'])
+
+    def test_slot_gc_keeps_throttled_slots(self):
+        """Test that idle slots still backing off or short of tokens are kept."""
+        downloader = get_downloader(DOWNLOAD_RATE_LIMITS={'limited.example.com': {'rate': 0.001, 'burst': 1}})
+        asyncio.run(self._fetch_all(downloader, [Request('http://backoff.example.com/'),
+                                                 Request('http://limited.example.com/'),
+                                                 Request('http://idle.example.com/')]))
+        for slot in downloader.slots.values():
+            slot.queue.clear()
+            slot.active.clear()
+        backoff = downloader.slots['backoff.example.com']
+        backoff.backoff = SlotBackoff(8, 0)
+        downloader.slots['limited.example.com'].rate_limiter.consume()
+        now = backoff.lastseen + 120
+
+        async def run_gc():
+            with patch('asyncio.sleep', new=AsyncMock(side_effect=[None, asyncio.CancelledError])):
+                with patch('aioscpy.core.downloader.time', return_value=now):
+                    with self.assertRaises(asyncio.CancelledError):
+                        await downloader._slot_gc()
+
+        asyncio.run(run_gc())
+        self.assertEqual(sorted(downloader.slots), ['backoff.example.com', 'limited.example.com'])
+
+    def test_delay_does_not_block_other_slots(self):
+        """Test that a delayed slot waits on the ready heap while others dispatch."""
+        downloader = get_downloader(DOWNLOAD_SLOTS={'slow.example.com': {'delay': 10.0, 'randomize_delay': False}})
+        requests = [Request(f'http://slow.example.com/{i}') for i in range(3)] + \
+                   [Request(f'http://fast.example.com/{i}') for i in range(3)]
+
+        async def dispatch(now):
+            with patch('aioscpy.core.downloader.time', return_value=now):
+                timeout = downloader._process_ready_slots(self.spider)
+            await asyncio.sleep(0)
+            return timeout
+
+        async def run():
+            await self._fetch_all(downloader, requests)
+            downloader._download = AsyncMock()
+            slow, fast = downloader.slots['slow.example.com'], downloader.slots['fast.example.com']
+
+            timeout = await dispatch(1000.0)
+            self.assertEqual(len(fast.transferring), 3)
+            self.assertEqual(len(slow.transferring), 1)
+            self.assertEqual(len(slow.queue), 2)
+            self.assertEqual(slow.next_allowed, 1010.0)
+            self.assertTrue(slow.scheduled)
+            self.assertAlmostEqual(timeout, 10.0)
+
+            await dispatch(1005.0)
+            self.assertEqual(len(slow.transferring), 1)
+
+            await dispatch(1010.0)
+            self.assertEqual(len(slow.transferring), 2)
+
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
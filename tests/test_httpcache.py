@@ -0,0 +1,362 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from email.utils import formatdate
+from time import time
+from unittest.mock import MagicMock, AsyncMock, patch
+
+from aioscpy import call_grace_instance
+from aioscpy.exceptions import IgnoreRequest, ConnectionError
+from aioscpy.http import Request
+from aioscpy.http.response.text import TextResponse
+from aioscpy.libs.statscollectors import MemoryStatsCollector
+from aioscpy.libs.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from aioscpy.libs.extensions.httpcache import RFC2616Policy, build_headers, get_header, parse_cachecontrol
+from aioscpy.settings import Settings
+
+from test_downloader_slots import get_downloader
+
+
+class HttpCacheTestCase(unittest.TestCase):
+
+    storage = 'aioscpy.libs.extensions.httpcache.DbmCacheStorage'
+    policy = 'aioscpy.libs.extensions.httpcache.DummyPolicy'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.spider = MagicMock(spec=['name'])
+        self.spider.name = 'test_spider'
+        self.stats = MemoryStatsCollector(MagicMock())
+        self.request = Request('http://example.com/page')
+        self.response = TextResponse('http://example.com/page', status=200, body=b'<p>cached</p>' * 100,
+                                     headers={'Content-Type': 'text/html', 'Set-Cookie': 'a=1'})
+
+    def get_settings(self, **kwargs):
+        settings = {
+            'HTTPCACHE_ENABLED': True,
+            'HTTPCACHE_DIR': self.tmpdir,
+            'HTTPCACHE_STORAGE': self.storage,
+            'HTTPCACHE_POLICY': self.policy,
+        }
+        settings.update(kwargs)
+        return Settings(settings)
+
+    def get_middleware(self, **kwargs):
+        mw = call_grace_instance(HttpCacheMiddleware, self.get_settings(**kwargs), self.stats)
+        mw.spider_opened(self.spider)
+        self.addCleanup(mw.spider_closed, self.spider)
+        return mw
+
+
+class TestDbmCacheStorage(HttpCacheTestCase):
+    """Test that responses survive a round trip through the storage."""
+
+    def get_storage(self, **kwargs):
+        return self.get_middleware(**kwargs).storage
+
+    def test_store_and_retrieve(self):
+        """Test that status, headers and the gzipped body are restored."""
+        storage = self.get_storage()
+        self.assertIsNone(storage.retrieve_response(self.spider, self.request))
+        storage.store_response(self.spider, self.request, self.response)
+        cached = storage.retrieve_response(self.spider, Request('http://example.com/page#top'))
+        self.assertIsInstance(cached, TextResponse)
+        self.assertEqual((cached.url, cached.status, cached.body), (self.response.url, 200, self.response.body))
+        self.assertEqual(cached.headers['content-type'], 'text/html')
+
+    def test_repeated_headers(self):
+        """Test that repeated headers are kept, whatever header type the handler used."""
+        storage = self.get_storage()
+        headers = build_headers([('Set-Cookie', 'a=1'), ('Set-Cookie', 'b=2'), ('ETag', '"v1"')])
+        storage.store_response(self.spider, self.request, self.response.replace(headers=headers))
+        cached = storage.retrieve_response(self.spider, self.request)
+        self.assertEqual(cached.headers.get_all('set-cookie'), ['a=1', 'b=2'])
+        self.assertEqual(get_header(cached.headers, 'ETag'), '"v1"')
+
+    def test_expiration(self):
+        """Test that entries older than HTTPCACHE_EXPIRATION_SECS are not returned."""
+        storage = self.get_storage(HTTPCACHE_EXPIRATION_SECS=60)
+        with patch('aioscpy.libs.extensions.httpcache.time', return_value=time() - 120):
+            storage.store_response(self.spider, self.request, self.response)
+        self.assertIsNone(storage.retrieve_response(self.spider, self.request))
+        storage.store_response(self.spider, self.request, self.response)
+        self.assertIsNotNone(storage.retrieve_response(self.spider, self.request))
+
+    def test_persistent(self):
+        """Test that the cache outlives the spider run."""
+        storage = self.get_storage()
+        storage.store_response(self.spider, self.request, self.response)
+        storage.close_spider(self.spider)
+        storage.open_spider(self.spider)
+        self.assertEqual(storage.retrieve_response(self.spider, self.request).body, self.response.body)
+
+    def test_uncompressed(self):
+        """Test that HTTPCACHE_GZIP can be turned off."""
+        storage = self.get_storage(HTTPCACHE_GZIP=False)
+        storage.store_response(self.spider, self.request, self.response)
+        self.assertEqual(storage.retrieve_response(self.spider, self.request).body, self.response.body)
+
+
+class TestSqliteCacheStorage(TestDbmCacheStorage):
+    """Test the SQLite storage like the dbm one."""
+
+    storage = 'aioscpy.libs.extensions.httpcache.SqliteCacheStorage'
+
+
+class TestRFC2616Policy(unittest.TestCase):
+    """Test the HTTP/1.1 freshness rules."""
+
+    def setUp(self):
+        self.policy = RFC2616Policy(Settings({}))
+        self.request = Request('http://example.com/')
+
+    def response(self, status=200, **headers):
+        return TextResponse('http://example.com/', status=status, headers=headers)
+
+    def test_parse_cachecontrol(self):
+        self.assertEqual(parse_cachecontrol('Public, max-age=60, no-cache="Set-Cookie"'),
+                         {'public': None, 'max-age': '60', 'no-cache': 'Set-Cookie'})
+        self.assertEqual(parse_cachecontrol(None), {})
+
+    def test_should_cache_response(self):
+        """Test that only responses with expiration info or validators are stored."""
+        self.assertTrue(self.policy.should_cache_response(self.response(**{'Cache-Control': 'max-age=60'}), None))
+        self.assertTrue(self.policy.should_cache_response(self.response(ETag='"v1"'), None))
+        self.assertTrue(self.policy.should_cache_response(self.response(301), None))
+        self.assertFalse(self.policy.should_cache_response(self.response(), None))
+        self.assertFalse(self.policy.should_cache_response(
+            self.response(**{'Cache-Control': 'no-store, max-age=60'}), None))
+        self.assertFalse(self.policy.should_cache_request(Request('http://example.com/', headers={
+            'Cache-Control': 'no-store'})))
+
+    def test_freshness(self):
+        """Test max-age, Expires and the Last-Modified heuristic against the response age."""
+        now = time()
+        fresh = [
+            self.response(**{'Cache-Control': 'max-age=60', 'Date': formatdate(now - 30, usegmt=True)}),
+            self.response(Date=formatdate(now, usegmt=True), Expires=formatdate(now + 60, usegmt=True)),
+            self.response(**{'Date': formatdate(now - 10, usegmt=True),
+                             'Last-Modified': formatdate(now - 1000, usegmt=True)}),
+        ]
+        for response in fresh:
+            self.assertTrue(self.policy.is_cached_response_fresh(response, self.request), response.headers)
+        stale = [
+            self.response(**{'Cache-Control': 'max-age=60', 'Date': formatdate(now - 90, usegmt=True)}),
+            self.response(**{'Cache-Control': 'max-age=60', 'Age': '120'}),
+            self.response(Expires='garbage'),
+            self.response(**{'Cache-Control': 'max-age=60, no-cache'}),
+        ]
+        for response in stale:
+            self.assertFalse(self.policy.is_cached_response_fresh(response, self.request), response.headers)
+
+    def test_server_error_keeps_cached(self):
+        """Test that a 5xx keeps the stale response, unless it must be revalidated."""
+        self.assertTrue(self.policy.is_cached_response_valid(self.response(), self.response(503), self.request))
+        self.assertFalse(self.policy.is_cached_response_valid(
+            self.response(**{'Cache-Control': 'must-revalidate'}), self.response(503), self.request))
+        self.assertFalse(self.policy.is_cached_response_valid(self.response(), self.response(200), self.request))
+        self.assertTrue(self.policy.is_cached_response_valid(self.response(), self.response(304), self.request))
+
+
+class TestHttpCacheMiddleware(HttpCacheTestCase):
+    """Test that cached responses are served by the middleware."""
+
+    def test_miss_store_hit(self):
+        """Test that a stored response is returned from process_request and flagged."""
+        mw = self.get_middleware()
+        self.assertIsNone(mw.process_request(self.request, self.spider))
+        self.assertIs(mw.process_response(self.request, self.response, self.spider), self.response)
+
+        cached = mw.process_request(Request('http://example.com/page'), self.spider)
+        self.assertIn('cached', cached.flags)
+        self.assertEqual(cached.body, self.response.body)
+        self.assertIs(mw.process_response(self.request, cached, self.spider), cached)
+        self.assertEqual(self.stats.get_value('httpcache/miss'), 1)
+        self.assertEqual(self.stats.get_value('httpcache/store'), 1)
+        self.assertEqual(self.stats.get_value('httpcache/hit'), 1)
+
+    def test_dont_cache_and_ignored_codes(self):
+        """Test meta['dont_cache'] and HTTPCACHE_IGNORE_HTTP_CODES."""
+        mw = self.get_middleware(HTTPCACHE_IGNORE_HTTP_CODES=[503])
+        request = Request('http://example.com/page', meta={'dont_cache': True})
+        self.assertIsNone(mw.process_request(request, self.spider))
+        mw.process_response(request, self.response, self.spider)
+        mw.process_response(self.request, self.response.replace(status=503), self.spider)
+        self.assertIsNone(mw.process_request(self.request, self.spider))
+        self.assertEqual(self.stats.get_value('httpcache/uncacheable'), 1)
+
+    def test_ignore_missing(self):
+        mw = self.get_middleware(HTTPCACHE_IGNORE_MISSING=True)
+        with self.assertRaises(IgnoreRequest):
+            mw.process_request(self.request, self.spider)
+
+    def test_stale_fallback(self):
+        """Test that a stale response is served when the new download fails."""
+        mw = self.get_middleware(HTTPCACHE_POLICY='aioscpy.libs.extensions.httpcache.RFC2616Policy')
+        response = self.response.replace(headers={'Cache-Control': 'max-age=0'})
+        mw.process_response(self.request, response, self.spider)
+
+        request = Request('http://example.com/page')
+        self.assertIsNone(mw.process_request(request, self.spider))
+        recovered = mw.process_exception(request, ConnectionError('refused'), self.spider)
+        self.assertEqual(recovered.body, self.response.body)
+
+        request = Request('http://example.com/page')
+        mw.process_request(request, self.spider)
+        recovered = mw.process_response(request, self.response.replace(status=502), self.spider)
+        self.assertEqual(recovered.status, 200)
+        self.assertEqual(self.stats.get_value('httpcache/errorrecovery'), 1)
+        self.assertEqual(self.stats.get_value('httpcache/revalidate'), 1)
+
+    def test_hit_bypasses_handler(self):
+        """Test that the downloader does not call the handler for a cached response."""
+        mw = self.get_middleware()
+        mw.process_response(self.request, self.response, self.spider)
+
+        async def crawl():
+            downloader = get_downloader()
+            downloader.middleware = call_grace_instance(
+                downloader.di.get('downloader_middleware'), crawler=downloader.crawler, middlewares=[mw])
+            downloader.handlers = MagicMock(download_request=AsyncMock(), close=AsyncMock())
+            engine = MagicMock(_handle_downloader_output=AsyncMock())
+            await downloader.open(self.spider, engine)
+            await downloader.fetch(Request('http://example.com/page'))
+            for _ in range(20):
+                await asyncio.sleep(0.01)
+                if not downloader.active:
+                    break
+            await downloader.close()
+            return downloader.handlers.download_request, engine._handle_downloader_output
+
+        download_request, output = asyncio.run(crawl())
+        download_request.assert_not_called()
+        response = output.call_args.args[0]
+        self.assertIn('cached', response.flags)
+        self.assertEqual(response.body, self.response.body)
+
+
+
+class TestHttpCacheRevalidation(HttpCacheTestCase):
+    """Test conditional requests for stale cached responses."""
+
+    def setUp(self):
+        super().setUp()
+        self.response = self.response.replace(headers={
+            'Content-Type': 'text/html', 'ETag': '"v1"', 'Last-Modified': formatdate(time() - 3600, usegmt=True)})
+
+    def store_old(self, mw, response=None, age=120):
+        with patch('aioscpy.libs.extensions.httpcache.time', return_value=time() - age):
+            mw.storage.store_response(self.spider, self.request, response or self.response)
+
+    def test_not_modified(self):
+        """Test that a 304 gives back the cached response, flagged and fresh again."""
+        mw = self.get_middleware(HTTPCACHE_EXPIRATION_SECS=60)
+        self.store_old(mw)
+        shared_headers = {'User-Agent': 'test'}
+        request = Request('http://example.com/page', headers=shared_headers)
+        self.assertIsNone(mw.process_request(request, self.spider))
+        self.assertEqual(request.headers['If-None-Match'], '"v1"')
+        self.assertEqual(request.headers['If-Modified-Since'], self.response.headers['Last-Modified'])
+        self.assertEqual(shared_headers, {'User-Agent': 'test'})
+
+        not_modified = TextResponse(request.url, status=304, headers={'ETag': '"v1"', 'Content-Length': '0'})
+        response = mw.process_response(request, not_modified, self.spider)
+        self.assertEqual((response.status, response.body), (200, self.response.body))
+        self.assertEqual(response.flags, ['cached', 'not_modified'])
+        self.assertEqual(response.headers['content-type'], 'text/html')
+        self.assertEqual(response.headers.get_all('etag'), ['"v1"'])
+        self.assertEqual(self.stats.get_value('httpcache/not_modified'), 1)
+        self.assertEqual(self.stats.get_value('httpcache/not_modified_bytes'), len(self.response.body))
+
+        # stored again, so fresh for another HTTPCACHE_EXPIRATION_SECS
+        cached = mw.process_request(Request('http://example.com/page'), self.spider)
+        self.assertEqual(cached.flags, ['cached'])
+
+    def test_modified(self):
+        """Test that a changed page replaces the cached one."""
+        mw = self.get_middleware(HTTPCACHE_EXPIRATION_SECS=60)
+        self.store_old(mw)
+        request = Request('http://example.com/page')
+        mw.process_request(request, self.spider)
+        changed = self.response.replace(body=b'changed', headers={'ETag': '"v2"'})
+        self.assertIs(mw.process_response(request, changed, self.spider), changed)
+        self.assertEqual(mw.process_request(Request('http://example.com/page'), self.spider).body, b'changed')
+        self.assertEqual(self.stats.get_value('httpcache/invalidate'), 1)
+
+    def test_without_validators(self):
+        """Test that expired responses without validators, or with revalidation off, are dropped."""
+        mw = self.get_middleware(HTTPCACHE_EXPIRATION_SECS=60)
+        self.store_old(mw, self.response.replace(headers={'Content-Type': 'text/html'}))
+        request = Request('http://example.com/page')
+        self.assertIsNone(mw.process_request(request, self.spider))
+        self.assertNotIn('If-None-Match', request.headers)
+        self.assertEqual(self.stats.get_value('httpcache/miss'), 1)
+
+        mw = self.get_middleware(HTTPCACHE_EXPIRATION_SECS=60, HTTPCACHE_REVALIDATE=False)
+        self.store_old(mw)
+        request = Request('http://example.com/page')
+        self.assertIsNone(mw.process_request(request, self.spider))
+        self.assertNotIn('If-None-Match', request.headers)
+        self.assertNotIn('cached_response', request.meta)
+
+    def test_rfc2616_stale(self):
+        """Test that RFC2616Policy revalidates stale responses and takes the new Date."""
+        mw = self.get_middleware(HTTPCACHE_POLICY='aioscpy.libs.extensions.httpcache.RFC2616Policy')
+        old = self.response.replace(headers={'Cache-Control': 'max-age=60', 'ETag': '"v1"',
+                                             'Date': formatdate(time() - 120, usegmt=True)})
+        mw.process_response(self.request, old, self.spider)
+
+        request = Request('http://example.com/page')
+        self.assertIsNone(mw.process_request(request, self.spider))
+        self.assertEqual(request.headers['If-None-Match'], '"v1"')
+        date = formatdate(time(), usegmt=True)
+        response = mw.process_response(
+            request, TextResponse(request.url, status=304, headers={'Date': date}), self.spider)
+        self.assertIn('not_modified', response.flags)
+        self.assertEqual(response.headers['date'], date)
+        self.assertIsNotNone(mw.process_request(Request('http://example.com/page'), self.spider))
+
+    def test_coalesced_revalidation(self):
+        """Test that requests waiting on a revalidation get the cached page and leave the entry intact."""
+        mw = self.get_middleware(HTTPCACHE_EXPIRATION_SECS=60)
+        self.store_old(mw)
+
+        async def crawl():
+            downloader = get_downloader(DOWNLOAD_COALESCE_ENABLED=True)
+            downloader.middleware = call_grace_instance(
+                downloader.di.get('downloader_middleware'), crawler=downloader.crawler, middlewares=[mw])
+            release = asyncio.Event()
+
+            async def download_request(request, spider):
+                await release.wait()
+                return TextResponse(request.url, status=304, headers={'ETag': '"v1"'})
+
+            downloader.handlers = MagicMock(download_request=download_request, close=AsyncMock())
+            engine = MagicMock(_handle_downloader_output=AsyncMock())
+            await downloader.open(self.spider, engine)
+            for _ in range(3):
+                await downloader.fetch(Request('http://example.com/page'))
+            await asyncio.sleep(0.05)
+            release.set()
+            for _ in range(20):
+                await asyncio.sleep(0.01)
+                if not downloader.active:
+                    break
+            await downloader.close()
+            return [call.args[0] for call in engine._handle_downloader_output.call_args_list]
+
+        responses = asyncio.run(crawl())
+        self.assertEqual(len(responses), 3)
+        for response in responses:
+            self.assertEqual((response.status, response.body), (200, self.response.body))
+            self.assertIn('not_modified', response.flags)
+        self.assertIsNone(self.stats.get_value('httpcache/firsthand'))
+        self.assertEqual(self.stats.get_value('httpcache/not_modified'), 1)
+        cached = mw.process_request(Request('http://example.com/page'), self.spider)
+        self.assertEqual(cached.body, self.response.body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,23 +4,27 @@ from unittest.mock import MagicMock, patch, AsyncMock
 
 import httpx
 
-from aioscpy.core.downloader.handlers.httpx import HttpxDownloadHandler
+from aioscpy.settings import Settings
+from aioscpy.signalmanager import SignalManager
+from aioscpy.core.downloader.handlers.httpx import HttpxDownloadHandler, _PROXY_ARG
 
+RealAsyncClient = httpx.AsyncClient
 
-class TestHttpxHandler(unittest.TestCase):
+
+class TestHttpxHandler(unittest.IsolatedAsyncioTestCase):
     """Test the improved error handling in the HttpxDownloadHandler."""
 
     def setUp(self):
         # Create mocks
-        self.settings = {
+        self.settings = Settings({
             'DOWNLOAD_TIMEOUT': 10,
-        }
-        self.settings.get = lambda key, default=None: self.settings.get(key, default)
+        })
         
         self.crawler = MagicMock()
         self.crawler.settings = self.settings
+        self.crawler.signals = SignalManager(self.crawler)
         
-        self.spider = MagicMock()
+        self.spider = MagicMock(spec=['name'])
         self.spider.name = 'test_spider'
         
         # Create request mock
@@ -46,7 +50,7 @@ class TestHttpxHandler(unittest.TestCase):
         self.client_patch = patch('httpx.AsyncClient')
         self.mock_client_cls = self.client_patch.start()
         self.mock_client = AsyncMock()
-        self.mock_client_cls.return_value.__aenter__.return_value = self.mock_client
+        self.mock_client_cls.return_value = self.mock_client
         
         # Create a mock response
         self.mock_http_response = MagicMock()
@@ -54,10 +58,26 @@ class TestHttpxHandler(unittest.TestCase):
         self.mock_http_response.status_code = 200
         self.mock_http_response.headers = {}
         self.mock_http_response.cookies = {}
-        self.mock_http_response.read.return_value = b'response content'
+        self.mock_http_response.aiter_bytes = self._aiter_bytes(b'response content')
+        self.mock_http_response.next_request = None
+        self.mock_http_response.aclose = AsyncMock()
         
-        # Set up the client to return the mock response
+        # Set up the client to return the mock response, sent through request()
         self.mock_client.request.return_value = self.mock_http_response
+        self.mock_client.max_redirects = 20
+        self.mock_client.build_request = MagicMock(side_effect=lambda *args, **kwargs: (args, kwargs))
+
+        async def send(http_request, **kwargs):
+            args, kwargs = http_request
+            return await self.mock_client.request(*args, **kwargs)
+        self.mock_client.send = send
+
+    @staticmethod
+    def _aiter_bytes(*chunks):
+        async def aiter_bytes(chunk_size=None):
+            for chunk in chunks:
+                yield chunk
+        return aiter_bytes
 
     def tearDown(self):
         self.client_patch.stop()
@@ -139,11 +159,164 @@ class TestHttpxHandler(unittest.TestCase):
         
         # Verify that the client was created with the proxy
         args, kwargs = self.mock_client_cls.call_args
-        self.assertEqual(kwargs['proxies'], 'http://proxy.example.com:8080')
+        self.assertEqual(kwargs[_PROXY_ARG], 'http://proxy.example.com:8080')
         
         # Verify that the proxy usage was logged
         self.handler.logger.debug.assert_called_once()
 
+    async def test_client_is_reused(self):
+        """Test that requests with the same proxy and TLS profile share one client."""
+        await self.handler.download_request(self.request, self.spider)
+        await self.handler.download_request(self.request, self.spider)
+
+        # Verify that a single pooled client served both requests
+        self.mock_client_cls.assert_called_once()
+        self.assertEqual(self.mock_client.request.call_count, 2)
+
+        # A different proxy gets its own client
+        self.request.meta['proxy'] = 'http://proxy.example.com:8080'
+        await self.handler.download_request(self.request, self.spider)
+        self.assertEqual(self.mock_client_cls.call_count, 2)
+        self.assertEqual(len(self.handler.clients), 2)
+
+    async def test_client_pool_is_bounded(self):
+        """Test that the least recently used client is evicted and closed."""
+        self.handler.max_clients = 1
+        self.handler._close_client_later = AsyncMock()
+        await self.handler.download_request(self.request, self.spider)
+        self.request.meta['proxy'] = 'http://proxy.example.com:8080'
+        await self.handler.download_request(self.request, self.spider)
+
+        self.assertEqual(list(self.handler.clients), [('http://proxy.example.com:8080', None)])
+        self.handler._close_client_later.assert_called_once()
+
+    def test_client_pool_fits_proxy_pool(self):
+        """Test that the default client cap leaves room for every proxy and TLS profile."""
+        self.assertEqual(self.handler.max_clients, 32)
+        proxies = [f'http://10.0.0.{i}:8080' for i in range(40)]
+        settings = Settings({'PROXY_POOL_ENABLED': True, 'PROXY_POOL': proxies})
+        self.assertEqual(HttpxDownloadHandler(settings, self.crawler).max_clients, 41)
+        settings.set('TLS_CIPHERS', True)
+        settings.set('TLS_CONTEXT_POOL_SIZE', 2)
+        self.assertEqual(HttpxDownloadHandler(settings, self.crawler).max_clients, 82)
+        settings.set('HTTPX_MAX_CLIENTS', 5)
+        self.assertEqual(HttpxDownloadHandler(settings, self.crawler).max_clients, 5)
+
+    async def test_request_cookies_sent_as_header(self):
+        """Test that request cookies are sent without touching the pooled client's jar."""
+        self.request.cookies = {'session': 'abc'}
+        await self.handler.download_request(self.request, self.spider)
+
+        args, kwargs = self.mock_client.request.call_args
+        self.assertEqual(kwargs['headers']['Cookie'], 'session=abc')
+        self.assertNotIn('cookies', kwargs)
+
+    async def test_redirect_keeps_cookies(self):
+        """Test that cookies set on a redirect hop reach the next hop, not the pooled client."""
+        def app(request):
+            if request.url.path == '/login':
+                return httpx.Response(302, headers={'Location': '/home', 'Set-Cookie': 'sid=abc; Path=/'})
+            return httpx.Response(200, content=request.headers.get('Cookie', '').encode())
+
+        self.mock_client_cls.side_effect = lambda **kwargs: RealAsyncClient(transport=httpx.MockTransport(app), **kwargs)
+        self.request.url = 'https://example.com/login'
+        self.request.cookies = {'lang': 'en'}
+
+        await self.handler.download_request(self.request, self.spider)
+
+        _, kwargs = self.mock_response_cls.call_args
+        self.assertEqual(kwargs['_response'].url, 'https://example.com/home')
+        self.assertEqual(len(kwargs['_response'].history), 1)
+        self.assertEqual(sorted(kwargs['body'].decode().split('; ')), ['lang=en', 'sid=abc'])
+        client = self.handler.clients[(None, None)]
+        self.assertEqual(len(client.cookies.jar), 0)
+        await self.handler.close()
+
+    async def test_close_closes_clients(self):
+        """Test that close() closes every pooled client."""
+        await self.handler.download_request(self.request, self.spider)
+        await self.handler.close()
+
+        self.mock_client.aclose.assert_awaited_once()
+        self.assertEqual(len(self.handler.clients), 0)
+
+    async def test_close_closes_evicted_clients(self):
+        """Test that close() does not leave evicted clients waiting for their delayed close."""
+        self.handler.max_clients = 1
+        evicted = self.mock_client
+        await self.handler.download_request(self.request, self.spider)
+        self.mock_client_cls.return_value = AsyncMock(send=evicted.send, max_redirects=20,
+                                                      build_request=evicted.build_request)
+        self.request.meta['proxy'] = 'http://proxy.example.com:8080'
+        await self.handler.download_request(self.request, self.spider)
+        self.assertEqual(len(self.handler.closing), 1)
+
+        await self.handler.close()
+
+        evicted.aclose.assert_awaited_once()
+        self.mock_client_cls.return_value.aclose.assert_awaited_once()
+        self.assertEqual(len(self.handler.closing), 0)
+
+    async def test_http2_protocol_stats(self):
+        """Test that HTTPX_HTTP2 enables HTTP/2 and records the negotiated protocol."""
+        self.crawler.stats = MagicMock()
+        handler = HttpxDownloadHandler(Settings({'HTTPX_HTTP2': True}), self.crawler)
+        handler.logger, handler.di = self.handler.logger, self.handler.di
+        self.mock_http_response.http_version = 'HTTP/2'
+
+        await handler.download_request(self.request, self.spider)
+
+        _, kwargs = self.mock_client_cls.call_args
+        self.assertTrue(kwargs['http2'])
+        self.crawler.stats.inc_value.assert_called_once_with('httpx/protocol/HTTP/2')
+
+    async def test_http2_max_streams_per_slot(self):
+        """Test that HTTPX_HTTP2_MAX_STREAMS bounds concurrent streams per slot."""
+        handler = HttpxDownloadHandler(Settings({'HTTPX_HTTP2': True, 'HTTPX_HTTP2_MAX_STREAMS': 2}), self.crawler)
+        handler.logger, handler.di = self.handler.logger, self.handler.di
+        self.request.meta = {'download_slot': 'example.com'}
+        running, peak = 0, 0
+
+        async def request(*args, **kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return self.mock_http_response
+
+        self.mock_client.request.side_effect = request
+        await asyncio.gather(*[handler.download_request(self.request, self.spider) for _ in range(5)])
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(handler.streams, {})
+
+    async def test_http2_streams_kept_while_waited_on(self):
+        """Test that the per slot stream limit holds while requests keep arriving."""
+        handler = HttpxDownloadHandler(Settings({'HTTPX_HTTP2': True, 'HTTPX_HTTP2_MAX_STREAMS': 1}), self.crawler)
+        handler.logger, handler.di = self.handler.logger, self.handler.di
+        self.request.meta = {'download_slot': 'example.com'}
+        running, peak = 0, 0
+
+        async def request(*args, **kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0)
+            running -= 1
+            return self.mock_http_response
+
+        async def download(delay):
+            for _ in range(delay):
+                await asyncio.sleep(0)
+            await handler.download_request(self.request, self.spider)
+
+        self.mock_client.request.side_effect = request
+        await asyncio.gather(*[download(i) for i in range(10)])
+
+        self.assertEqual(peak, 1)
+        self.assertEqual(handler.streams, {})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import MagicMock
+
+from aioscpy import call_grace_instance
+from aioscpy.core.scraper import Slot
+from aioscpy.http import Request
+from aioscpy.http.response.text import TextResponse
+from aioscpy.libs.statscollectors import MemoryStatsCollector
+from aioscpy.libs.downloadermiddlewares.memorycache import LRUResponseCache, MemoryCacheMiddleware
+from aioscpy.settings import Settings
+
+
+def get_response(url, size=100, status=200, flags=None):
+    return TextResponse(url, status=status, body=b'x' * size, flags=flags)
+
+
+class TestLRUResponseCache(unittest.TestCase):
+    """Test the byte bounded LRU of responses."""
+
+    def test_lru_eviction(self):
+        """Test that the least recently used responses go first."""
+        cache = LRUResponseCache(max_size=300)
+        for key in 'abc':
+            cache.put(key, get_response(f'http://example.com/{key}'))
+        self.assertEqual(cache.size, 300)
+        cache.get('a')
+        self.assertEqual(cache.shrink(150), 2)
+        self.assertEqual(list(cache.entries), ['a'])
+        self.assertEqual(cache.size, 100)
+
+    def test_replace_and_expiration(self):
+        """Test that storing a key again replaces it and old entries expire."""
+        cache = LRUResponseCache(max_size=1000, expiration_secs=60)
+        cache.put('a', get_response('http://example.com/a', 100), now=1000)
+        cache.put('a', get_response('http://example.com/a', 50), now=1000)
+        self.assertEqual((len(cache), cache.size), (1, 50))
+        self.assertIsNotNone(cache.get('a', now=1030))
+        self.assertIsNone(cache.get('a', now=1100))
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+
+class TestMemoryCacheMiddleware(unittest.TestCase):
+    """Test that repeated GETs are served from memory within the scraper's budget."""
+
+    def setUp(self):
+        self.spider = MagicMock(spec=['name'])
+        self.crawler = MagicMock()
+        self.crawler.settings = Settings({'MEMORY_CACHE_ENABLED': True, 'MEMORY_CACHE_MAX_SIZE': 1000})
+        self.crawler.stats = MemoryStatsCollector(MagicMock())
+        self.slot = Slot(max_active_size=2000)
+        self.crawler.engine.scraper.slot = self.slot
+        self.mw = call_grace_instance(MemoryCacheMiddleware, only_instance=True).from_crawler(self.crawler)
+
+    def fetch(self, url, size=100, **kwargs):
+        """Run a request through the middleware, downloading it on a miss"""
+        request = Request(url, **kwargs)
+        response = self.mw.process_request(request, self.spider)
+        if response is None:
+            response = get_response(url, size)
+        return request, self.mw.process_response(request, response, self.spider)
+
+    def test_hit(self):
+        """Test that a hit is a flagged copy bound to its own request."""
+        _, first = self.fetch('http://example.com/hub?b=2&a=1')
+        request, second = self.fetch('http://example.com/hub?a=1&b=2', meta={'page': 2})
+        self.assertIsNot(second, first)
+        self.assertIs(second.request, request)
+        self.assertEqual(second.meta, {'page': 2})
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(second.flags, ['cached', 'memory_cached'])
+        stats = self.crawler.stats
+        self.assertEqual((stats.get_value('memory_cache/miss'), stats.get_value('memory_cache/hit')), (1, 1))
+        self.assertEqual(self.slot.cached_size, 100)
+
+    def test_not_cached(self):
+        """Test that other methods, statuses, opted out and oversized responses are not kept."""
+        self.fetch('http://example.com/', method='POST')
+        self.fetch('http://example.com/dont', meta={'dont_cache': True})
+        self.fetch('http://example.com/big', size=1001)
+        request = Request('http://example.com/missing')
+        self.mw.process_response(request, get_response(request.url, status=404), self.spider)
+        self.assertEqual(len(self.mw.cache), 0)
+
+    def test_byte_budget(self):
+        """Test that the cache stays within MEMORY_CACHE_MAX_SIZE, evicting the oldest pages."""
+        for i in range(15):
+            self.fetch(f'http://example.com/{i}')
+        self.assertEqual(self.mw.cache.size, 1000)
+        self.assertEqual(self.crawler.stats.get_value('memory_cache/evictions'), 5)
+        self.assertNotIn('memory_cached', self.fetch('http://example.com/0')[1].flags)
+        self.assertIn('memory_cached', self.fetch('http://example.com/14')[1].flags)
+
+    def test_shares_scraper_budget(self):
+        """Test that responses being scraped take precedence over cached ones."""
+        for i in range(10):
+            self.fetch(f'http://example.com/{i}')
+        self.assertEqual(self.slot.cached_size, 1000)
+
+        # the scraper gets busy: the cache gives room back on its next use
+        self.slot.active_size = 1700
+        self.fetch('http://example.com/9')
+        self.assertEqual(self.slot.cached_size, 300)
+        self.assertLessEqual(self.slot.active_size + self.slot.cached_size, self.slot.max_active_size)
+
+        # and does not store what does not fit
+        self.slot.active_size = 1950
+        self.fetch('http://example.com/new')
+        self.assertNotIn('memory_cached', self.fetch('http://example.com/new')[1].flags)
+        self.assertEqual(self.slot.cached_size, 0)
+
+    def test_disk_cache_flags(self):
+        """Test that responses from the disk cache are kept without its flags."""
+        request = Request('http://example.com/')
+        self.mw.process_response(request, get_response(request.url, flags=['cached', 'not_modified']), self.spider)
+        self.assertEqual(self.fetch('http://example.com/')[1].flags, ['cached', 'memory_cached'])
+
+
+if __name__ == '__main__':
+    unittest.main()
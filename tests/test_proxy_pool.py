@@ -0,0 +1,123 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+from aioscpy.exceptions import NotConfigured
+from aioscpy.http import Request, Response
+from aioscpy.settings import Settings
+from aioscpy.utils.common import build_component_list
+from aioscpy.libs.downloadermiddlewares.proxypool import ProxyPoolMiddleware
+
+
+class TestProxyPoolMiddleware(unittest.IsolatedAsyncioTestCase):
+    """Test proxy selection, concurrency caps and backoff of the proxy pool middleware."""
+
+    def setUp(self):
+        self.spider = MagicMock(spec=['name'])
+
+    def _middleware(self, proxies=('http://p1', 'http://p2'), **kwargs):
+        mw = ProxyPoolMiddleware(proxies, **kwargs)
+        mw.logger = MagicMock()
+        return mw
+
+    async def _send(self, mw, status=200, url='http://example.com/'):
+        request = Request(url)
+        await mw.process_request(request, self.spider)
+        await mw.process_response(request, Response(url, status=status), self.spider)
+        return request
+
+    def test_disabled_by_default(self):
+        """Test that the middleware is not configured unless enabled with a non-empty pool."""
+        crawler = MagicMock(settings=Settings({'PROXY_POOL_ENABLED': False}))
+        with self.assertRaises(NotConfigured):
+            ProxyPoolMiddleware.from_crawler(crawler)
+        crawler.settings = Settings({'PROXY_POOL_ENABLED': True})
+        with self.assertRaises(NotConfigured):
+            ProxyPoolMiddleware.from_crawler(crawler)
+
+    async def test_explicit_proxy_kept(self):
+        """Test that meta['proxy'] and meta['dont_proxy'] bypass the pool."""
+        mw = self._middleware()
+        request = Request('http://example.com/', meta={'proxy': 'http://mine'})
+        await mw.process_request(request, self.spider)
+        self.assertEqual(request.meta['proxy'], 'http://mine')
+        request = Request('http://example.com/', meta={'dont_proxy': True})
+        await mw.process_request(request, self.spider)
+        self.assertNotIn('proxy', request.meta)
+
+    async def test_concurrency_capped_per_proxy(self):
+        """Test that a request waits until a proxy below PROXY_POOL_MAX_CONCURRENCY is free."""
+        mw = self._middleware(proxies=['http://p1'], max_concurrency=1)
+        first = Request('http://example.com/1')
+        await mw.process_request(first, self.spider)
+        self.assertEqual(first.meta['proxy'], 'http://p1')
+
+        second = Request('http://example.com/2')
+        waiting = asyncio.create_task(mw.process_request(second, self.spider))
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiting.done())
+        await mw.process_response(first, Response(first.url), self.spider)
+        await asyncio.wait_for(waiting, 1)
+        self.assertEqual(second.meta['proxy'], 'http://p1')
+        self.assertEqual(mw.proxies['http://p1'].active, 1)
+
+    async def test_ban_backs_off_exponentially(self):
+        """Test that a banned proxy leaves the rotation for a doubling delay."""
+        mw = self._middleware(proxies=['http://p1', 'http://p2'], ban_codes=[403], backoff_base=10, backoff_max=25)
+        with patch('aioscpy.libs.downloadermiddlewares.proxypool.random.choices', side_effect=lambda c, weights: [c[0]]):
+            await self._send(mw, status=403)
+            p1 = mw.proxies['http://p1']
+            self.assertGreater(p1.retry_at, 0)
+            self.assertEqual((await self._send(mw)).meta['proxy'], 'http://p2')
+
+            p1.retry_at = 0
+            await self._send(mw, status=403)
+            with patch('aioscpy.libs.downloadermiddlewares.proxypool.time', return_value=1000.0):
+                mw._back_off(p1, self.spider)
+            self.assertEqual(p1.retry_at, 1025.0)  # 10 * 2 ** 2 capped at 25
+
+            p1.retry_at = 0
+            await self._send(mw)
+            self.assertEqual(p1.backoffs, 0)
+
+    async def test_failures_back_off(self):
+        """Test that PROXY_POOL_MAX_FAILURES errors in a row take the proxy out of rotation."""
+        mw = self._middleware(proxies=['http://p1'], max_failures=2)
+        p1 = mw.proxies['http://p1']
+        for _ in range(2):
+            request = Request('http://example.com/')
+            await mw.process_request(request, self.spider)
+            self.assertIsNone(await mw.process_exception(request, ConnectionError(), self.spider))
+        self.assertEqual(p1.active, 0)
+        self.assertEqual(p1.failures, 2)
+        self.assertGreater(p1.retry_at, 0)
+
+    async def test_cached_response_not_scored(self):
+        """Test that a cached response releases its proxy without counting as a success."""
+        mw = self._middleware(proxies=['http://p1'], max_concurrency=1)
+        request = Request('http://example.com/')
+        await mw.process_request(request, self.spider)
+        await mw.process_response(request, Response(request.url, flags=['cached']), self.spider)
+        state = mw.proxies['http://p1']
+        self.assertEqual((state.active, state.successes, state.latency), (0, 0, None))
+
+    def test_runs_after_the_caches(self):
+        """Test that cache hits never take a proxy and a stale fallback comes after the release."""
+        order = [path.rsplit('.', 1)[-1] for path in
+                 build_component_list(Settings().getwithbase('DOWNLOADER_MIDDLEWARES'))]
+        for cache in ('MemoryCacheMiddleware', 'HttpCacheMiddleware'):
+            self.assertGreater(order.index('ProxyPoolMiddleware'), order.index(cache))
+
+    async def test_selection_weighted_by_health(self):
+        """Test that healthier proxies get a larger weight."""
+        mw = self._middleware()
+        p1, p2 = mw.proxies.values()
+        p1.successes, p1.latency = 50, 0.1
+        p2.successes, p2.failures, p2.latency = 5, 45, 2.0
+        self.assertGreater(p1.score, p2.score * 10)
+        picks = [mw._choose(0).url for _ in range(200)]
+        self.assertGreater(picks.count('http://p1'), 150)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from aioscpy.http import Request
+from aioscpy.settings import Settings
+from aioscpy.core.downloader.handlers.pyhttpx import PyHttpxDownloadHandler
+
+
+def fake_session(*args, **kwargs):
+    session = MagicMock()
+    session.cookie_manger.cookies = {}
+    session.request.return_value = MagicMock(status_code=200, headers={}, content=b'ok', cookies={})
+    return session
+
+
+class TestPyHttpxHandler(unittest.IsolatedAsyncioTestCase):
+    """Test the session pool of the pyhttpx download handler."""
+
+    async def asyncSetUp(self):
+        patcher = patch('aioscpy.core.downloader.handlers.pyhttpx.pyhttpx.HttpSession', side_effect=fake_session)
+        self.HttpSession = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.spider = MagicMock(spec=['name'])
+        self.handler = self._handler(CONCURRENT_REQUESTS=2, PYHTTPX_MAX_SESSIONS=2)
+
+    async def asyncTearDown(self):
+        await self.handler.close()
+
+    def _handler(self, **settings):
+        handler = PyHttpxDownloadHandler(Settings(settings), MagicMock(stats=None, signals=None))
+        handler.logger = MagicMock()
+        handler.di = MagicMock()
+        handler.di.get.return_value = lambda url, body=None, **kwargs: body
+        return handler
+
+    def test_executor_sized_from_concurrency(self):
+        """Test that the executor follows CONCURRENT_REQUESTS unless PYHTTPX_MAX_WORKERS is set."""
+        self.assertEqual(self.handler.executor._max_workers, 2)
+        handler = self._handler(CONCURRENT_REQUESTS=2, PYHTTPX_MAX_WORKERS=5)
+        self.assertEqual(handler.executor._max_workers, 5)
+        handler.executor.shutdown()
+
+    async def test_session_reused_per_host(self):
+        """Test that sequential requests to one host share a session and other hosts get their own."""
+        for _ in range(3):
+            self.assertEqual(await self.handler.download_request(Request('https://a.example/'), self.spider), b'ok')
+        self.assertEqual(self.HttpSession.call_count, 1)
+        self.HttpSession.assert_called_with(http2=True)
+
+        await self.handler.download_request(Request('https://b.example/'), self.spider)
+        proxied = Request('https://a.example/', meta={'proxy': 'http://proxy:8080'})
+        await self.handler.download_request(proxied, self.spider)
+        self.assertEqual(self.HttpSession.call_count, 3)
+
+    async def test_idle_sessions_bounded(self):
+        """Test that idle sessions past PYHTTPX_MAX_SESSIONS are closed, least recently used first."""
+        for host in ('a', 'b', 'c'):
+            await self.handler.download_request(Request(f'https://{host}.example/'), self.spider)
+        self.assertEqual(self.handler.idle_count, 2)
+        self.assertEqual([key[0] for key in self.handler.sessions], ['b.example', 'c.example'])
+
+    async def test_failed_session_dropped(self):
+        """Test that a session whose request raised is closed instead of returned to the pool."""
+        self.HttpSession.side_effect = None
+        session = self.HttpSession.return_value = fake_session()
+        session.request.side_effect = ConnectionResetError
+        with self.assertRaises(ConnectionResetError):
+            await self.handler.download_request(Request('https://a.example/'), self.spider)
+        session.close.assert_called_once()
+        self.assertEqual(self.handler.idle_count, 0)
+
+    async def test_cancelled_session_closed_after_thread(self):
+        """Test that a cancelled request closes its session only once the worker thread is done with it."""
+        started, release = threading.Event(), threading.Event()
+        self.HttpSession.side_effect = None
+        session = self.HttpSession.return_value = fake_session()
+        response = session.request.return_value
+
+        def request(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return response
+        session.request.side_effect = request
+
+        task = asyncio.ensure_future(self.handler.download_request(Request('https://a.example/'), self.spider))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        session.close.assert_not_called()
+
+        release.set()
+        await asyncio.get_running_loop().run_in_executor(None, self.handler.executor.shutdown)
+        session.close.assert_called_once()
+        self.assertEqual(self.handler.idle_count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
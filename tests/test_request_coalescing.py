@@ -0,0 +1,171 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from aioscpy import call_grace_instance
+from aioscpy.http import Request
+from aioscpy.http.response.text import TextResponse
+from aioscpy.utils.request import request_fingerprint
+
+from test_downloader_slots import get_downloader
+
+
+class TestRequestFingerprint(unittest.TestCase):
+    """Test the fingerprint identifying equivalent requests."""
+
+    def test_canonical_url(self):
+        """Test that query order and fragments do not change the fingerprint."""
+        self.assertEqual(request_fingerprint(Request('http://example.com/?b=2&a=1#top')),
+                         request_fingerprint(Request('http://example.com/?a=1&b=2')))
+        self.assertNotEqual(request_fingerprint(Request('http://example.com/#a'), keep_fragments=True),
+                            request_fingerprint(Request('http://example.com/#b'), keep_fragments=True))
+
+    def test_method_and_body(self):
+        """Test that the method, the body and the json payload are part of the fingerprint."""
+        fp = request_fingerprint(Request('http://example.com/'))
+        self.assertNotEqual(fp, request_fingerprint(Request('http://example.com/', method='POST')))
+        self.assertNotEqual(request_fingerprint(Request('http://example.com/', method='POST', body='a=1')),
+                            request_fingerprint(Request('http://example.com/', method='POST', body='a=2')))
+        self.assertEqual(request_fingerprint(Request('http://example.com/', method='POST', json={'a': 1, 'b': 2})),
+                         request_fingerprint(Request('http://example.com/', method='POST', json={'b': 2, 'a': 1})))
+
+    def test_headers(self):
+        """Test that headers only count when asked for."""
+        r1 = Request('http://example.com/', headers={'Accept-Language': 'en'})
+        r2 = Request('http://example.com/', headers={'Accept-Language': 'fr'})
+        self.assertEqual(request_fingerprint(r1), request_fingerprint(r2))
+        self.assertNotEqual(request_fingerprint(r1, include_headers=['accept-language']),
+                            request_fingerprint(r2, include_headers=['Accept-Language']))
+
+
+class TestRequestCoalescing(unittest.IsolatedAsyncioTestCase):
+    """Test that identical GETs in flight share one download."""
+
+    async def asyncSetUp(self):
+        self.downloader = get_downloader(DOWNLOAD_COALESCE_ENABLED=True)
+        self.downloader.middleware = call_grace_instance(
+            self.downloader.di.get('downloader_middleware'), crawler=self.downloader.crawler, middlewares=[])
+        self.release = asyncio.Event()
+        self.downloads = []
+        self.result = None
+
+        async def download_request(request, spider):
+            self.downloads.append(request)
+            await self.release.wait()
+            if self.result is not None:
+                return self.result(request)
+            return TextResponse(request.url, body=b'shared', flags=['cached'])
+
+        self.downloader.handlers = MagicMock(download_request=download_request, close=AsyncMock())
+        self.engine = MagicMock(_handle_downloader_output=AsyncMock())
+        await self.downloader.open(MagicMock(spec=['name']), self.engine)
+
+    async def asyncTearDown(self):
+        await self.downloader.close()
+
+    async def crawl(self, requests):
+        for request in requests:
+            await self.downloader.fetch(request)
+        await asyncio.sleep(0.05)
+        self.release.set()
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+            if not self.downloader.active:
+                break
+        return {id(call.args[1]): call.args[0] for call in self.engine._handle_downloader_output.call_args_list}
+
+    async def test_waiters_get_own_response(self):
+        """Test that every waiter gets a copy of the response bound to its own request."""
+        def parse_a(response):
+            pass
+
+        def parse_b(response):
+            pass
+
+        requests = [Request('http://example.com/page?x=1&y=2', callback=parse_a, dont_filter=True),
+                    Request('http://example.com/page?y=2&x=1', callback=parse_b, dont_filter=True),
+                    Request('http://example.com/page?x=1&y=2', meta={'n': 3})]
+        outputs = await self.crawl(requests)
+
+        self.assertEqual(len(self.downloads), 1)
+        self.assertEqual(len(outputs), 3)
+        responses = [outputs[id(request)] for request in requests]
+        self.assertEqual(len({id(response) for response in responses}), 3)
+        for request, response in zip(requests, responses):
+            self.assertIs(response.request, request)
+            self.assertEqual(response.body, b'shared')
+        self.assertEqual(responses[1].flags, ['cached', 'coalesced'])
+        self.assertEqual(responses[2].meta, {'n': 3})
+        self.assertFalse(self.downloader._coalesced)
+        self.assertFalse(self.downloader.active)
+        self.downloader.crawler.stats.inc_value.assert_any_call('downloader/coalesced_count',
+                                                                spider=self.downloader.spider)
+
+    async def test_not_coalesced(self):
+        """Test that other methods, other URLs and opted out requests are downloaded apart."""
+        requests = [Request('http://example.com/'), Request('http://example.com/other'),
+                    Request('http://example.com/', method='POST'),
+                    Request('http://example.com/', meta={'dont_coalesce': True})]
+        await self.crawl(requests)
+        self.assertEqual(len(self.downloads), 4)
+
+    async def test_exception_shared(self):
+        """Test that a failed download fails its waiters too."""
+        def fail(request):
+            raise ConnectionError('refused')
+
+        self.result = fail
+        requests = [Request('http://example.com/'), Request('http://example.com/')]
+        outputs = await self.crawl(requests)
+        self.assertEqual(len(self.downloads), 1)
+        for request in requests:
+            self.assertIsInstance(outputs[id(request)], ConnectionError)
+
+    async def test_middlewares_run_once(self):
+        """Test that a retry is decided once, for the leader, and each waiter follows it with its own request."""
+        seen = []
+
+        def process_response(request, response, spider):
+            seen.append(request)
+            retry = request.copy()
+            retry.meta['retry_times'] = 1
+            retry.dont_filter = True
+            return retry
+
+        retry = MagicMock(spec=['process_response'])
+        retry.process_response = process_response
+        self.downloader.middleware = call_grace_instance(
+            self.downloader.di.get('downloader_middleware'), crawler=self.downloader.crawler, middlewares=[retry])
+
+        def parse_b(response):
+            pass
+
+        requests = [Request('http://example.com/', meta={'n': 1}), Request('http://example.com/', callback=parse_b)]
+        outputs = await self.crawl(requests)
+
+        self.assertEqual(len(self.downloads), 1)
+        self.assertEqual([id(request) for request in seen], [id(requests[0])])
+        waiter_retry = outputs[id(requests[1])]
+        self.assertIsInstance(waiter_retry, Request)
+        self.assertIs(waiter_retry.callback, parse_b)
+        self.assertTrue(waiter_retry.dont_filter)
+        self.assertEqual(waiter_retry.meta, {'retry_times': 1})
+        self.assertEqual(outputs[id(requests[0])].meta['n'], 1)
+
+    async def test_waiters_keep_handler_attributes(self):
+        """Test that the copies keep the cookies and the client response of the download."""
+        raw = object()
+
+        def respond(request):
+            return TextResponse(request.url, body=b'shared', cookies='Set-Cookie: sid=abc; Domain=example.com',
+                                _response=raw)
+
+        self.result = respond
+        requests = [Request('http://example.com/'), Request('http://example.com/')]
+        outputs = await self.crawl(requests)
+        for request in requests:
+            self.assertEqual(outputs[id(request)].cookies, {'sid': 'abc'})
+            self.assertIs(outputs[id(request)]._response, raw)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import MagicMock
+
+from aiohttp import web
+
+from aioscpy.http import Request
+from aioscpy.settings import Settings
+from aioscpy.signalmanager import SignalManager
+from aioscpy.core.downloader.handlers.requests import RequestsDownloadHandler, CipherAdapter
+
+
+class TestRequestsHandler(unittest.IsolatedAsyncioTestCase):
+    """Test the thread pool and pooled sessions of the requests download handler."""
+
+    async def asyncSetUp(self):
+        async def page(request):
+            response = web.Response(text=request.headers.get('Cookie', ''))
+            response.set_cookie('session', 'secret')
+            return response
+
+        app = web.Application()
+        app.router.add_get('/{n}', page)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.base_url = 'http://127.0.0.1:%d' % site._server.sockets[0].getsockname()[1]
+        self.spider = MagicMock(spec=['name'])
+        self.handler = self._handler(CONCURRENT_REQUESTS=2)
+
+    async def asyncTearDown(self):
+        await self.handler.close()
+        await self.runner.cleanup()
+
+    def _handler(self, **settings):
+        crawler = MagicMock(stats=None)
+        crawler.signals = SignalManager(crawler)
+        handler = RequestsDownloadHandler(Settings(settings), crawler)
+        handler.logger = MagicMock()
+        handler.di = MagicMock()
+        handler.di.get.return_value = lambda url, body=None, **kwargs: body
+        return handler
+
+    def test_executor_sized_from_concurrency(self):
+        """Test that the executor follows CONCURRENT_REQUESTS unless REQUESTS_MAX_WORKERS is set."""
+        self.assertEqual(self.handler.executor._max_workers, 2)
+        handler = self._handler(CONCURRENT_REQUESTS=2, REQUESTS_MAX_WORKERS=5)
+        self.assertEqual(handler.executor._max_workers, 5)
+        handler.executor.shutdown()
+
+    async def test_sessions_are_reused(self):
+        """Test that worker threads keep their session between requests."""
+        for i in range(6):
+            await self.handler.download_request(Request(f'{self.base_url}/{i}'), self.spider)
+        self.assertLessEqual(len(self.handler.sessions), 2)
+
+    async def test_response_cookies_not_kept(self):
+        """Test that cookies set by one response are not sent with the next request."""
+        first = await self.handler.download_request(Request(f'{self.base_url}/1', cookies={'a': 'b'}), self.spider)
+        second = await self.handler.download_request(Request(f'{self.base_url}/2'), self.spider)
+        self.assertEqual(first, b'a=b')
+        self.assertEqual(second, b'')
+
+    async def test_cipher_session(self):
+        """Test that TLS_CIPHERS requests go through a session with a cipher adapter."""
+        await self.handler.download_request(Request(f'{self.base_url}/1', meta={'TLS_CIPHERS': True}), self.spider)
+        adapters = [session.get_adapter('https://example.com') for session in self.handler.sessions]
+        self.assertTrue(any(isinstance(adapter, CipherAdapter) for adapter in adapters))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import tempfile
+from unittest.mock import MagicMock
+
+from aioscpy.http import Request, TextResponse
+from aioscpy.http.response.spool import SpooledBody
+from aioscpy.core.scraper import Slot
+from aioscpy.core.downloader.handlers.streaming import BodyCollector
+
+
+def spooled(data):
+    file = tempfile.TemporaryFile()
+    file.write(data)
+    return SpooledBody(file)
+
+
+class TestSpooledBody(unittest.IsolatedAsyncioTestCase):
+    """Test responses whose body is spooled to a memory-mapped temporary file."""
+
+    def test_response_body_view(self):
+        """Test that the body is readable through mmap and loaded lazily."""
+        response = TextResponse('http://example.com/', body=spooled(b'<html>spooled</html>'))
+        self.assertTrue(response.spooled)
+        self.assertEqual(response.body_size, 20)
+        self.assertEqual(bytes(response.body_view[:6]), b'<html>')
+        self.assertTrue(response.body_view.readonly)
+        self.assertIsNone(response._body)
+
+        self.assertEqual(response.text, '<html>spooled</html>')
+        self.assertEqual(response.replace(status=404)._spooled, response._spooled)
+
+    def test_empty_spool(self):
+        response = TextResponse('http://example.com/', body=spooled(b''))
+        self.assertEqual(response.body, b'')
+        self.assertEqual(len(response.body_view), 0)
+
+    async def test_collector_spools_above_threshold(self):
+        """Test that the collector moves the body to a file once it passes spool_size."""
+        stats = MagicMock()
+        collector = BodyCollector(Request('http://example.com/'), spool_size=10, stats=stats)
+        await collector.bytes_received(b'x' * 8)
+        self.assertIsNone(collector.spool)
+        await collector.bytes_received(b'y' * 8)
+        await collector.bytes_received(b'z' * 8)
+
+        body = collector.getvalue()
+        self.assertIsInstance(body, SpooledBody)
+        self.assertEqual(body.tobytes(), b'x' * 8 + b'y' * 8 + b'z' * 8)
+        stats.inc_value.assert_called_once_with('downloader/spooled_count')
+
+    def test_scraper_slot_accounts_spooled_separately(self):
+        """Test that spooled bodies do not count against the active size."""
+        slot = Slot(max_active_size=5000, max_spooled_size=100)
+        request = Request('http://example.com/')
+        response = TextResponse('http://example.com/', body=spooled(b'x' * 200))
+
+        slot.add_response_request(response, request)
+        self.assertEqual(slot.active_size, Slot.MIN_RESPONSE_SIZE)
+        self.assertEqual(slot.spooled_size, 200)
+        self.assertTrue(slot.needs_backout())
+
+        slot.finish_response(request, response)
+        self.assertEqual((slot.active_size, slot.spooled_size), (0, 0))
+        self.assertIsNone(response._body)
+
+    def test_scraper_slot_charges_loaded_body(self):
+        """Test that reading a spooled body charges its full size to the active size."""
+        slot = Slot(max_active_size=5000)
+        request = Request('http://example.com/')
+        response = TextResponse('http://example.com/', body=spooled(b'x' * 8000))
+
+        slot.add_response_request(response, request)
+        self.assertFalse(slot.needs_backout())
+        self.assertEqual(len(response.text), 8000)
+        self.assertEqual(slot.active_size, 8000)
+        self.assertTrue(slot.needs_backout())
+
+        slot.finish_response(request, response)
+        self.assertEqual((slot.active_size, slot.spooled_size), (0, 0))
+        self.assertIsNone(response.on_body_load)
+
+
+if __name__ == '__main__':
+    unittest.main()
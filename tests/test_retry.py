@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+from time import time
+from unittest.mock import MagicMock
+
+from aioscpy.exceptions import NotConfigured, DownloadMaxSizeExceeded
+from aioscpy.exceptions import TimeoutError as DownloadTimeoutError
+from aioscpy.http import Request, Response
+from aioscpy.settings import Settings
+from aioscpy.libs.statscollectors import MemoryStatsCollector
+from aioscpy.libs.downloadermiddlewares.retry import RetryMiddleware, RetryBudget
+from aioscpy.core.scheduler import Scheduler
+from aioscpy.queue.memory import memory_queue
+
+
+class TestRetryMiddleware(unittest.IsolatedAsyncioTestCase):
+    """Test the retry middleware and the scheduler's not-before delay."""
+
+    def setUp(self):
+        self.spider = MagicMock(spec=['name'])
+        self.stats = MemoryStatsCollector(MagicMock())
+        self.mw = self._middleware()
+
+    def _middleware(self, **settings):
+        settings.setdefault('RETRY_BUDGET_RATIO', 0)
+        settings.setdefault('RETRY_BUDGET_MIN', 0)
+        mw = RetryMiddleware(Settings(dict(
+            {'RETRY_TIMES': 2, 'RETRY_HTTP_CODES': [503],
+             'RETRY_EXCEPTIONS': ['aioscpy.exceptions.TimeoutError', 'not_installed.Error'],
+             'RETRY_BACKOFF_BASE': 2, 'RETRY_BACKOFF_MAX': 5}, **settings)), self.stats)
+        mw.logger = MagicMock()
+        return mw
+
+    def test_disabled(self):
+        """Test that RETRY_ENABLED = False leaves the middleware out."""
+        with self.assertRaises(NotConfigured):
+            RetryMiddleware.from_crawler(MagicMock(settings=Settings({'RETRY_ENABLED': False})))
+
+    def test_retry_status_with_backoff(self):
+        """Test that a retried response comes back as a delayed copy of the request."""
+        request = Request('http://example.com/', priority=5)
+        response = Response(request.url, status=503)
+        start = time()
+        first = self.mw.process_response(request, response, self.spider)
+        self.assertIsInstance(first, Request)
+        self.assertEqual(first.meta['retry_times'], 1)
+        self.assertTrue(first.dont_filter)
+        self.assertEqual(first.priority, 4)
+        self.assertTrue(start + 1 <= first.meta['not_before'] <= time() + 2)
+
+        second = self.mw.process_response(first, response, self.spider)
+        self.assertTrue(start + 2 <= second.meta['not_before'] <= time() + 4)
+        self.assertIs(self.mw.process_response(second, response, self.spider), response)
+
+        self.assertEqual(self.stats.get_value('retry/count'), 2)
+        self.assertEqual(self.stats.get_value('retry/reason_count/503'), 2)
+        self.assertEqual(self.stats.get_value('retry/max_reached'), 1)
+
+    def test_other_status_and_dont_retry(self):
+        """Test that other statuses and meta['dont_retry'] are passed through."""
+        request = Request('http://example.com/')
+        ok = Response(request.url, status=200)
+        self.assertIs(self.mw.process_response(request, ok, self.spider), ok)
+        request = Request('http://example.com/', meta={'dont_retry': True})
+        failed = Response(request.url, status=503)
+        self.assertIs(self.mw.process_response(request, failed, self.spider), failed)
+
+    def test_retry_exceptions(self):
+        """Test that only the configured exceptions are retried."""
+        request = Request('http://example.com/')
+        retried = self.mw.process_exception(request, DownloadTimeoutError(), self.spider)
+        self.assertEqual(retried.meta['retry_times'], 1)
+        self.assertEqual(self.stats.get_value('retry/reason_count/aioscpy.exceptions.TimeoutError'), 1)
+        self.assertIsNone(self.mw.process_exception(request, DownloadMaxSizeExceeded(), self.spider))
+
+    def test_domain_budget(self):
+        """Test that a domain cannot retry more than its budget allows."""
+        mw = self._middleware(RETRY_BUDGET_RATIO=0.5, RETRY_BUDGET_MIN=1)
+        response = Response('http://a.example/', status=503)
+        requests = [Request(f'http://a.example/{i}') for i in range(4)]
+        for request in requests:
+            mw.process_request(request, self.spider)
+        retried = [mw.process_response(request, response, self.spider) for request in requests]
+        self.assertEqual(sum(isinstance(r, Request) for r in retried), 3)  # 1 + 0.5 * 4
+        self.assertEqual(self.stats.get_value('retry/budget_exhausted'), 1)
+
+        other = Request('http://b.example/')
+        self.assertIsInstance(mw.process_response(other, response, self.spider), Request)
+
+    def test_budget_window(self):
+        """Test that requests and retries leave the budget after the window."""
+        budget = RetryBudget(ratio=0, minimum=1, window=10)
+        self.assertTrue(budget.withdraw(now=100))
+        self.assertFalse(budget.withdraw(now=105))
+        self.assertTrue(budget.withdraw(now=111))
+
+    async def test_scheduler_holds_delayed_requests(self):
+        """Test that the scheduler queues a request only once its not-before time passed."""
+        scheduler = Scheduler(memory_queue(self.spider), self.spider, None)
+        delayed = Request('http://example.com/1', meta={'not_before': time() + 0.1})
+        later = Request('http://example.com/2', meta={'not_before': time() + 0.2})
+        await scheduler.enqueue_request(later)
+        await scheduler.enqueue_request(delayed)
+        await scheduler.enqueue_request(Request('http://example.com/now'))
+        self.assertEqual(len(scheduler.delayed), 2)
+        self.assertTrue(await scheduler.has_pending_requests())
+
+        urls = []
+        for _ in range(3):
+            urls += [r.url for r in await asyncio.wait_for(scheduler.async_next_request(count=1), 1)]
+        self.assertEqual(urls, ['http://example.com/now', 'http://example.com/1', 'http://example.com/2'])
+        self.assertFalse(await scheduler.has_pending_requests())
+
+
+if __name__ == '__main__':
+    unittest.main()
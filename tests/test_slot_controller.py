@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import MagicMock
+
+from aioscpy import call_grace_instance
+from aioscpy.http import Request, Response
+from aioscpy.settings import Settings
+from aioscpy.utils.common import build_component_list
+from aioscpy.libs.statscollectors import MemoryStatsCollector
+from aioscpy.core.downloader import Slot
+from aioscpy.core.downloader.controller import SlotController
+from aioscpy.middleware.adaptive_concurrency import SlotConcurrencyMiddleware
+
+
+def simulate(controller, capacity, base_rtt, windows=100, error_rate=0.0):
+    """Drive ``controller`` with a host serving ``capacity`` requests at once in ``base_rtt``
+    seconds, queueing the rest; return the concurrency after each decision"""
+    now, history = 0.0, []
+    for _ in range(windows):
+        in_flight = controller.concurrency
+        rtt = base_rtt * max(1.0, in_flight / capacity)
+        for i in range(controller.window):
+            now += rtt / in_flight
+            error = i < controller.window * error_rate
+            if controller.sample(rtt, in_flight, error, now=now) is not None:
+                history.append(controller.concurrency)
+    return history
+
+
+class TestSlotController(unittest.IsolatedAsyncioTestCase):
+    """Test the per slot AIMD / gradient concurrency controller and its middleware."""
+
+    def test_mixed_hosts_find_their_own_limit(self):
+        """Test that a narrow and a wide host settle at their own limits."""
+        narrow = simulate(SlotController(limit=8, window=10), capacity=4, base_rtt=0.5)
+        wide = simulate(SlotController(limit=8, window=10), capacity=24, base_rtt=0.05)
+        # probe windows dip to half the limit, the median is where the host settled
+        self.assertTrue(max(narrow[-20:]) <= 7 and 4 <= sorted(narrow[-20:])[10], narrow[-20:])
+        self.assertTrue(max(wide[-20:]) <= 37 and 24 <= sorted(wide[-20:])[10], wide[-20:])
+
+    def test_errors_decrease_multiplicatively(self):
+        """Test that an error rate above the threshold cuts the limit by the backoff factor."""
+        controller = SlotController(limit=20, window=10, backoff=0.5, max_error_rate=0.1)
+        for i in range(10):
+            decision = controller.sample(0.1, 20, error=i < 3, now=i)
+        self.assertEqual(decision, 'decrease_errors')
+        self.assertEqual(controller.concurrency, 10)
+
+        history = simulate(controller, capacity=100, base_rtt=0.1, windows=20, error_rate=0.5)
+        self.assertEqual(history[-1], 1)
+
+    def test_idle_limit_does_not_grow(self):
+        """Test that the limit only grows when the slot actually used it."""
+        controller = SlotController(limit=10, window=5)
+        for i in range(5):
+            decision = controller.sample(0.1, 2, now=i)
+        self.assertEqual(decision, 'hold')
+        self.assertEqual(controller.concurrency, 10)
+
+    async def test_middleware_drives_slot_concurrency(self):
+        """Test that decisions reach the downloader slot and the stats."""
+        crawler = MagicMock()
+        crawler.settings = Settings({'ADAPTIVE_SLOT_CONCURRENCY_ENABLED': True, 'ADAPTIVE_SLOT_CONCURRENCY_WINDOW': 2})
+        crawler.stats = stats = MemoryStatsCollector(MagicMock())
+        downloader = crawler.engine.downloader
+        downloader.slots = {'a.example': Slot(4, False)}
+        mw = call_grace_instance(SlotConcurrencyMiddleware, crawler)
+        mw.logger = MagicMock()
+        spider = MagicMock(spec=['name'])
+
+        requests = [Request(f'http://a.example/{i}', meta={'download_slot': 'a.example'}) for i in range(2)]
+        for request in requests:
+            downloader.slots['a.example'].transferring.add(request)
+            await mw.process_request(request, spider)
+        await mw.process_response(requests[0], Response(requests[0].url), spider)
+        await mw.process_exception(requests[1], ConnectionError(), spider)
+
+        downloader.set_slot_concurrency.assert_called_once_with('a.example', 3)  # 4 * 0.7
+        self.assertEqual(stats.get_value('adaptive_slot/decisions/decrease_errors'), 1)
+        self.assertEqual(stats.get_value('adaptive_slot/a.example/limit'), 3)
+        self.assertIsNotNone(downloader.slots['a.example'].controller)
+
+    async def test_middleware_skips_cached_responses(self):
+        """Test that responses from a cache do not feed the controller."""
+        crawler = MagicMock()
+        crawler.settings = Settings({'ADAPTIVE_SLOT_CONCURRENCY_ENABLED': True})
+        crawler.engine.downloader.slots = {'a.example': Slot(4, False)}
+        mw = call_grace_instance(SlotConcurrencyMiddleware, crawler)
+        request = Request('http://a.example/', meta={'download_slot': 'a.example'})
+
+        await mw.process_request(request, None)
+        await mw.process_response(request, Response(request.url, flags=['cached']), None)
+        self.assertIsNone(crawler.engine.downloader.slots['a.example'].controller)
+        self.assertNotIn('slot_request_start_time', request.meta)
+
+    def test_middleware_runs_before_retries(self):
+        """Test that failed responses reach the middleware before RetryMiddleware turns them into retries."""
+        order = [path.rsplit('.', 1)[-1] for path in
+                 build_component_list(Settings().getwithbase('DOWNLOADER_MIDDLEWARES'))]
+        # process_response / process_exception run from the last middleware to the first
+        self.assertGreater(order.index('SlotConcurrencyMiddleware'), order.index('RetryMiddleware'))
+        self.assertGreater(order.index('SlotConcurrencyMiddleware'), order.index('HttpCacheMiddleware'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import asyncio
+import datetime
+import os
+import ssl
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from aioscpy.http import Request
+from aioscpy.settings import Settings
+from aioscpy.core.downloader.handlers.tls import SSLContextPool
+from aioscpy.core.downloader.handlers.httpx import HttpxDownloadHandler
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+except ImportError:
+    x509 = None
+
+
+def write_localhost_cert(directory):
+    """A self-signed certificate for localhost, returns the PEM path"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.utcnow()
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name)
+            .public_key(key.public_key()).serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName('localhost')]), critical=False)
+            .sign(key, hashes.SHA256()))
+    path = os.path.join(directory, 'localhost.pem')
+    with open(path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    return path
+
+
+class TestSSLContextPool(unittest.IsolatedAsyncioTestCase):
+    """Test the pool of randomized SSL contexts used when TLS_CIPHERS is on."""
+
+    def test_contexts_built_once(self):
+        """Test that the contexts are built on first use only."""
+        pool = SSLContextPool(size=3)
+        with patch('aioscpy.core.downloader.handlers.tls.generate_cipher', return_value='ECDHE+AESGCM') as generate:
+            for i in range(10):
+                pool.get(f'host{i}.example')
+        self.assertEqual(generate.call_count, 3)
+        self.assertEqual(len(pool.contexts), 3)
+        self.assertTrue(all(isinstance(context, ssl.SSLContext) for context in pool.contexts))
+
+    def test_hosts_rotate_and_stick(self):
+        """Test that new hosts take the contexts in turn and keep theirs afterwards."""
+        pool = SSLContextPool(size=2)
+        first = [pool.get(host)[0] for host in ('a', 'b', 'c')]
+        self.assertEqual(first, [0, 1, 0])
+        self.assertIs(pool.get('b')[1], pool.contexts[1])
+        self.assertEqual(pool.get('a')[0], 0)
+
+    def test_invalid_cipher_list(self):
+        """Test that a cipher list OpenSSL rejects leaves a usable context and logs a warning."""
+        logger = MagicMock()
+        pool = SSLContextPool(size=1, logger=logger)
+        with patch('aioscpy.core.downloader.handlers.tls.generate_cipher', return_value='NOT-A-CIPHER'):
+            _, context = pool.get('a')
+        self.assertIsInstance(context, ssl.SSLContext)
+        logger.warning.assert_called_once()
+
+    @unittest.skipIf(x509 is None, 'needs cryptography to make a certificate')
+    async def test_sessions_resumed_per_host(self):
+        """Test that a new connection to a host resumes the TLS session of the previous one."""
+        with tempfile.TemporaryDirectory() as directory:
+            certfile = write_localhost_cert(directory)
+            server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            server_context.load_cert_chain(certfile)
+
+            async def echo(reader, writer):
+                writer.write(await reader.readline())
+                await writer.drain()
+                writer.close()
+
+            server = await asyncio.start_server(echo, '127.0.0.1', 0, ssl=server_context)
+            port = server.sockets[0].getsockname()[1]
+            pool = SSLContextPool(size=1)
+            _, context = pool.get('localhost')
+            context.load_verify_locations(certfile)
+
+            reused = []
+            for _ in range(2):
+                reader, writer = await asyncio.open_connection(
+                    '127.0.0.1', port, ssl=context, server_hostname='localhost')
+                writer.write(b'ping\n')
+                self.assertEqual(await reader.readline(), b'ping\n')
+                reused.append(writer.get_extra_info('ssl_object').session_reused)
+                writer.close()
+                await writer.wait_closed()
+            server.close()
+            await server.wait_closed()
+
+        self.assertEqual(reused, [False, True])
+        self.assertIn('localhost', context.sessions)
+
+    async def test_httpx_clients_per_context(self):
+        """Test that the httpx handler keeps one client per pooled context instead of one per request."""
+        handler = HttpxDownloadHandler(Settings({'TLS_CIPHERS': True, 'TLS_CONTEXT_POOL_SIZE': 2}), MagicMock(stats=None))
+        handler.logger = MagicMock()
+        handler.di = MagicMock()
+        handler._fetch = MagicMock(side_effect=Exception('stop'))
+        handler.di.get.return_value.DownloadError = RuntimeError
+        for host in ('a', 'b', 'c', 'a', 'b'):
+            with self.assertRaises(RuntimeError):
+                await handler.download_request(Request(f'https://{host}.example/'), MagicMock(spec=['name']))
+        self.assertEqual(len(handler.clients), 2)
+        await handler.close()
+
+
+if __name__ == '__main__':
+    unittest.main()